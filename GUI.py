@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext
 from config_manager import ConfigManager
 from drtool import UTF8Decoder_LUA_to_UTF8 as UTF8
+from drtool import VerifyASM
 
 class DemoGUI:
     def __init__(self, config_path="config.json"):
@@ -50,6 +51,7 @@ class DemoGUI:
                 self.log_message("  'theme' - open theme config")
                 self.log_message("  'reset' - reset config")
                 self.log_message("  'utf8' or 'utf8 xx x' - decode UTF-8")
+                self.log_message("  'verify' or 'verify car' - check LU → ASM → LU round-trip")
 
             case "theme":
                 self.cfg.open_themes_window(self.root)
@@ -63,6 +65,11 @@ class DemoGUI:
                 utf8_tool.set_log_callback(self.log_message)
                 utf8_tool.cli(args)  # Pass arguments to CLI method
 
+            case "verify":
+                verify_tool = VerifyASM()
+                verify_tool.set_log_callback(self.log_message)
+                verify_tool.cli(args)
+
             case _:
                 self.log_message(f"Unknown command: {command}")
                 self.log_message("Enter 'help' to get list of available commands")
@@ -1,6 +1,7 @@
 import os
 import re
 import sys
+import mmap
 import subprocess
 import shutil
 import time
@@ -10,7 +11,348 @@ from tkinter import filedialog, messagebox
 from abc import ABC, abstractmethod
 from config_manager import ConfigManager
 import concurrent.futures
+import importlib.util
+import hashlib
+import json
 import threading
+import queue
+
+
+# Runs of Lua byte escapes (\ddd) as printed by unluac; '\\' is matched only to be kept as is
+LUA_ESCAPE_RUN = re.compile(r'(?:\\(?:\d{1,3}|\\))+')
+LUA_ESCAPE_RUN_BYTES = re.compile(rb'(?:\\(?:\d{1,3}|\\))+')
+LUA_ESCAPE = re.compile(r'\\(\d{1,3}|\\)')
+# Two escaped bytes in a row: part of a multibyte character
+ESCAPED_PAIR_BYTES = re.compile(rb'\\\d{3}\\\d{3}')
+ASSIGNED_STRING = re.compile(r'( = ")([^"]+?)(")')
+
+
+def _decode_run(run):
+    """One run of escapes -> UTF-8 text; left escaped if it is not valid UTF-8 (binary data)"""
+    try:
+        if '\\\\' in run:
+            data = b''.join(b'\\\\' if code == '\\' else bytes((int(code),)) for code in LUA_ESCAPE.findall(run))
+        else:
+            data = bytes(map(int, run[1:].split('\\')))
+        return data.decode('utf-8')
+    except (ValueError, UnicodeDecodeError):  # code > 255 or not UTF-8
+        return run
+
+
+def _decode_escape_run(match):
+    return _decode_run(match.group(0))
+
+
+# b'65', b'065', b'208' -> byte value
+ESCAPED_BYTE = {digits % code: code for code in range(256) for digits in (b'%d', b'%02d', b'%03d')}
+
+
+def _decode_escape_run_bytes(match):
+    run = match.group(0)
+    try:
+        data = bytes(map(ESCAPED_BYTE.__getitem__, run[1:].split(b'\\')))
+        data.decode('utf-8')
+        return data
+    except KeyError:  # '\\' in the run or code > 255
+        return _decode_run(run.decode('ascii')).encode('utf-8')
+    except UnicodeDecodeError:
+        return run
+
+
+def decode_lua_escapes(text):
+    """Decode \\ddd byte escapes of the whole text to UTF-8 in one linear pass"""
+    if '\\' not in text:
+        return text
+    return LUA_ESCAPE_RUN.sub(_decode_escape_run, text)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def largest_first(tasks, size=lambda task: file_size(task[0])):
+    """Batch tasks ordered by input size, largest first: a big file started last would keep one worker busy alone"""
+    return sorted(tasks, key=size, reverse=True)
+
+
+def size_timeout(size, base=30, per_mb=60):
+    """Timeout in seconds for one file: base plus per_mb seconds for every MB of input"""
+    return base + per_mb * size / (1024 * 1024)
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def chunk_by_size(tasks, chunk_bytes, size=lambda task: file_size(task[0])):
+    """Split tasks (order kept) into chunks of about chunk_bytes input; a bigger file is a chunk of its own"""
+    chunks, chunk, total = [], [], 0
+    for task in tasks:
+        n = size(task)
+        if chunk and total + n > chunk_bytes:
+            chunks.append(chunk)
+            chunk, total = [], 0
+        chunk.append(task)
+        total += n
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def gil_enabled():
+    """False on a free-threaded build with the GIL off: threads then run Python code in parallel"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+DECODE_WINDOW = 1024 * 1024  # input bytes handled at once (whole lines), bounds the memory of one decoding
+
+
+def _valid_utf8(data):
+    """Bytes without the parts that are not UTF-8 (as reading with errors='ignore')"""
+    if data.isascii():
+        return data
+    try:
+        data.decode('utf-8')
+        return data
+    except UnicodeDecodeError:
+        return data.decode('utf-8', 'ignore').encode('utf-8')
+
+
+def _decode_lua_window(data, f_out):
+    """Decode whole lines of the file: lines with escaped assignments are decoded, the rest is copied"""
+    copied = checked = 0  # everything before is written / looked at
+    match = ESCAPED_PAIR_BYTES.search(data)
+    while match:
+        line_start = data.rfind(b'\n', checked, match.start()) + 1 or checked
+        line_end = checked = data.find(b'\n', match.end()) + 1 or len(data)
+        marker = data.find(b' = "', line_start, line_end)
+        if marker >= 0 and (marker + 4 <= match.start() or ESCAPED_PAIR_BYTES.search(data, marker + 4, line_end)):
+            f_out.write(data[copied:line_start])
+            f_out.write(LUA_ESCAPE_RUN_BYTES.sub(_decode_escape_run_bytes, data[line_start:line_end]))
+            copied = line_end
+        match = ESCAPED_PAIR_BYTES.search(data, checked)  # next line with escapes
+    f_out.write(data[copied:])
+
+
+def decode_lua_file(input_path, output_path):
+    """Decode escaped UTF-8 in assigned strings of a .lua file, other lines are copied as is"""
+    # create output dir if necessary
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    # Bytes from a memory map window by window: no text layer, no string per line, lines without escapes are copied in bulk
+    with open(input_path, 'rb') as f_in, open(output_path, 'wb') as f_out:
+        size = os.fstat(f_in.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos = 0
+            while pos < size:
+                end = data.find(b'\n', min(pos + DECODE_WINDOW, size) - 1) + 1 or size
+                _decode_lua_window(_valid_utf8(data[pos:end]), f_out)
+                pos = end
+
+
+def _decode_lua_chunk(tasks):
+    """Worker job: decode (input_path, output_path) pairs, only statuses go back to the parent"""
+    results = []
+    for input_path, output_path in tasks:
+        try:
+            decode_lua_file(input_path, output_path)
+            results.append((input_path, True, None))
+        except Exception as e:
+            results.append((input_path, False, str(e)))
+    return results
+
+
+class BuildManifest:
+    """Inputs of the last batch run of a tool (hash, tool version, output): unchanged files are skipped"""
+
+    VERSION = 1
+
+    def __init__(self, manifest_file, tool_version):
+        self.manifest_file = manifest_file
+        self.tool_version = tool_version
+        self.entries = {}  # input path -> entry of the last run
+        self.current = {}  # entries of this run
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self.VERSION and manifest.get("tool") == tool_version:
+                self.entries = manifest.get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def _stat(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def is_current(self, input_path, output_path):
+        """True if the input has the hash of the last run and its output is still the one written then"""
+        key = os.path.abspath(input_path)
+        entry = self.entries.get(key)
+        if not entry or entry["output"] != os.path.abspath(output_path):
+            return False
+        try:
+            if self._stat(output_path) != entry["output_stat"]:
+                return False
+            stat = self._stat(input_path)
+            # size and mtime are enough for untouched files, a saved but unchanged file is hashed
+            if stat != entry["stat"]:
+                if file_sha1(input_path) != entry["sha1"]:
+                    return False
+                entry = dict(entry, stat=stat)
+        except (OSError, KeyError):
+            return False
+        self.current[key] = entry
+        return True
+
+    def done(self, input_path, output_path):
+        """Record a successfully processed file"""
+        try:
+            self.current[os.path.abspath(input_path)] = {
+                "stat": self._stat(input_path),
+                "sha1": file_sha1(input_path),
+                "output": os.path.abspath(output_path),
+                "output_stat": self._stat(output_path),
+            }
+        except OSError:
+            pass
+
+    def remove_orphans(self):
+        """Delete outputs of inputs removed since the last run (unless the output was changed since); returns their number"""
+        removed = 0
+        for key, entry in self.entries.items():
+            if key in self.current or os.path.exists(key):
+                continue
+            output_path = entry.get("output")
+            try:
+                if self._stat(output_path) == entry.get("output_stat"):
+                    os.remove(output_path)
+                    removed += 1
+            except (OSError, TypeError):
+                pass
+        return removed
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+        manifest = {"version": self.VERSION, "tool": self.tool_version, "entries": self.current}
+        with open(self.manifest_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+
+class FileNameIndex:
+    """File names under a folder with trigram postings for name lookups, kept in the version temp folder.
+    Folder mtimes change when files are added, removed or renamed: only such folders are listed again."""
+
+    VERSION = 1
+    _loaded = {}  # index file -> FileNameIndex, kept for later lookups in this process
+
+    def __init__(self, index_file, root, extension=".lua"):
+        self.index_file = index_file
+        self.root = root
+        self.extension = extension
+        self.dirs = {}  # relative folder -> [mtime_ns, file names, subfolders]
+        self.files = None  # relative file paths, postings hold positions in this list
+        self.names = None  # lowercase file names
+        self.postings = None  # trigram of a lowercase name -> positions
+        try:
+            with open(index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == self.VERSION and index.get("root") == root \
+                    and index.get("extension") == extension:
+                self.dirs = index.get("dirs", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @classmethod
+    def get(cls, index_file, root, extension=".lua"):
+        """Index of the folder, loaded once per process and brought up to date"""
+        index = cls._loaded.get(index_file)
+        if index is None or index.root != root or index.extension != extension:
+            index = cls._loaded[index_file] = cls(index_file, root, extension)
+        index.refresh()
+        return index
+
+    def _list(self, folder):
+        files, subdirs = [], []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif entry.name.lower().endswith(self.extension):
+                    files.append(entry.name)
+        return sorted(files), sorted(subdirs)
+
+    def refresh(self):
+        """List again the folders changed since the last lookup; the index is saved if any did"""
+        dirs = {}
+        changed = False
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            folder = os.path.join(self.root, rel)
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+                entry = self.dirs.get(rel)
+                if not entry or entry[0] != mtime:
+                    entry = [mtime, *self._list(folder)]
+                    changed = True
+            except OSError:  # removed in the meantime
+                continue
+            dirs[rel] = entry
+            stack.extend(os.path.join(rel, subdir) for subdir in entry[2])
+
+        if changed or len(dirs) != len(self.dirs):
+            self.dirs = dirs
+            self.files = None
+            try:
+                self.save()
+            except OSError:
+                pass  # still works for this process
+        if self.files is None:
+            self._build_postings()
+
+    def _build_postings(self):
+        self.files, self.names, self.postings = [], [], {}
+        for rel, (mtime, files, subdirs) in sorted(self.dirs.items()):
+            for name in files:
+                position = len(self.files)
+                self.files.append(os.path.join(rel, name))
+                name = name.lower()
+                self.names.append(name)
+                for trigram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                    self.postings.setdefault(trigram, []).append(position)
+
+    def _matching(self, keyword):
+        """Positions of the names containing the keyword"""
+        if len(keyword) < 3:
+            return [position for position, name in enumerate(self.names) if keyword in name]
+        # only names having the rarest trigram of the keyword are checked
+        candidates = min((self.postings.get(keyword[i:i + 3], ()) for i in range(len(keyword) - 2)), key=len)
+        return [position for position in candidates if keyword in self.names[position]]
+
+    def search(self, keywords, limit=None):
+        """Paths of the files whose names contain most keywords, best first; shorter names first among equal"""
+        scores = {}
+        for keyword in keywords:
+            for position in self._matching(keyword.lower()):
+                scores[position] = scores.get(position, 0) + 1
+        ranked = sorted(scores, key=lambda position: (-scores[position], len(self.names[position]), self.files[position]))
+        return [os.path.join(self.root, self.files[position]) for position in ranked[:limit]]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        index = {"version": self.VERSION, "root": self.root, "extension": self.extension, "dirs": self.dirs}
+        with open(self.index_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(self.index_file + ".tmp", self.index_file)
 
 
 class BaseTool(ABC):
@@ -72,6 +414,25 @@ class BaseTool(ABC):
     def set_reload_callback(self, callback):
         self.reload_callback = callback
 
+    def load_build_manifest(self, tool_version):
+        """Manifest of the last batch run of this tool (one per tool class, kept in the version temp folder)"""
+        manifest_file = os.path.join(self.paths['temp'], "manifests", f"{type(self).__name__}.json")
+        return BuildManifest(manifest_file, tool_version)
+
+    def _skip_unchanged(self, manifest, tasks):
+        """Tasks whose input or output changed since the last run; logs how many were skipped"""
+        changed = [task for task in tasks if not manifest.is_current(*task)]
+        if len(changed) < len(tasks):
+            self.log(f"⏭️ Unchanged since last run: {len(tasks) - len(changed)} files skipped")
+        return changed
+
+    def _finish_manifest(self, manifest):
+        """Remove outputs of deleted inputs and save the manifest"""
+        removed = manifest.remove_orphans()
+        if removed:
+            self.log(f"🗑️ Removed {removed} outputs of deleted files")
+        manifest.save()
+
     def log(self, message):
         """Logging tool"""
         if self.log_callback:
@@ -107,7 +468,68 @@ class BaseTool(ABC):
 
 class DRTool(BaseTool):
     """Base Class for DayR Tools (Corona Archiver, Unluac, Luac)"""
-    pass
+
+    # Helper scripts imported in-process, keyed by absolute path
+    _modules = {}
+
+    def load_module(self, name, path):
+        """Import a helper script by path once and reuse it for every run"""
+        path = os.path.abspath(path)
+        module = DRTool._modules.get(path)
+        if module is None:
+            # Make sibling imports of the script work (e.g. 'from OpCodes import ...')
+            script_dir = os.path.dirname(path)
+            if script_dir not in sys.path:
+                sys.path.insert(0, script_dir)
+
+            spec = importlib.util.spec_from_file_location(name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                sys.modules.pop(name, None)  # no half-initialized module for the next call
+                raise
+            DRTool._modules[path] = module
+        return module
+
+    def load_corona_archiver(self):
+        """Corona Archiver module from the configured corona-archiver.py"""
+        corona_archiver_path = self.cfg.get("corona-archiver")
+        if not corona_archiver_path or not os.path.exists(corona_archiver_path):
+            raise FileNotFoundError("Corona Archiver path not configured")
+        return self.load_module("corona_archiver", corona_archiver_path)
+
+    def _car_manifest_path(self):
+        """Manifest for incremental CAR packing (kept in temp, so it never ends up in the APK)"""
+        return os.path.join(self.paths['temp'], "resource.car.manifest.json")
+
+    def _find_apk(self):
+        """First APK of the version APK folder or None"""
+        apk_folder = self.paths['apk']
+        if os.path.isdir(apk_folder):
+            apk_files = [f for f in os.listdir(apk_folder) if f.lower().endswith(".apk")]
+            if apk_files:
+                return os.path.join(apk_folder, apk_files[0])
+        return None
+
+    def _archive_progress(self, done, total):
+        """Forward archiver progress (entries) to the GUI progress bar"""
+        if self.progress_callback and total:
+            progress = int(done / total * 100)
+            if progress != getattr(self, '_last_progress', None):
+                self._last_progress = progress
+                self.progress_callback(progress)
+
+    @staticmethod
+    def _format_archive_result(result):
+        """Human readable summary of ArchiveResult"""
+        mb = result.bytes / (1024 * 1024)
+        summary = (f"{result.entries} files, {mb:.1f} MB in {result.elapsed:.2f}s "
+                   f"({result.throughput / (1024 * 1024):.1f} MB/s)")
+        if result.reused:
+            summary += f", {result.reused} unchanged reused"
+        return summary
 
 class APKTool(BaseTool):
     """Base class for APK operations"""
@@ -1135,8 +1557,9 @@ class VersionManager(APKTool):
         if not self.versions_dir or not os.path.exists(self.versions_dir):
             return []
 
+        # Hidden folders (e.g. the shared .cache) are not versions
         versions = [d for d in os.listdir(self.versions_dir)
-                    if os.path.isdir(os.path.join(self.versions_dir, d))]
+                    if os.path.isdir(os.path.join(self.versions_dir, d)) and not d.startswith(".")]
         return sorted(versions, reverse=True)
 
     def update_version_on_select(self, selected_version):
@@ -1394,32 +1817,48 @@ class deCAR(DRTool):
         self.result_message = ""
 
     def run(self):
-        self.log("🔓 Starting CAR unpacking...")
+        """Launch CAR unpacking in a background thread"""
+        thread = threading.Thread(target=self._unpack_car)
+        thread.daemon = True
+        thread.start()
 
-        corona_archiver_path = self.cfg.get("corona-archiver")
+    def _unpack_car(self):
+        """Unpack resource.car to 'lu' folder with in-process Corona Archiver"""
+        self.log("🔓 Starting CAR unpacking...")
 
         input_file = os.path.join(self.paths['apk_unpacked'], "assets", "resource.car")
         output_dir = self.paths['lu']
 
+        apk_file = None
         if not os.path.exists(input_file):
-            self.result_message = "CAR file not found"
-            self.log(f"❌ resource.car not found in: {input_file}")
-            return
+            # No apktool decode yet: read assets/resource.car straight from the APK
+            apk_file = self._find_apk()
+            if not apk_file:
+                self.result_message = "CAR file not found"
+                self.log(f"❌ resource.car not found in: {input_file}")
+                return
 
         try:
-            self.log(f"✅ CAR decompilation started to {output_dir}")
-            subprocess.Popen([
-                "python",
-                corona_archiver_path,
-                "-u",
-                input_file,
-                output_dir,
-            ], creationflags=self.subprocess_flags)
+            corona_archiver = self.load_corona_archiver()
+
+            self.log(f"🔄 CAR decompilation started to {output_dir}")
+            archiver = corona_archiver.CoronaArchiver(progress_callback=self._archive_progress)
+            if apk_file:
+                self.log(f"📦 Reading assets/resource.car from {os.path.basename(apk_file)}")
+                result = archiver.unpack(input_file=apk_file, output_dir=output_dir,
+                                         member="assets/resource.car")
+            else:
+                os.makedirs(self.paths['temp'], exist_ok=True)
+                result = archiver.unpack(input_file=input_file, output_dir=output_dir,
+                                         manifest_file=self._car_manifest_path())
+
+            self.result_message = f"CAR unpacked: {result.entries} files"
+            self.log(f"✅ CAR decompiled to {output_dir}: {self._format_archive_result(result)}")
 
         except Exception as e:
             self.result_message = f"Error: {str(e)}"
             self.log(f"❌ CAR unpacking error: {str(e)}")
-        self.log(f"✅ CAR decompiled to {output_dir}")
+
     def message(self):
         return self.result_message
 class ToCAR(DRTool):
@@ -1434,8 +1873,13 @@ class ToCAR(DRTool):
             self.log("❌ CAR packaging cancelled by user")
             return
 
-        corona_archiver_path = self.cfg.get("corona-archiver")
-        input_dir = self.paths['lu'] + os.path.sep
+        thread = threading.Thread(target=self._pack_car)
+        thread.daemon = True
+        thread.start()
+
+    def _pack_car(self):
+        """Pack 'lu' folder to resource.car with in-process Corona Archiver"""
+        input_dir = self.paths['lu']
         output_file = os.path.join(self.paths['apk_unpacked'], "assets", "resource.car")
 
         if not os.path.exists(input_dir):
@@ -1447,24 +1891,19 @@ class ToCAR(DRTool):
         self.log(f"📁 Output: {output_file}")
 
         try:
+            corona_archiver = self.load_corona_archiver()
+
             # create output in case
-            os.makedirs(self.paths['output'], exist_ok=True)
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
             self.log("🔄 Packaging CAR file...")
-            subprocess.run([
-                "python",
-                corona_archiver_path,
-                "-p",
-                input_dir,
-                output_file
-            ],creationflags=self.subprocess_flags)
-
-            if os.path.exists(output_file):
-                self.result_message = "CAR packaging completed successfully"
-                self.log("✅ CAR packaging completed")
-            else:
-                self.result_message = "Error: Output file not created"
-                self.log("❌ Output file not found")
+            archiver = corona_archiver.CoronaArchiver(progress_callback=self._archive_progress)
+            os.makedirs(self.paths['temp'], exist_ok=True)
+            result = archiver.pack(input_dir=input_dir, output_file=output_file,
+                                   incremental=True, manifest_file=self._car_manifest_path())
+
+            self.result_message = "CAR packaging completed successfully"
+            self.log(f"✅ CAR packaging completed: {self._format_archive_result(result)}")
 
         except Exception as e:
             self.result_message = f"Error: {str(e)}"
@@ -1473,15 +1912,180 @@ class ToCAR(DRTool):
     def message(self):
         return self.result_message
 
+class UnluacWorker:
+    """Long-lived JVM running unluac for many files (protocol in utils/Unluac/UnluacWorker.java)"""
+
+    SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils", "Unluac", "UnluacWorker.java")
+
+    def __init__(self, java_path, unluac_path, flags=None, creationflags=0):
+        self.cmd = [java_path, "-cp", unluac_path, self.SOURCE] + list(flags or [])
+        self.creationflags = creationflags
+        self.process = None
+
+    def start(self, timeout=60):
+        """Start the JVM and wait for its READY line"""
+        self.process = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, creationflags=self.creationflags)
+        if self._read_line(timeout) != b"READY":
+            self.stop()
+            raise RuntimeError("unluac worker did not start")
+
+    def stop(self):
+        if self.process:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def decompile(self, input_path, timeout=30):
+        """Decompiled source of one .lu as lines, read from the pipe while the caller consumes them"""
+        size = self._start_request(input_path, timeout)
+
+        # The timer kills the JVM if the body is not read in time: readline then returns b""
+        expired = threading.Event()
+        process = self.process
+
+        def kill():
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        complete = False
+        try:
+            remaining = size
+            while remaining:
+                line = process.stdout.readline(remaining)
+                if not line:
+                    if expired.is_set():
+                        raise TimeoutError(f"unluac timed out after {timeout}s")
+                    raise RuntimeError("unluac worker stopped")
+                remaining -= len(line)
+                # universal newlines as in the java -jar path: Java println writes "\r\n" on Windows
+                yield line.replace(b"\r\n", b"\n").replace(b"\r", b"\n").decode("utf-8", errors="replace")
+            complete = True
+        finally:
+            timer.cancel()
+            if not complete:
+                self.stop()  # rest of the body is still in the pipe
+
+    def _start_request(self, input_path, timeout):
+        """Send one path and read the reply header; restarts the JVM after a crash or timeout"""
+        fresh = self.process is None or self.process.poll() is not None
+        if fresh:
+            self.start()
+        try:
+            status, size = self._request(input_path, timeout)
+        except TimeoutError:
+            self.stop()
+            raise
+        except (OSError, RuntimeError):
+            self.stop()
+            if fresh:
+                raise
+            # JVM died after the previous request (unluac exits on broken input): retry once on a new one
+            self.start()
+            try:
+                status, size = self._request(input_path, timeout)
+            except (OSError, RuntimeError):
+                self.stop()
+                raise
+        if status == b"ERR":
+            try:
+                body = self._read_exact(size, timeout).decode("utf-8", errors="replace")
+            except (OSError, RuntimeError):
+                self.stop()
+                raise
+            raise RuntimeError(body.strip() or "unluac failed")
+        return size
+
+    def _request(self, input_path, timeout):
+        """Send one path, return (status, body size)"""
+        self.process.stdin.write(os.path.abspath(input_path).encode("utf-8") + b"\n")
+        self.process.stdin.flush()
+        header = self._read_line(timeout)
+        status, _, size = header.partition(b" ")
+        if status not in (b"OK", b"ERR") or not size.isdigit():
+            raise RuntimeError("unluac worker stopped")
+        return status, int(size)
+
+    def _with_timeout(self, timeout, read):
+        """Run a blocking pipe read, killing the JVM if it takes longer than timeout"""
+        expired = threading.Event()
+        process = self.process
+
+        def kill():
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            data = read()
+        finally:
+            timer.cancel()
+        if expired.is_set():
+            raise TimeoutError(f"unluac timed out after {timeout}s")
+        return data
+
+    def _read_line(self, timeout):
+        line = self._with_timeout(timeout, self.process.stdout.readline)
+        if not line:
+            raise RuntimeError("unluac worker stopped")
+        return line.rstrip(b"\r\n")
+
+    def _read_exact(self, size, timeout):
+        data = self._with_timeout(timeout, lambda: self.process.stdout.read(size))
+        if len(data) != size:
+            raise RuntimeError("unluac worker stopped")
+        return data
+
+
+class UnluacWorkerPool:
+    """Small pool of UnluacWorker shared by decompilation threads"""
+
+    def __init__(self, size, *args, **kwargs):
+        self.workers = queue.Queue()
+        self.all = [UnluacWorker(*args, **kwargs) for _ in range(size)]
+        for worker in self.all:
+            self.workers.put(worker)
+
+    def decompile(self, input_path, timeout=30):
+        """Lines of UnluacWorker.decompile; the worker stays taken until they are consumed"""
+        worker = self.workers.get()
+        try:
+            yield from worker.decompile(input_path, timeout)
+        finally:
+            self.workers.put(worker)
+
+    def close(self):
+        for worker in self.all:
+            worker.stop()
+
+
 class UnluacBase(DRTool):
     """Base class fo LU decompilation"""
 
+    # sha256 of unluac jars, keyed by (path, size, mtime)
+    _jar_hashes = {}
+
     def __init__(self, config_path="config.json"):
         super().__init__(config_path)
         self.result_message = ""
         self.unluac_path = self.cfg.get("unluac")
         self.java_path = self.cfg.get("java")
 
+        # Long-lived unluac JVMs, started on the first cache miss (None - one java process per file)
+        # ("unluac_workers" in config, 0 = one per CPU up to 4: every JVM holds its own heap)
+        self.jvm_workers = self.cfg.get("unluac_workers") or max(1, min(4, os.cpu_count() or 1))
+        self._pool = None
+        self._pool_size = 0
+        self._pool_lock = threading.Lock()
+        self._cache_hits = 0
+
     @abstractmethod
     def get_input_output_paths(self):
         """abstract method should be implemented in subclass"""
@@ -1495,45 +2099,152 @@ class UnluacBase(DRTool):
         try:
             filename = os.path.basename(input_path)
 
-            cmd = [self.java_path, "-jar", self.unluac_path]
-            cmd.extend(self.get_unluac_flags())
-            cmd.append(input_path)
-
-            result = subprocess.run(cmd, encoding='utf-8', capture_output=True, text=True, check=True, timeout=30, creationflags=self.subprocess_flags)
-
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-            #Looking for ALL assignment strings and decode ALL sequences in them
-            decoded_content = re.sub(
-                r'( = ")([^"]+?)(")',
-                lambda m: m.group(1) + self._decode_all_sequences_in_string(m.group(2)) + m.group(3),
-                result.stdout
-            )
-
-            with open(output_path, 'w', encoding='utf-8') as f_out:
-                f_out.write(decoded_content)
+            # unluac output is written line by line as it arrives; a failed file leaves no partial .lua
+            temp_path = output_path + ".tmp"
+            lines = self._cached_unluac(input_path)
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f_out:
+                    for line in lines:
+                        #Looking for ALL assignment strings and decode ALL sequences in them
+                        #(unluac prints every string constant on one line, so a match never spans lines)
+                        if '\\' in line:
+                            line = ASSIGNED_STRING.sub(
+                                lambda m: m.group(1) + decode_lua_escapes(m.group(2)) + m.group(3),
+                                line
+                            )
+                        f_out.write(line)
+                os.replace(temp_path, output_path)
+            except BaseException:
+                lines.close()
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
 
             return True, filename, None
 
         except Exception as e:
             return False, os.path.basename(input_path), str(e)
 
-    def _decode_all_sequences_in_string(self, text):
-        """Decodes all UTF8 sequences in string"""
-        out = bytearray()
-        temp_text = text
+    def build_version(self):
+        """Identity of the decompiler for the build manifest: jar and flags"""
+        return f"unluac {self._jar_hash()} {' '.join(self.get_unluac_flags())}"
 
-        while temp_text:
-            match = re.match(r'\\(\d{1,3})', temp_text)
-            if match:
-                char_code = int(match.group(1))
-                out.extend(bytes([char_code]))
-                temp_text = temp_text[match.end():]
-            else:
-                out.extend(temp_text[0].encode('utf-8'))
-                temp_text = temp_text[1:]
+    def _cache_dir(self):
+        """Decompilation cache shared by all versions (hidden folder in versions_dir)"""
+        versions_dir = self.cfg.get("versions_dir")
+        return os.path.join(versions_dir, ".cache", "unluac") if versions_dir else None
+
+    def _jar_hash(self):
+        """sha256 of the unluac jar, computed once per jar size/mtime"""
+        st = os.stat(self.unluac_path)
+        key = (os.path.abspath(self.unluac_path), st.st_size, st.st_mtime_ns)
+        digest = UnluacBase._jar_hashes.get(key)
+        if digest is None:
+            with open(self.unluac_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            UnluacBase._jar_hashes[key] = digest
+        return digest
+
+    def _cached_unluac(self, input_path):
+        """Lines of unluac output from the content-addressed cache (bytecode + jar + flags), decompiling on a miss"""
+        cache_dir = self._cache_dir()
+        if not cache_dir:
+            yield from self._run_unluac(input_path)
+            return
+
+        with open(input_path, "rb") as f:
+            bytecode = f.read()
+        key = hashlib.sha256()
+        key.update(self._jar_hash().encode("ascii"))
+        key.update("\0".join(self.get_unluac_flags()).encode("utf-8") + b"\n")
+        key.update(bytecode)
+        key = key.hexdigest()
+        cache_file = os.path.join(cache_dir, key[:2], key + ".lua")
+
+        try:
+            f = open(cache_file, "r", encoding="utf-8", newline="")
+        except OSError:
+            f = None
+        if f:
+            with self._pool_lock:
+                self._cache_hits += 1
+            with f:
+                yield from f
+            return
+
+        # The cache entry is written alongside the output and only published once unluac finished
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8", newline="") as f:
+                for line in self._run_unluac(input_path):
+                    f.write(line)
+                    yield line
+            os.replace(temp_file, cache_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _run_unluac(self, input_path):
+        """Decompiled source of one .lu as lines (persistent JVM worker if running, else java per file)"""
+        timeout = size_timeout(file_size(input_path))
+        pool = self._get_pool()
+        if pool:
+            yield from pool.decompile(input_path, timeout=timeout)
+            return
+
+        cmd = [self.java_path, "-jar", self.unluac_path]
+        cmd.extend(self.get_unluac_flags())
+        cmd.append(input_path)
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8',
+                                   creationflags=self.subprocess_flags)
+        expired = threading.Event()
 
-        return out.decode('utf-8')
+        def kill():
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        complete = False
+        try:
+            yield from process.stdout
+            complete = True
+        finally:
+            timer.cancel()
+            if not complete:
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+    def _get_pool(self):
+        """Worker pool, started by the first thread that needs Java"""
+        with self._pool_lock:
+            if self._pool is None and self._pool_size:
+                self._pool = self._start_pool(self._pool_size)
+                if not self._pool:
+                    self._pool_size = 0
+            return self._pool
+
+    def _start_pool(self, size):
+        """Start the JVM worker pool; falls back to java per file if the worker cannot start"""
+        pool = UnluacWorkerPool(size, self.java_path, self.unluac_path, self.get_unluac_flags(),
+                                creationflags=self.subprocess_flags)
+        try:
+            pool.all[0].start()  # others start on first use
+        except Exception as e:
+            pool.close()
+            self.log(f"⚠️ unluac worker unavailable ({str(e)}), starting java per file")
+            return None
+        self.log(f"☕ Started unluac worker pool: {size} JVM")
+        return pool
 
     def _decode_lu_files(self):
         """Decopmilating logic"""
@@ -1557,9 +2268,6 @@ class UnluacBase(DRTool):
                 self.log("❌ No .lu files found")
                 return
 
-            total_files = len(lu_files)
-            self.log(f"📁 Files to process: {total_files}")
-
             # Create output dir
             os.makedirs(output_dir, exist_ok=True)
 
@@ -1571,25 +2279,43 @@ class UnluacBase(DRTool):
                 output_path = os.path.join(output_dir, output_file)
 
                 tasks.append((lu_file_path, output_path))
+            tasks = largest_first(tasks)
+
+            # Only files changed since the last run
+            manifest = self.load_build_manifest(self.build_version())
+            tasks = self._skip_unchanged(manifest, tasks)
+
+            total_files = len(tasks)
+            self.log(f"📁 Files to process: {total_files}")
+            if not tasks:
+                self._finish_manifest(manifest)
+                self.log("✅ Nothing to decompile")
+                self.result_message = "Nothing to decompile"
+                return
 
             # file processing
             processed_count = 0
             failed_count = 0
             error_messages = []
 
+            # Cache hits never start Java; JVM usage is limited by the worker pool size
             max_workers = min(len(tasks), os.cpu_count() * 2)
+            self._pool_size = min(len(tasks), self.jvm_workers)
+            self._cache_hits = 0
 
             with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
                 future_to_file = {
-                    executor.submit(self._process_single_file, input_path, output_path): input_path
+                    executor.submit(self._process_single_file, input_path, output_path): (input_path, output_path)
                     for input_path, output_path in tasks
                 }
 
                 for future in concurrent.futures.as_completed(future_to_file):
-                    input_path = future_to_file[future]
+                    input_path, output_path = future_to_file[future]
                     try:
                         success, filename, error = future.result()
                         processed_count += 1
+                        if success:
+                            manifest.done(input_path, output_path)
 
                         if self.progress_callback:
                             progress = int((processed_count / total_files) * 100)
@@ -1605,6 +2331,9 @@ class UnluacBase(DRTool):
                         error_messages.append(f"❌ {os.path.basename(input_path)}: {str(e)}")
 
             self.log(f"✅ Decompilation completed: {processed_count - failed_count}/{total_files} successful")
+            self._finish_manifest(manifest)
+            if self._cache_hits:
+                self.log(f"♻️ Taken from cache: {self._cache_hits} files")
 
             if failed_count > 0:
                 self.log(f"❌ Failed files: {failed_count}")
@@ -1616,25 +2345,10 @@ class UnluacBase(DRTool):
         except Exception as e:
             self.log(f"❌ Decompilation error: {str(e)}")
 
-    def _decode_line(self, line):
-        """Decode line if UTF8 sequence found"""
-        if re.search(r' = ".*\\\d{3}\\\d{3}', line):
-            return self._decode_utf8_sequence(line)
-        return line
-
-    def _decode_utf8_sequence(self, sequence):
-        """Decoding UTF-8 sequence"""
-        out = bytearray()
-        temp_seq = sequence
-        while temp_seq:
-            match = re.match(r'\\(\d{1,3})', temp_seq)
-            if match:
-                char_code = int(match.group(1))
-                out.extend(bytes([char_code]))
-                temp_seq = temp_seq[match.end():]
-            else:
-                break
-        return out.decode('utf-8')
+        finally:
+            if self._pool:
+                self._pool.close()
+                self._pool = None
 
     def run(self):
         """Launch decompilation in a separate thread"""
@@ -1669,6 +2383,12 @@ class LuacBase(DRTool):
         super().__init__(config_path)
         self.result_message = ""
         self.luac_path = self.cfg.get("luac")  # Теперь путь из конфига
+        # luac processes running at once ("luac_workers" in config, 0 = one per CPU)
+        self.max_workers = self.cfg.get("luac_workers") or os.cpu_count()
+        # "luac" - external luac (default), "python" - opt-in built-in compiler scripts/asm/compile_lu.py
+        self.backend = self.cfg.get("luac_backend", "luac")
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.compiler_path = os.path.join(script_dir, "scripts", "asm", "compile_lu.py")
 
     def get_input_output_paths(self):
         """Method to be overridden in child classes"""
@@ -1689,18 +2409,29 @@ class LuacBase(DRTool):
                         lua_files.append(full_path)
         return lua_files
 
+    def build_version(self):
+        """Identity of the compiler for the build manifest: luac path, size and mtime or compile_lu.py hash"""
+        if self.backend == "python":
+            return f"compile_lu {file_sha1(self.compiler_path)}"
+        luac_path = os.path.abspath(self.luac_path or "")
+        mtime = os.path.getmtime(luac_path) if os.path.exists(luac_path) else 0
+        return f"luac {luac_path} {file_size(luac_path)} {mtime}"
+
+    @staticmethod
+    def _output_path(input_path, output_dir):
+        """Compiled file: output folder is flat, name.lua -> name.lu"""
+        return os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".lu")
+
     def _process_single_file(self, input_path, output_dir):
         """Process single file with temporary file approach"""
         try:
             filename = os.path.basename(input_path)
-            file_name_without_extension = os.path.splitext(filename)[0]
 
             # Create output filename
-            output_filename = f"{file_name_without_extension}.lu"
-            output_path = os.path.join(output_dir, output_filename)
+            output_path = self._output_path(input_path, output_dir)
 
-            # Create temporary file for compilation result
-            temp_output_path = output_path + ".tmp"
+            # Create temporary file for compilation result (per thread: same names from different folders may compile at once)
+            temp_output_path = f"{output_path}.{threading.get_ident()}.tmp"
 
             # Remove temporary file if it exists
             if os.path.exists(temp_output_path):
@@ -1714,9 +2445,7 @@ class LuacBase(DRTool):
             # Check if temporary file was created successfully
             if os.path.exists(temp_output_path):
                 # Replace original file with temporary file
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-                shutil.move(temp_output_path, output_path)
+                os.replace(temp_output_path, output_path)
                 return True, filename, None
             else:
                 error_msg = result.stderr.strip() if result.stderr else "Compilation failed - no output file created"
@@ -1735,8 +2464,29 @@ class LuacBase(DRTool):
                 except:
                     pass
 
+    def _compile_with_luac(self, tasks, output_dir, max_workers):
+        """External luac: one process per file, at most max_workers at once; yields (input_path, result)"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_file = {
+                executor.submit(self._process_single_file, input_path, output_dir): input_path
+                for input_path, output_path in tasks
+            }
+
+            for future in concurrent.futures.as_completed(future_to_file):
+                input_path = future_to_file[future]
+                try:
+                    yield input_path, future.result()
+                except Exception as e:
+                    yield input_path, (False, os.path.basename(input_path), str(e))
+
+    def _compile_in_process(self, tasks, max_workers):
+        """Built-in compiler in a process pool, no luac needed; yields (input_path, result)"""
+        compile_lu = self.load_module("compile_lu", self.compiler_path)
+        for success, input_path, error in compile_lu.compile_files(tasks, workers=max_workers):
+            yield input_path, (success, os.path.basename(input_path), error)
+
     def _compile_lua_files(self):
-        """Sequential compilation without threading"""
+        """Parallel compilation: built-in compiler or one luac process per file, at most max_workers at once"""
         try:
             input_dir, output_dir = self.get_input_output_paths()
 
@@ -1753,40 +2503,64 @@ class LuacBase(DRTool):
                 self.log("❌ No .lua files found")
                 return
 
-            total_files = len(lua_files)
-            self.log(f"📁 Found {total_files} .lua files")
+            # Output folder is flat: for equal names the file found last wins, as in sequential compilation
+            by_output = {}
+            for lua_file_path in lua_files:
+                by_output[os.path.normcase(os.path.splitext(os.path.basename(lua_file_path))[0])] = lua_file_path
+            if len(by_output) < len(lua_files):
+                self.log(f"⚠️ {len(lua_files) - len(by_output)} files skipped: same name in another folder")
+            tasks = largest_first([(path, self._output_path(path, output_dir)) for path in by_output.values()])
+            self.log(f"📁 Found {len(tasks)} .lua files")
+
+            # Only files changed since the last run
+            manifest = self.load_build_manifest(self.build_version())
+            tasks = self._skip_unchanged(manifest, tasks)
+            total_files = len(tasks)
+            if not tasks:
+                self._finish_manifest(manifest)
+                self.log("✅ Nothing to compile")
+                self.result_message = "Nothing to compile"
+                return
 
             # Create output directory
             os.makedirs(output_dir, exist_ok=True)
 
-            # Process files SEQUENTIALLY (no threading)
             processed_count = 0
             failed_count = 0
             error_messages = []
+            start_time = time.time()
 
-            for lua_file_path in lua_files:
-                success, filename, error = self._process_single_file(lua_file_path, output_dir)
+            max_workers = min(total_files, self.max_workers)
+            if self.backend == "python":
+                results = self._compile_in_process(tasks, max_workers)
+            else:
+                results = self._compile_with_luac(tasks, output_dir, max_workers)
+            output_paths = dict(tasks)
+
+            for input_path, (success, filename, error) in results:
                 processed_count += 1
+                if success:
+                    manifest.done(input_path, output_paths[input_path])
 
                 # Progress bar updates
                 if self.progress_callback:
                     progress = int((processed_count / total_files) * 100)
                     self.progress_callback(progress)
 
-                if success:
-                    self.log(f"✅ Compiled: {filename}")
-                else:
+                if not success:
                     failed_count += 1
-                    error_msg = f"❌ {filename}: {error}"
-                    error_messages.append(error_msg)
-                    self.log(error_msg)
+                    error_messages.append(f"❌ {filename}: {error}")
 
             # Results
             success_count = processed_count - failed_count
-            self.log(f"✅ Compilation completed: {success_count}/{total_files} successful")
+            self.log(f"✅ Compilation completed: {success_count}/{total_files} successful "
+                     f"in {time.time() - start_time:.2f}s ({max_workers} workers, {self.backend})")
+            self._finish_manifest(manifest)
 
             if failed_count > 0:
                 self.log(f"❌ Failed files: {failed_count}")
+                for error_msg in error_messages:
+                    self.log(error_msg)
 
             self.result_message = f"Compiled {success_count}/{total_files} files"
 
@@ -1820,48 +2594,51 @@ class UTF8Decoder(BaseTool):
     def __init__(self, config_path="config.json"):
         super().__init__(config_path)
         self.result_message = ""
+        # Decoding processes ("utf8_workers" in config, 0 = one per CPU)
+        self.max_workers = self.cfg.get("utf8_workers") or os.cpu_count()
 
     @abstractmethod
     def get_input_output_paths(self):
         """Abstract method to be implemented in subclasses"""
         raise NotImplementedError("Subclasses must implement get_input_output_paths")
 
-    def decode_utf8_sequences(self, line):
-        """Decoding UTF8 escape-sequences to readlable text"""
-        out = bytearray()
-        while line:
-            match = re.match(r'\\(\d{1,3})', line)
-            if match:
-                char_code = int(match.group(1))
-                out.extend(bytes([char_code]))
-                line = line[match.end():]
-            else:
-                out.extend(line[0].encode('utf-8'))
-                line = line[1:]
-
-        return out.decode('utf-8')
+    def build_version(self):
+        """Identity of the decoder for the build manifest"""
+        return "utf8 decode_lua_file 2"
 
     def _process_single_file(self, input_path, output_path):
         """Process the file"""
         try:
-            # create output dir if necessary
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-            with open(input_path, 'r', encoding='utf-8', errors='ignore') as f_in, \
-                    open(output_path, 'w', encoding='utf-8') as f_out:
-
-                for line in f_in:
-                    # Determine if the input contains any UTF-8 escape-encoded characters
-                    if re.search(r' = ".*\\\d{3}\\\d{3}', line):
-                        line = self.decode_utf8_sequences(line)
-
-                    f_out.write(line)
-
+            decode_lua_file(input_path, output_path)
             return True, os.path.basename(input_path), None
 
         except Exception as e:
             return False, os.path.basename(input_path), str(e)
 
+    def _decode_tasks(self, tasks, max_workers):
+        """Decode in worker processes (threads if the GIL is off), yields (input_path, success, error)"""
+        # Decoding is pure Python: threads would wait for the GIL. Files are sent in chunks of about
+        # equal size, so small scripts do not cost a round trip each and big ones still start first
+        total = sum(file_size(input_path) for input_path, output_path in tasks)
+        chunks = chunk_by_size(tasks, total // (max_workers * 8) + 1)
+        if max_workers == 1 or len(chunks) < 2 or total < 1024 * 1024:  # not worth starting processes
+            for chunk in chunks:
+                yield from _decode_lua_chunk(chunk)
+            return
+
+        if gil_enabled():
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        with executor:
+            future_to_chunk = {executor.submit(_decode_lua_chunk, chunk): chunk for chunk in chunks}
+            for future in concurrent.futures.as_completed(future_to_chunk):
+                try:
+                    yield from future.result()
+                except Exception as e:  # worker process died
+                    for input_path, output_path in future_to_chunk[future]:
+                        yield input_path, False, str(e)
+
     def _decode_files(self):
         """Core logic for file decoding"""
         try:
@@ -1873,9 +2650,10 @@ class UTF8Decoder(BaseTool):
                 self.log(f"❌ Input directory not found: {input_dir}")
                 return
 
-            # Performing a recursive scan for .lua files
+            # Performing a recursive scan for .lua files (output folder may be inside, e.g. 5_EDITING/UTF-8)
             lua_files = []
             for root, dirs, files in os.walk(input_dir):
+                dirs[:] = [d for d in dirs if os.path.join(root, d) != output_dir]
                 for file in files:
                     if file.lower().endswith(".lua"):
                         lua_files.append(os.path.join(root, file))
@@ -1884,9 +2662,6 @@ class UTF8Decoder(BaseTool):
                 self.log("❌ No .lua files found")
                 return
 
-            total_files = len(lua_files)
-            self.log(f"📁 Files to process: {total_files}")
-
             # Create output dir
             os.makedirs(output_dir, exist_ok=True)
 
@@ -1896,43 +2671,48 @@ class UTF8Decoder(BaseTool):
                 relative_path = os.path.relpath(lua_file_path, input_dir)
                 output_path = os.path.join(output_dir, relative_path)
                 tasks.append((lua_file_path, output_path))
+            tasks = largest_first(tasks)
+
+            # Only files changed since the last run
+            manifest = self.load_build_manifest(self.build_version())
+            tasks = self._skip_unchanged(manifest, tasks)
+
+            total_files = len(tasks)
+            self.log(f"📁 Files to process: {total_files}")
+            if not tasks:
+                self._finish_manifest(manifest)
+                self.log("✅ Nothing to decode")
+                self.result_message = "Nothing to decode"
+                return
 
             # File processing with progress tracking
             processed_count = 0
             failed_count = 0
             error_messages = []
 
-            max_workers = min(len(tasks), os.cpu_count() * 2)
+            max_workers = min(len(tasks), self.max_workers)
+            output_paths = dict(tasks)
+            start_time = time.time()
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_file = {
-                    executor.submit(self._process_single_file, input_path, output_path): input_path
-                    for input_path, output_path in tasks
-                }
-
-                for future in concurrent.futures.as_completed(future_to_file):
-                    input_path = future_to_file[future]
-                    try:
-                        success, filename, error = future.result()
-                        processed_count += 1
-
-                        # Progress bar updates triggered through callback
-                        if self.progress_callback:
-                            progress = int((processed_count / total_files) * 100)
-                            self.progress_callback(progress)
+            for input_path, success, error in self._decode_tasks(tasks, max_workers):
+                processed_count += 1
+                if success:
+                    manifest.done(input_path, output_paths[input_path])
 
-                        if not success:
-                            failed_count += 1
-                            error_messages.append(f"❌ {filename}: {error}")
+                # Progress bar updates triggered through callback
+                if self.progress_callback:
+                    progress = int((processed_count / total_files) * 100)
+                    self.progress_callback(progress)
 
-                    except Exception as e:
-                        processed_count += 1
-                        failed_count += 1
-                        error_messages.append(f"❌ {os.path.basename(input_path)}: {str(e)}")
+                if not success:
+                    failed_count += 1
+                    error_messages.append(f"❌ {os.path.basename(input_path)}: {error}")
 
             # Result
             success_count = processed_count - failed_count
-            self.log(f"✅ UTF8 decoding completed: {success_count}/{total_files} successful")
+            self.log(f"✅ UTF8 decoding completed: {success_count}/{total_files} successful "
+                     f"in {time.time() - start_time:.2f}s")
+            self._finish_manifest(manifest)
 
             if failed_count > 0:
                 self.log(f"❌ Failed files: {failed_count}")
@@ -1950,38 +2730,27 @@ class UTF8Decoder(BaseTool):
         thread.daemon = True
         thread.start()
 
-    def find_file_by_pattern(self, search_pattern, search_dir=None):
-        """Search for a file matching the pattern in the specified directory"""
+    def find_files_by_pattern(self, search_pattern, search_dir=None, limit=None):
+        """Files matching the pattern in the specified directory, best first"""
         if search_dir is None:
             search_dir = self.paths['lua']  # default output folder
 
         if not os.path.exists(search_dir):
             self.log(f"❌ Search directory not found: {search_dir}")
-            return None
-
-        # Split the pattern into keywords
-        keywords = search_pattern.lower().split()
-
-        best_match = None
-        best_score = 0
-
-        for root, dirs, files in os.walk(search_dir):
-            for file in files:
-                if file.lower().endswith('.lua'):
-                    file_lower = file.lower()
+            return []
 
-                    # Count the number of keyword matches
-                    score = sum(1 for keyword in keywords if keyword in file_lower)
+        # Names of the folder are indexed once and kept up to date, no full walk per lookup
+        search_dir = os.path.abspath(search_dir)
+        digest = hashlib.sha1(search_dir.encode("utf-8")).hexdigest()[:12]
+        index = FileNameIndex.get(os.path.join(self.paths['temp'], "file_index", f"{digest}.json"), search_dir)
 
-                    if score > best_score:
-                        best_score = score
-                        best_match = os.path.join(root, file)
-                    elif score == best_score and best_match:
-                        # If scores are equal, select the shorter name
-                        if len(file) < len(os.path.basename(best_match)):
-                            best_match = os.path.join(root, file)
+        # Split the pattern into keywords, the score is the number of keywords in the file name
+        return index.search(search_pattern.lower().split(), limit)
 
-        return best_match
+    def find_file_by_pattern(self, search_pattern, search_dir=None):
+        """Search for a file matching the pattern in the specified directory"""
+        matches = self.find_files_by_pattern(search_pattern, search_dir, limit=1)
+        return matches[0] if matches else None
 
     def _decode_single_file_cli(self, search_pattern):
         """Decode a single file by pattern via CLI"""
@@ -1990,13 +2759,16 @@ class UTF8Decoder(BaseTool):
         self.log(f"🔍 Searching for file with pattern: '{search_pattern}'")
 
         # File search
-        file_path = self.find_file_by_pattern(search_pattern)
+        matches = self.find_files_by_pattern(search_pattern, limit=6)
 
-        if not file_path:
+        if not matches:
             self.log(f"❌ File not found for pattern: '{search_pattern}'")
             return False
 
+        file_path = matches[0]
         self.log(f"✅ Found file: {os.path.basename(file_path)}")
+        if len(matches) > 1:
+            self.log(f"🔎 Other matches: {', '.join(os.path.basename(path) for path in matches[1:])}")
 
         # SAve output path
         output_path = os.path.join(output_dir, os.path.basename(file_path))
@@ -2030,7 +2802,7 @@ class UTF8Decoder(BaseTool):
 
     Commands:
       (no arguments)   - Decode all .lua files
-      <pattern>        - Search and decode file by pattern
+      <pattern>        - Search and decode file by pattern (best match, other matches are listed)
       ? or help        - Show this help message
 
     Examples:
@@ -2059,148 +2831,78 @@ class UTF8Decoder_INPUT_to_OUTPUT(UTF8Decoder):
 #endregion
 
 class CLScript(DRTool):
-    """Base class for running external CLI scripts"""
+    """Base class for the scripts/asm tools, loaded in-process with load_module"""
 
     def __init__(self, config_path="config.json"):
         super().__init__(config_path)
         self.result_message = ""
         self.script_path = None
-        self.default_args = []
 
     def set_script_path(self, script_path):
         """Set the path to the CLI script"""
         self.script_path = script_path
 
-    def set_default_args(self, args):
-        """Set default arguments for the script"""
-        self.default_args = args
-
-    def run_script(self, input_path, output_path=None, extra_args=None):
-        """Run the CLI script with given parameters"""
-        try:
-            if not self.script_path or not os.path.exists(self.script_path):
-                self.log(f"❌ Script not found: {self.script_path}")
-                return False
-
-            # Build command
-            cmd = ["python", self.script_path]
-
-            # Add default arguments
-            cmd.extend(self.default_args)
-
-            # Add input path
-            cmd.append(input_path)
-
-            # Add output path if provided
-            if output_path:
-                cmd.append(output_path)
-
-            # Add extra arguments if provided
-            if extra_args:
-                cmd.extend(extra_args)
-
-            self.log(f"🔄 Running: {' '.join(cmd)}")
-
-            # Execute script
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
-            )
-
-            if result.returncode == 0:
-                self.log(f"✅ Script executed successfully")
-                if result.stdout:
-                    self.log(f"📋 Output: {result.stdout.strip()}")
-                return True
-            else:
-                self.log(f"❌ Script failed with code {result.returncode}")
-                if result.stderr:
-                    self.log(f"💬 Error: {result.stderr.strip()}")
-                return False
-
-        except Exception as e:
-            self.log(f"❌ Error running script: {str(e)}")
-            return False
-
-    def run_script_on_file(self, input_file, output_file=None, extra_args=None):
-        """Run script on a single file"""
-        if not os.path.exists(input_file):
-            self.log(f"❌ Input file not found: {input_file}")
-            return False
-
-        return self.run_script(input_file, output_file, extra_args)
-
-    def run_script_on_directory(self, input_dir, output_dir=None, input_extension=".lu", output_extension=None,
-                                extra_args=None):
-        """Run script on all files in directory with given input extension, convert to output extension"""
-        try:
-            if not os.path.exists(input_dir):
-                self.log(f"❌ Input directory not found: {input_dir}")
-                return False
+    def _find_jobs(self, input_dir, output_dir=None, input_extension=".lu", output_extension=None):
+        """(input_file, output_file) pairs for all files with input extension, output directories are created"""
+        if not os.path.exists(input_dir):
+            self.log(f"❌ Input directory not found: {input_dir}")
+            return []
 
-            # If output extension not specified, use same as input
-            if output_extension is None:
-                output_extension = input_extension
+        # If output extension not specified, use same as input
+        if output_extension is None:
+            output_extension = input_extension
 
-            # Find all files with specified extension
-            files_to_process = []
-            for root, dirs, files in os.walk(input_dir):
-                for file in files:
-                    if file.lower().endswith(input_extension.lower()):
-                        files_to_process.append(os.path.join(root, file))
+        # Find all files with specified extension
+        files_to_process = []
+        for root, dirs, files in os.walk(input_dir):
+            for file in files:
+                if file.lower().endswith(input_extension.lower()):
+                    files_to_process.append(os.path.join(root, file))
 
-            if not files_to_process:
-                self.log(f"❌ No {input_extension} files found in {input_dir}")
-                return False
+        if not files_to_process:
+            self.log(f"❌ No {input_extension} files found in {input_dir}")
+            return []
 
-            total_files = len(files_to_process)
-            self.log(f"📁 Found {total_files} {input_extension} files to process")
+        self.log(f"📁 Found {len(files_to_process)} {input_extension} files to process")
 
-            # Create output directory if specified
+        jobs = []
+        for input_file in files_to_process:
+            # Determine output file path with correct extension
+            output_file = None
             if output_dir:
-                os.makedirs(output_dir, exist_ok=True)
-
-            # Process files
-            processed_count = 0
-            failed_count = 0
-
-            for input_file in files_to_process:
-                # Determine output file path with correct extension
-                output_file = None
-                if output_dir:
-                    relative_path = os.path.relpath(input_file, input_dir)
-                    # Change file extension
-                    base_name = os.path.splitext(relative_path)[0]
-                    output_file = os.path.join(output_dir, base_name + output_extension)
-                    # Ensure output directory exists
-                    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-                # Run script on file
-                success = self.run_script_on_file(input_file, output_file, extra_args)
-
-                if success:
-                    processed_count += 1
-                else:
-                    failed_count += 1
-
-                # Update progress
-                if self.progress_callback:
-                    progress = int((processed_count + failed_count) / total_files * 100)
-                    self.progress_callback(progress)
+                relative_path = os.path.relpath(input_file, input_dir)
+                # Change file extension
+                base_name = os.path.splitext(relative_path)[0]
+                output_file = os.path.join(output_dir, base_name + output_extension)
+                # Ensure output directory exists
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            jobs.append((input_file, output_file))
+        return largest_first(jobs)
+
+    def _collect_results(self, results, total_files):
+        """Log (success, filename, error) results of an in-process batch and update progress"""
+        processed_count = 0
+        failed_count = 0
+
+        for success, filename, error in results:
+            if success:
+                processed_count += 1
+            else:
+                failed_count += 1
+                self.log(f"❌ {os.path.basename(filename)}: {error}")
 
-            # Report results
-            self.log(f"✅ Processing completed: {processed_count}/{total_files} successful")
-            if failed_count > 0:
-                self.log(f"❌ Failed: {failed_count} files")
+            # Update progress
+            if self.progress_callback:
+                progress = int((processed_count + failed_count) / total_files * 100)
+                self.progress_callback(progress)
 
-            self.result_message = f"Processed {processed_count}/{total_files} files"
-            return processed_count > 0
+        # Report results
+        self.log(f"✅ Processing completed: {processed_count}/{total_files} successful")
+        if failed_count > 0:
+            self.log(f"❌ Failed: {failed_count} files")
 
-        except Exception as e:
-            self.log(f"❌ Error processing directory: {str(e)}")
-            return False
+        self.result_message = f"Processed {processed_count}/{total_files} files"
+        return processed_count > 0
 
     @abstractmethod
     def run(self):
@@ -2215,25 +2917,45 @@ class ASMLu(CLScript):
     def __init__(self, config_path="config.json"):
         super().__init__(config_path)
 
-        # Set path to asm_lu.py script
+        # Set path to asm_lu.py library
         script_dir = os.path.dirname(os.path.abspath(__file__))
-        asm_script_path = os.path.join(script_dir, "scripts", "ASM", "asm_lu.py")
+        asm_script_path = os.path.join(script_dir, "scripts", "asm", "asm_lu.py")
         self.set_script_path(asm_script_path)
 
+        # Worker processes for batch assembly
+        self.max_workers = os.cpu_count()
+
     def run(self):
-        """Run ASM to LU compilation on input directory"""
+        """Launch ASM to LU compilation in a background thread"""
+        thread = threading.Thread(target=self._assemble)
+        thread.daemon = True
+        thread.start()
+
+    def _assemble(self):
+        """Assemble input directory in-process (process pool, no interpreter per file)"""
         input_dir = self.paths['asm']  # 6_INPUT - source ASM files
         output_dir = self.paths['output']  # 7_OUTPUT - compiled LU files
 
         self.log("🔧 Starting ASM to LU compilation...")
 
-        # Run script on all .asm files in input directory, convert to .lu
-        success = self.run_script_on_directory(
-            input_dir=input_dir,
-            output_dir=output_dir,
-            input_extension=".asm",
-            output_extension=".lu"
-        )
+        try:
+            asm_lu = self.load_module("asm_lu", self.script_path)
+
+            jobs = self._find_jobs(input_dir, output_dir, ".asm", ".lu")
+            if not jobs:
+                self.log("❌ ASM to LU compilation failed")
+                return
+
+            start_time = time.time()
+            # Per-function hashes of the previous build: unchanged functions are reused
+            cache_dir = os.path.join(self.paths['temp'], "asm_cache")
+            results = asm_lu.assemble_files(jobs, workers=self.max_workers, cache_dir=cache_dir)
+            success = self._collect_results(results, len(jobs))
+            self.log(f"⏱️ Assembly time: {time.time() - start_time:.2f}s")
+
+        except Exception as e:
+            self.log(f"❌ Error during assembly: {str(e)}")
+            success = False
 
         if success:
             self.log("✅ ASM to LU compilation completed")
@@ -2245,93 +2967,162 @@ class DisASMLu(CLScript):
     def __init__(self, config_path="config.json"):
         super().__init__(config_path)
 
-        # Set path to disasm_lu.py script
+        # Set path to disasm_lu.py library
         script_dir = os.path.dirname(os.path.abspath(__file__))
-        disasm_script_path = os.path.join(script_dir, "scripts", "ASM", "disasm_lu.py")
+        disasm_script_path = os.path.join(script_dir, "scripts", "asm", "disasm_lu.py")
         self.set_script_path(disasm_script_path)
 
-        # Set default arguments for disassembly (show constants)
-        self.set_default_args(["-c"])
+        # Worker processes for batch disassembly
+        self.max_workers = os.cpu_count()
 
     def run(self):
-        """Run LU to ASM disassembly on input directory"""
+        """Launch LU to ASM disassembly in a background thread"""
+        thread = threading.Thread(target=self._disassemble)
+        thread.daemon = True
+        thread.start()
+
+    def _disassemble(self):
+        """Disassemble input directory in-process (process pool, no interpreter per file)"""
         input_dir = self.paths['input']  # 6_INPUT - source LU files
         output_dir = self.paths['asm']  # 7_OUTPUT - disassembled ASM files
 
         self.log("🔧 Starting LU to ASM disassembly...")
 
-        # Run script on all .lu files in input directory, convert to .asm
-        success = self.run_script_on_directory(
-            input_dir=input_dir,
-            output_dir=output_dir,
-            input_extension=".lu",
-            output_extension=".asm"
-        )
+        try:
+            disasm_lu = self.load_module("disasm_lu", self.script_path)
+
+            jobs = self._find_jobs(input_dir, output_dir, ".lu", ".asm")
+            if not jobs:
+                self.log("❌ LU to ASM disassembly failed")
+                return
+
+            start_time = time.time()
+            # Show constants (required for future assemble)
+            results = disasm_lu.disassemble_files(jobs, workers=self.max_workers, show_consts=True)
+            success = self._collect_results(results, len(jobs))
+            self.log(f"⏱️ Disassembly time: {time.time() - start_time:.2f}s")
+
+        except Exception as e:
+            self.log(f"❌ Error during disassembly: {str(e)}")
+            success = False
 
         if success:
             self.log("✅ LU to ASM disassembly completed")
         else:
             self.log("❌ LU to ASM disassembly failed")
-# class ASMLu_All(CLScript):
-#     """Assemble ASM → LU for all files (from editing to lu)"""
-#
-#     def __init__(self, config_path="config.json"):
-#         super().__init__(config_path)
-#
-#         # Set path to asm_lu.py script
-#         script_dir = os.path.dirname(os.path.abspath(__file__))
-#         asm_script_path = os.path.join(script_dir, "scripts", "ASM", "asm_lu.py")
-#         self.set_script_path(asm_script_path)
-#
-#     def run(self):
-#         """Run ASM to LU compilation on editing directory"""
-#         input_dir = self.paths['editing']  # 5_EDITING - source ASM files
-#         output_dir = self.paths['lu']  # 3_LU - compiled LU files
-#
-#         self.log("🔧 Starting bulk ASM to LU compilation...")
-#
-#         # Run script on all .asm files in editing directory, convert to .lu
-#         success = self.run_script_on_directory(
-#             input_dir=input_dir,
-#             output_dir=output_dir,
-#             input_extension=".asm",
-#             output_extension=".lu"
-#         )
-#
-#         if success:
-#             self.log("✅ Bulk ASM to LU compilation completed")
-#         else:
-#             self.log("❌ Bulk ASM to LU compilation failed")
-# class DisASMLu_All(CLScript):
-#     """Disassemble LU → ASM for all files (from lu to editing)"""
-#
-#     def __init__(self, config_path="config.json"):
-#         super().__init__(config_path)
-#
-#         # Set path to disasm_lu.py script
-#         script_dir = os.path.dirname(os.path.abspath(__file__))
-#         disasm_script_path = os.path.join(script_dir, "scripts", "ASM", "disasm_lu.py")
-#         self.set_script_path(disasm_script_path)
-#
-#         # Set default arguments for disassembly (show constants)
-#         self.set_default_args(["-c"])
-#
-#     def run(self):
-#         """Run LU to ASM disassembly on lu directory"""
-#         input_dir = self.paths['lu']  # 3_LU - source LU files
-#         output_dir = self.paths['editing']  # 5_EDITING - disassembled ASM files
-#
-#         self.log("🔧 Starting bulk LU to ASM disassembly...")
-#
-#         # Run script on all .lu files in lu directory, convert to .asm
-#         success = self.run_script_on_directory(
-#             input_dir=input_dir,
-#             output_dir=output_dir,
-#             input_extension=".lu",
-#             output_extension=".asm"
-#         )
-#
-#         if success:
-#             self.log("✅ Bulk LU to ASM disassembly completed")
-#         else:
-#             self.log("❌ Bulk LU to ASM disassembly failed")
\ No newline at end of file
+class VerifyASM(CLScript):
+    """Round-trip check LU → ASM → LU in memory (disasm_lu -c + asm_lu must reproduce the bytecode)"""
+
+    def __init__(self, config_path="config.json"):
+        super().__init__(config_path)
+
+        # Set path to verify_lu.py library
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        verify_script_path = os.path.join(script_dir, "scripts", "asm", "verify_lu.py")
+        self.set_script_path(verify_script_path)
+
+        # Worker processes for batch verification
+        self.max_workers = os.cpu_count()
+
+    def run(self):
+        """Verify all .lu files of the 3_LU folder in a background thread"""
+        self._start(self._verify_folder)
+
+    def cli(self, args):
+        """CLI interface for GUI integration"""
+        args = args.strip()
+        if not args:
+            self.run()
+        elif args in ["car", "resource.car"]:
+            self._start(self._verify_car)
+        elif args in ["?", "help"]:
+            self._show_help()
+        else:
+            self.log(f"❌ Unknown verify argument: {args}")
+            self._show_help()
+
+    def _show_help(self):
+        """Displays CLI usage help"""
+        help_text = """
+    Verify - LU → ASM → LU round-trip check:
+
+    Commands:
+      (no arguments)   - Verify all .lu files in 3 LU
+      car              - Verify .lu entries of resource.car (or the APK)
+      ? or help        - Show this help message
+    """
+        self.log(help_text.strip())
+
+    def _start(self, target):
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+    def _verify_folder(self):
+        """Verify every .lu of the 3_LU folder"""
+        input_dir = self.paths['lu']
+        self.log(f"🔍 Verifying LU → ASM → LU round-trip in {input_dir}...")
+        try:
+            verify_lu = self.load_module("verify_lu", self.script_path)
+            items = list(verify_lu.find_lu([input_dir]))
+            self._verify(verify_lu, items)
+        except Exception as e:
+            self.log(f"❌ Error during verification: {str(e)}")
+
+    def _verify_car(self):
+        """Verify .lu entries of resource.car (decoded APK or straight from the APK)"""
+        input_file = os.path.join(self.paths['apk_unpacked'], "assets", "resource.car")
+        self.log("🔍 Verifying LU → ASM → LU round-trip in resource.car...")
+        try:
+            corona_archiver = self.load_corona_archiver()
+            if os.path.exists(input_file):
+                reader = corona_archiver.CarReader(input_file)
+            else:
+                apk_file = self._find_apk()
+                if not apk_file:
+                    self.log(f"❌ resource.car not found in: {input_file}")
+                    return
+                reader = corona_archiver.CarReader.from_zip(apk_file, "assets/resource.car")
+
+            with reader:
+                items = [(name, reader.read(name)) for name in reader.names() if name.endswith(".lu")]
+
+            verify_lu = self.load_module("verify_lu", self.script_path)
+            self._verify(verify_lu, items)
+        except Exception as e:
+            self.log(f"❌ Error during verification: {str(e)}")
+
+    def _verify(self, verify_lu, items):
+        """Run the batch and log mismatches with their first differing offset"""
+        if not items:
+            self.log("⚠️ No .lu files to verify")
+            return
+
+        total_files = len(items)
+        # items are (name, path) for a folder and (name, bytes) for resource.car
+        items = largest_first(items, size=lambda item: len(item[1]) if isinstance(item[1], bytes) else file_size(item[1]))
+        start_time = time.time()
+        done = failed = total_bytes = 0
+        for name, size, offset, error in verify_lu.verify_items(items, workers=self.max_workers):
+            done += 1
+            total_bytes += size
+            if error:
+                failed += 1
+                self.log(f"❌ {name}: {error}")
+            elif offset is not None:
+                failed += 1
+                self.log(f"❌ {name}: first difference at offset 0x{offset:x}")
+
+            if self.progress_callback:
+                self.progress_callback(int(done / total_files * 100))
+
+        elapsed = time.time() - start_time
+        mb = total_bytes / (1024 * 1024)
+        speed = f"{mb / elapsed:.1f} MB/s, {total_files / elapsed:.0f} files/s" if elapsed else "-"
+        self.log(f"⏱️ Verified {total_files} files, {mb:.1f} MB in {elapsed:.2f}s ({speed})")
+
+        self.result_message = f"Round-trip OK: {total_files - failed}/{total_files} files"
+        if failed:
+            self.log(f"❌ Round-trip mismatch: {failed}/{total_files} files")
+        else:
+            self.log(f"✅ Round-trip OK: {total_files}/{total_files} files reproduce byte for byte")
@@ -1,10 +1,44 @@
 #!/usr/bin/env python3
+import struct
+from array import array
 
 FILE_HEADER = b'\x1bLuaQ\x00\x01\x04\x04\x04\x08\x00'
 
+INT = struct.Struct('<I')
+NUMBER = struct.Struct('<d')
+
+
+def dump_string(s):
+    '''Строка (bytes или str) в формате .lu: размер вместе с завершающим нулём, None - пустая строка'''
+    if s is None:
+        return INT.pack(0)
+    if isinstance(s, str):
+        s = s.encode('utf-8')
+    return INT.pack(len(s) + 1) + s + b'\0'
+
+
+def dump_constant(c):
+    '''Константа (None, bool, float, строка) -> её байты в .lu; общая для asm_lu и compile_lu'''
+    if c is None:
+        return b'\0'
+    if c is True or c is False:
+        return b'\1\1'  if c else  b'\1\0'
+    if isinstance(c, float):
+        return b'\3' + NUMBER.pack(c)
+    return b'\4' + dump_string(c)
+
+try:
+    import numpy
+except ImportError:     # необязательная зависимость, без неё работает decode_columns на списках
+    numpy = None
+
+NUMPY_MIN_LEN = 32      # на более коротких функциях списки быстрее numpy (16 инструкций: 6 мкс против 8)
+
 #import collections
 #Code = collections.namedtuple('CodeLine', 'full simple gotoes indent')
 class Code:
+    __slots__ = ('full', 'simple', 'gotoes', 'indent', 'comment')     # comment задаётся не всем строкам
+
     def __init__(self, full, simple, gotoes=['',0]):
         self.full = full
         self.simple = simple
@@ -14,9 +48,15 @@ class Code:
 
 
 class OpCode:
+    fields = ()     # раскладка операндов при сборке: (сдвиг, смещение) в порядке записи в тексте
+
     def __init__(self, name):
         self.name = name
 
+    def asm(self, i, args):
+        assert len(self.fields) == len(args),  args
+        return i + sum( (x + bias) << shift  for (shift, bias), x in zip(self.fields, args) )
+
     def unpack_abc(self, code, consts):
         a = (code >> 6) & 0xFF
         c = (code >> 14) & 0x1FF
@@ -25,17 +65,19 @@ class OpCode:
         sbx = (code >> 14) - 131071
         return a,b,c, bx,sbx
 
-    def unpack(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
-#        simple = op_short[code & 0x3F].disasm(code, consts)
-        simple = self.simple_disasm(code, consts)
-        return a,b,c, bx,sbx, simple
+    def disasm(self, code, consts):
+        '''Одна инструкция. Для целых функций быстрее decode_columns() + format()'''
+        return self.format(*self.unpack_abc(code, consts), consts)
+
+    def simple_disasm(self, code, consts):
+        return self.simple_format(*self.unpack_abc(code, consts))
 
 # ----------------- ----------------- ----------------- -----------------
 
 class ABC(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
+    fields = ((6, 0), (23, 0), (14, 0))
+
+    def simple_format(self, a, b, c, bx, sbx):
         if 1:
             if b>=256:  b = '#%i' % (b-256)
             if c>=256:  c = '#%i' % (c-256)
@@ -44,14 +86,10 @@ class ABC(OpCode):
             if c>=256:  c = consts[c-256].__repr__()
         return '%s  %i %s %s' % (self.name, a, b, c)
 
-    def asm(self, i, args):
-        assert 3 == len(args),  args
-        a,b,c = args
-        return i + (a<<6) + (b<<23) + (c<<14)
-
 class AB0C(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
+    fields = ((6, 0), (14, 0))
+
+    def simple_format(self, a, b, c, bx, sbx):
         assert b==0, b
         if 1:
             if c>=256:  c = '#%i' % (c-256)
@@ -59,14 +97,10 @@ class AB0C(OpCode):
             if c>=256:  c = consts[c-256].__repr__()
         return '%s  %i %s' % (self.name, a, c)
 
-    def asm(self, i, args):
-        assert 2 == len(args),  args
-        a,c = args
-        return i + (a<<6) + (c<<14)
-
 class ABC0(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
+    fields = ((6, 0), (23, 0))
+
+    def simple_format(self, a, b, c, bx, sbx):
         assert c==0, c
         if 1:
             if b>=256:  b = '#%i' % (b-256)
@@ -74,71 +108,49 @@ class ABC0(OpCode):
             if b>=256:  b = consts[b-256].__repr__()
         return '%s  %i %s' % (self.name, a, b)
 
-    def asm(self, i, args):
-        assert 2 == len(args),  args
-        a,b = args
-        return i + (a<<6) + (b<<23)
-
 class AB0C0(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
+    fields = ((6, 0),)
+
+    def simple_format(self, a, b, c, bx, sbx):
         assert (b,c) == (0,0),  (b,c)
         return '%s  %i' % (self.name, a)
 
-    def asm(self, i, args):
-        assert 1 == len(args),  args
-        a = args[0]
-        return i + (a<<6)
-
 class ABx(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
-        return '%s  %i %i' % (self.name, a, bx)
+    fields = ((6, 0), (14, 0))
 
-    def asm(self, i, args):
-        assert 2 == len(args),  args
-        a,bx = args
-        return i + (a<<6) + (bx<<14)
+    def simple_format(self, a, b, c, bx, sbx):
+        return '%s  %i %i' % (self.name, a, bx)
 
 class AsBx(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
-        return '%s  %i %i' % (self.name, a, sbx)
+    fields = ((6, 0), (14, 131071))
 
-    def asm(self, i, args):
-        assert 2 == len(args),  args
-        a,sbx = args
-        sbx += 131071
-        return i + (a<<6) + (sbx<<14)
+    def simple_format(self, a, b, c, bx, sbx):
+        return '%s  %i %i' % (self.name, a, sbx)
 
 class A0sBx(OpCode):
-    def simple_disasm(self, code, consts):
-        a,b,c,bx,sbx = self.unpack_abc(code, consts)
+    fields = ((14, 131071),)
+
+    def simple_format(self, a, b, c, bx, sbx):
         assert a==0, a
         return '%s  %i' % (self.name, sbx)
 
-    def asm(self, i, args):
-        assert 1 == len(args),  args
-        sbx = args[0] + 131071
-        return i + (sbx<<14)
-
 # ----------------- ----------------- ----------------- -----------------
 
 class OpMove(ABC0):
-    def disasm(self, code, consts):     # MOVE  A B   R(A) := R(B)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # MOVE  A B   R(A) := R(B)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c==0,  c
         return Code('r%i = r%i' % (a, b), simple)
 
 class OpLoadK(ABx):
-    def disasm(self, code, consts):     # LOADK  A Bx   R(A) := Kst(Bx)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # LOADK  A Bx   R(A) := Kst(Bx)
+        simple = self.simple_format(a, b, c, bx, sbx)
         bx_ = consts[bx].__repr__()
         return Code('r%i = %s' % (a, bx_), simple)
 
 class OpLoadBool(ABC):
-    def disasm(self, code, consts):     # LOADBOOL  A B C   R(A) := (Bool)B; if (C) PC++
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # LOADBOOL  A B C   R(A) := (Bool)B; if (C) PC++
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert b in {0,1},  b
         assert c in {0,1},  c
         b_ = bool(b)
@@ -146,48 +158,48 @@ class OpLoadBool(ABC):
         return Code('r%i = %s %s' % (a, b_, c_), simple, ['LoadB1',1] if c else ['',0])
 
 class OpLoadNIL(ABC0):
-    def disasm(self, code, consts):     # LOADNIL  A B   R(A) := ... := R(B) := nil
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # LOADNIL  A B   R(A) := ... := R(B) := nil
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c==0,  c
         out = ' = '.join([ 'r'+str(i)  for i in range(a,b+1) ])
         return Code('%s = nil' % out, simple)
 
 class OpGetGlobal(ABx):
-    def disasm(self, code, consts):     # GETGLOBAL  A Bx   R(A) := Gbl[Kst(Bx)]
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # GETGLOBAL  A Bx   R(A) := Gbl[Kst(Bx)]
+        simple = self.simple_format(a, b, c, bx, sbx)
         bx_ = consts[bx]
         assert type(bx_) == str,  bx
         return Code('r%i = <%s>' % (a, bx_), simple)
 
 class OpSetGlobal(ABx):
-    def disasm(self, code, consts):     # SETGLOBAL  A Bx   Gbl[Kst(Bx)] := R(A)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # SETGLOBAL  A Bx   Gbl[Kst(Bx)] := R(A)
+        simple = self.simple_format(a, b, c, bx, sbx)
         bx_ = consts[bx]
         assert type(bx_) == str,  bx
         return Code('<%s> = r%i' % (bx_, a), simple)
 
 class OpGetUPVal(ABC0):
-    def disasm(self, code, consts):     # GETUPVAL  A B   R(A) := UpValue[B]
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # GETUPVAL  A B   R(A) := UpValue[B]
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c==0,  c
         return Code('r%i = UP[%i]' % (a, b), simple)
 
 class OpSetUPVal(ABC0):
-    def disasm(self, code, consts):     # SETUPVAL  A B   UpValue[B] := R(A)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # SETUPVAL  A B   UpValue[B] := R(A)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c==0,  c
         return Code('UP[%i] = r%i' % (b, a), simple)
 
 class OpGetTable(ABC):
-    def disasm(self, code, consts):     # GETTABLE  A B C   R(A) := R(B)[RK(C)]
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # GETTABLE  A B C   R(A) := R(B)[RK(C)]
+        simple = self.simple_format(a, b, c, bx, sbx)
         c_ = 'r'+str(c)  if c<256 else  consts[c-256] #.__repr__()
         c_ = '[%s]'%c_  if type(c_) != str or ' ' in c_ else  '.'+c_
         return Code('r%i = r%i%s' % (a, b, c_), simple)
 
 class OpSetTable(ABC):
-    def disasm(self, code, consts):     # SETTABLE  A B C   R(A)[RK(B)] := RK(C)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # SETTABLE  A B C   R(A)[RK(B)] := RK(C)
+        simple = self.simple_format(a, b, c, bx, sbx)
         b_ = 'r'+str(b)  if b<256 else  consts[b-256]
         if type(b_) == str  and  not b_.isprintable():
             b_ = b_.__repr__()
@@ -197,8 +209,8 @@ class OpSetTable(ABC):
 
 class OpAdd(ABC):
     opname = '+'
-    def disasm(self, code, consts):     # ADD  A B C   R(A) := RK(B) + RK(C)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # ADD  A B C   R(A) := RK(B) + RK(C)
+        simple = self.simple_format(a, b, c, bx, sbx)
         b_ = 'r'+str(b)  if b<256 else  consts[b-256].__repr__()
         c_ = 'r'+str(c)  if c<256 else  consts[c-256].__repr__()
         return Code('r%i = %s %s %s' % (a, b_, self.opname, c_), simple)
@@ -216,8 +228,8 @@ class OpPow(OpAdd):
 
 class OpUnM(ABC0):
     opname = '-'
-    def disasm(self, code, consts):     # UNM  A B   R(A) := -R(B)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # UNM  A B   R(A) := -R(B)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c == 0,  c
         return Code('r%i = %sr%i' % (a, self.opname, b), simple)
 
@@ -227,20 +239,20 @@ class OpLen(OpUnM):
     opname = '#'
 
 class OpConcat(ABC):
-    def disasm(self, code, consts):     # CONCAT  A B C   R(A) := R(B).. ... ..R(C)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # CONCAT  A B C   R(A) := R(B).. ... ..R(C)
+        simple = self.simple_format(a, b, c, bx, sbx)
         out = ' .. '.join([ 'r'+str(i)  for i in range(b,c+1) ])
         return Code('r%i = %s' % (a, out), simple)
 
 class OpJmp(A0sBx):
-    def disasm(self, code, consts):     # JMP  sBx   PC += sBx
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # JMP  sBx   PC += sBx
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert a == 0,  a
         return Code('PC += %i' % sbx, simple, ['jmp',sbx])
 
 class OpCall(ABC):
-    def disasm(self, code, consts):     # CALL  A B C   R(A), ... ,R(A+C-2) := R(A)(R(A+1), ... ,R(A+B-1))
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # CALL  A B C   R(A), ... ,R(A+C-2) := R(A)(R(A+1), ... ,R(A+B-1))
+        simple = self.simple_format(a, b, c, bx, sbx)
         out1 = ', '.join([ 'r'+str(i)  for i in range(a, a+c-1) ])
         if c == 0:  out1 = 'r%i...' % a
         if c == 1:  out1 = '_'
@@ -249,32 +261,32 @@ class OpCall(ABC):
         return Code('%s = r%i(%s)' % (out1, a, out2), simple)
 
 class OpReturn(ABC0):
-    def disasm(self, code, consts):     # RETURN  A B   return R(A), ... ,R(A+B-2)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # RETURN  A B   return R(A), ... ,R(A+B-2)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c == 0,  c
         out = ', '.join([ 'r'+str(i)  for i in range(a, a+b-1) ])
         if b == 0:  out = 'r%i...' % a
         return Code('return %s' % out, simple)
 
 class OpTailCall(ABC0):
-    def disasm(self, code, consts):     # TAILCALL  A B  return R(A)(R(A+1), ... ,R(A+B-1))
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # TAILCALL  A B  return R(A)(R(A+1), ... ,R(A+B-1))
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c == 0,  c
         out = ', '.join([ 'r'+str(i)  for i in range(a+1, a+b) ])
         if b == 0: out = 'r%i...' % (a+1)       # есть в config.lu
         return Code('return r%i(%s)' % (a, out), simple)
 
 class OpVARarg(ABC0):
-    def disasm(self, code, consts):     # VARARG  A B   R(A), R(A+1), ..., R(A+B-1) = vararg
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # VARARG  A B   R(A), R(A+1), ..., R(A+B-1) = vararg
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c == 0,  c
         out = ', '.join([ 'r'+str(i)  for i in range(a, a+b) ])
         if b == 0: out = 'r%i...' % a       # есть в config.lu
         return Code('%s = ...' % out, simple)
 
 class OpSelf(ABC):
-    def disasm(self, code, consts):     # SELF  A B C   R(A+1) := R(B); R(A) := R(B)[RK(C)]
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # SELF  A B C   R(A+1) := R(B); R(A) := R(B)[RK(C)]
+        simple = self.simple_format(a, b, c, bx, sbx)
         out1 = 'r%i, r%i' % (a, a+1)
         c_ = 'r'+str(c)  if c<256 else  consts[c-256] #.__repr__()
         assert ' ' not in c_,  c_
@@ -283,8 +295,8 @@ class OpSelf(ABC):
 
 class OpEQ(ABC):         # за ним могут следовать 1-2 jmp  (реализация then ... else ...)
     opname = ('==', '!=')
-    def disasm(self, code, consts):     # EQ  A B C    if ((RK(B) == RK(C)) ~= A) then PC++
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # EQ  A B C    if ((RK(B) == RK(C)) ~= A) then PC++
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert a in {0,1},  a
         b_ = 'r'+str(b)  if b<256 else  consts[b-256].__repr__()
         c_ = 'r'+str(c)  if c<256 else  consts[c-256].__repr__()
@@ -297,41 +309,41 @@ class OpLE(OpEQ):
 
 class OpTest(AB0C):
     opname = ('', ' not')
-    def disasm(self, code, consts):     # TEST  A C   if not (R(A) <=> C) then PC++
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # TEST  A C   if not (R(A) <=> C) then PC++
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert b == 0,  b
         assert c in {0,1},  c
         return Code('IF%s r%i:  PC++' % (self.opname[c], a), simple, ['if',1])
 
 class OpTestSet(ABC):
     opname = ('', ' not')
-    def disasm(self, code, consts):     # TESTSET  A B C   if not (R(B) <=> C) then PC++  else  R(A) := R(B)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # TESTSET  A B C   if not (R(B) <=> C) then PC++  else  R(A) := R(B)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c in {0,1},  c
         return Code('IF%s r%i:  PC++  else  r%i = r%i' % (self.opname[c], b, a, b), simple, ['if',1])
 
 class OpForPrep(AsBx):        # внутри могут быть if/jmp на следущий оператор после ForLoop -- реализация break
-    def disasm(self, code, consts):     # FORPREP  A sBx   R(A) -= R(A+2); PC += sBx
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # FORPREP  A sBx   R(A) -= R(A+2); PC += sBx
+        simple = self.simple_format(a, b, c, bx, sbx)
         return Code('FORstart r%i -= r%i,  PC += %i' % (a, a+2, sbx), simple, ['FORStart',sbx])
 
 class OpForLoop(AsBx):
-    def disasm(self, code, consts):     # FORLOOP  A sBx   R(A) += R(A+2) if R(A) <?= R(A+1) then { PC += sBx; R(A+3) = R(A) }
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # FORLOOP  A sBx   R(A) += R(A+2) if R(A) <?= R(A+1) then { PC += sBx; R(A+3) = R(A) }
+        simple = self.simple_format(a, b, c, bx, sbx)
         return Code('FORend r%i += r%i,  IF r%i <?= r%i: { PC += %i, r%i = r%i }' % (a,a+2, a,a+1, sbx, a+3,a), simple, ['FORend',sbx])
 
 class OpTForLoop(AB0C):        # Цикл работает с генератором.  Перед и после цикла - jmp.  Отрицательный jmp есть ещё при while, repeat-until
-    def disasm(self, code, consts):
+    def format(self, a, b, c, bx, sbx, consts):
         # TFORLOOP  A C   R(A+3), ... ,R(A+2+C) := R(A)(R(A+1), R(A+2)); if R(A+3) ~= nil then { R(A+2) = R(A+3); } else { PC++; }
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert b == 0,  b
         assert c >= 1,  c
         out = ', '.join([ 'r'+str(i)  for i in range(a+3, a+3+c) ])
         return Code('TFORloop %s = r%i(r%i, r%i),  IF r%i != nil:  r%i = r%i  else  PC++' % (out, a,a+1,a+2, a+3, a+2, a+3), simple, ['TFor',1])
 
 class OpNewTable(ABC):
-    def disasm(self, code, consts):     # NEWTABLE  A B C   R(A) := {}  (size = B,C)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # NEWTABLE  A B C   R(A) := {}  (size = B,C)
+        simple = self.simple_format(a, b, c, bx, sbx)
         def fpbyte(a):      # “floating point byte”
             if a >> 3 == 0:  return a
             return (8 + (a & 0x7))  <<  ((a >> 3) - 1)
@@ -339,21 +351,21 @@ class OpNewTable(ABC):
         return Code('r%i = {}%s' % (a, out), simple)
 
 class OpSetList(ABC):
-    def disasm(self, code, consts):     # SETLIST  A B C   R(A)[(C-1)*FPF+i] := R(A+i),  1 <= i <= B
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # SETLIST  A B C   R(A)[(C-1)*FPF+i] := R(A+i),  1 <= i <= B
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert c > 0,  [c, 'If C is 0, the next instruction is cast as an integer, and used as the C value']
         i = 50 * (c - 1)
         end = ('.', '.')  if b == 0 else  (i+b, a+b)
         return Code('r%i[%i..%s] = r%i..%s' % (a, i+1,end[0], a+1,end[1]), simple)
 
 class OpClosure(ABx):
-    def disasm(self, code, consts):     # CLOSURE  A Bx   R(A) := closure(KPROTO[Bx], R(A), ... ,R(A+n))
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # CLOSURE  A Bx   R(A) := closure(KPROTO[Bx], R(A), ... ,R(A+n))
+        simple = self.simple_format(a, b, c, bx, sbx)
         return Code('r%i = closure(KPROTO[%i], r%i, ...)' % (a, bx, a), simple)
 
 class OpClose(AB0C0):
-    def disasm(self, code, consts):     # CLOSE  A   close all variables in the stack up to (>=) R(A)
-        a,b,c,bx,sbx,simple = self.unpack(code, consts)
+    def format(self, a, b, c, bx, sbx, consts):     # CLOSE  A   close all variables in the stack up to (>=) R(A)
+        simple = self.simple_format(a, b, c, bx, sbx)
         assert (b,c) == (0,0),  [b,c]
         return Code('CLOSE r%i+' % a, simple)
 
@@ -368,17 +380,79 @@ opcodes = (
 )
 
 
+def decode_columns(code):
+    '''
+    Разбор всего массива инструкций функции за один проход по каждому полю.
+    code - последовательность uint32 (array('I'), list).
+    Возвращает колонки (op, a, b, c, bx, sbx) - списки int одинаковой длины.
+    Без numpy - списки, а не array: их и строить, и обходить (zip в cfg и disasm_columns) быстрее.
+    '''
+    if numpy is not None  and  len(code) >= NUMPY_MIN_LEN:
+        x = numpy.asarray(code, dtype=numpy.int64)
+        bx = x >> 14
+        return ((x & 0x3F).tolist(), ((x >> 6) & 0xFF).tolist(), ((x >> 23) & 0x1FF).tolist(),
+                (bx & 0x1FF).tolist(), bx.tolist(), (bx - 131071).tolist())
+    bx = [ x >> 14  for x in code ]
+    return ([ x & 0x3F  for x in code ], [ (x >> 6) & 0xFF  for x in code ], [ (x >> 23) & 0x1FF  for x in code ],
+            [ x & 0x1FF  for x in bx ], bx, [ x - 131071  for x in bx ])
+
+def disasm_columns(columns, consts):
+    '''Колонки decode_columns() -> список Code'''
+    return [ opcodes[op].format(a, b, c, bx, sbx, consts)  for op, a, b, c, bx, sbx in zip(*columns) ]
+
+
 opcodes_rev = {}
 for i,op in enumerate(opcodes):  opcodes_rev[ op.name ] = (i, op)
 
-import re
+RK_CONST = 256      # '#N' в тексте - константа N, в поле B/C записывается N+256
+
+# таблица сборки: мнемоника -> (номер операции, ((сдвиг, смещение), ...) по операндам)
+encoding = { op.name: (i, op.fields)  for i,op in enumerate(opcodes) }
+
+
+class EncodeError(ValueError):
+    '''Ошибка в тексте инструкции; index - её номер в списке, переданном encode_instructions()'''
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+def encode_instructions(lines, cache=None):
+    '''
+    Текст инструкций функции (простая форма: 'GetTable  0 0 #3', 'jmp -6') -> array('I') за один проход.
+    cache - dict {текст: код}, общий для всех функций файла (одинаковые инструкции повторяются часто)
+    '''
+    if cache is None:
+        cache = {}
+    out = array('I')
+    append = out.append
+    for index, line in enumerate(lines):
+        code = cache.get(line)
+        if code is not None:
+            append(code)
+            continue
+        name, *args = line.split()  or  ('',)
+        try:
+            code, fields = encoding[name]
+            if len(args) != len(fields):
+                raise EncodeError(index, '%s: expected %i operands, got %i' % (name, len(fields), len(args)))
+            for (shift, bias), x in zip(fields, args):
+                code += ((int(x)  if x[0] != '#' else  int(x[1:]) + RK_CONST) + bias) << shift
+            append(code)
+        except EncodeError:
+            raise
+        except KeyError:
+            raise EncodeError(index, 'unknown opcode %r' % name)  from None
+        except (ValueError, OverflowError) as e:
+            raise EncodeError(index, str(e))  from None
+        cache[line] = code
+    return out
+
+
 def asm_to_code(s, debug=False):
-    c = re.findall(r'(\w+) +([\d #-]+)$', s.strip())[0]
-    code,args = c[0], re.split(r' +', c[1])
-    args = [ int(x)  if x[0]!='#' else  int(x[1:])+256  for x in args ]
-    i,op = opcodes_rev[code]
-    out = op.asm(i, args)
-    if debug:  print('debug:', code, args, '%x'%out)
+    out = encode_instructions([s])[0]
+    if debug:  print('debug:', s.strip(), '%x'%out)
     return out
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
-import re, struct, pprint, sys
-from OpCodes import FILE_HEADER, asm_to_code
+import re, struct, sys, os, json, hashlib
+from OpCodes import FILE_HEADER, INT, encode_instructions, EncodeError, dump_constant
 '''
 FUNC:  всё в квадратных скобках игнорируется. Формат строки задан жёстко.
 CONST: номер переменной игнорируется (важен только их порядок), новые переменные можно вставлять внутри блока кода
@@ -9,94 +9,264 @@ CONST: номер переменной игнорируется (важен то
 отладочная информация игнорируется
 '''
 
-DEBUG = 0
+USAGE = 'usage:  %s  filename.asm  [filename_out.lu]'
 
-fname = sys.argv[1]
-assert fname[-4:] == '.asm',  'Имя файла должно заканчиваться на .asm: %s'%fname
-f_in = open(fname, 'r', encoding='utf-8')
-fname_out = fname[:-4] + '.lu'  if len(sys.argv) < 3 else  sys.argv[2]
-f_out = open(fname_out, 'wb')
+FUNC_RE = re.compile(r'FUNC \[[:\d ,]+\] \((.+)\) ;; ')
+CONST_RE = re.compile(r'CONST \d+ (.+)')
 
+FUNC_PARAMS = struct.Struct('<IIBBBB')
 
-def out_int(i):
-    return struct.pack('<I', i)
+CACHE_VERSION = 1
 
-def out_str(s):
-    out = s.encode('utf-8') + b'\0'
-    return out_int(len(out)) + out
+CONST_FIXED = {'None': b'\0', 'False': b'\1\0', 'True': b'\1\1'}
 
 
-consts = []
-codes = []
-func_levels = []    # стек, определяет сколько на каждом уровне иерархии осталось обработать функций
+class AsmError(ValueError):
+    '''Ошибка в тексте .asm (с номером строки)'''
 
-f_out.write(FILE_HEADER)
-for line in f_in:
-    line = line.rstrip()
-    if DEBUG > 0:  print('LINE:', line)
+    def __init__(self, lineno, message, line):
+        super().__init__('line %i: %s: %r' % (lineno, message, line))
+        self.lineno = lineno
 
 
-    if line.startswith('FUNC '):
-        m = re.match(r'FUNC \[[:\d ,]+\] \((.+)\) ;; ', line)
-        assert m,  ['ERROR FUNC:', line]
-        func_params = eval( m.group(1) )
-        if DEBUG > 2:  print('func_params:', func_params)
-        out = out_int(0) + struct.pack('<IIBBBB', *func_params)
-        if DEBUG > 1:  print('out:', out)
-        f_out.write(out)
+def parse_string(text):
+    '''repr() строки (как её печатает disasm_lu) -> str,  без eval'''
+    quote = text[:1]
+    if len(text) < 2  or  quote not in ('"', "'")  or  text[-1] != quote:
+        raise ValueError('bad string literal')
+    body = text[1:-1]
+    if '\\' not in body:
+        return body
+    # non-latin-1 символы repr() оставляет как есть: переводим их в \uXXXX, чтобы пройти через unicode_escape
+    return body.encode('latin-1', 'backslashreplace').decode('unicode_escape')
 
 
-    elif line.startswith('CONST '):
-        # сначала надо выдать код, затем константы
-        m = re.match(r'CONST \d+ (.+)', line)
-        assert m,  ['ERROR CONST:', line]
-        c = eval( m.group(1) )
-        if DEBUG > 2:  print('m:', [c])
-        if type(c) is float:
-            out = b'\3' + struct.pack('<d', c)
-        elif type(c) is str:
-            out = b'\4' + out_str(c)
-        else:
-            out = {None:b'\0', False:b'\1\0', True:b'\1\1'}[c]
-        if DEBUG > 1:  print('out:', out)
-        consts.append(out)
+def parse_ints(text):
+    '''"0, 0, 0, 0, 2, 2" -> (0, 0, 0, 0, 2, 2)'''
+    return tuple( int(x)  for x in text.split(',') )
 
 
-    elif line.startswith('FUNCS_NUM: '):
-        num = eval(line[11:])
-        if DEBUG > 1:  print('FUNCS_NUM:', num)
-        f_out.write(out_int(len(codes)))         # выдаём код, затем константы
-        [ f_out.write(x)  for x in codes ]
-        codes = []
+def const_to_bytes(text):
+    '''repr() константы (None, True, False, число, строка) -> байты константы в .lu'''
+    out = CONST_FIXED.get(text)
+    if out is not None:
+        return out
+    if text[:1] in ('"', "'"):
+        return dump_constant(parse_string(text))
+    return dump_constant(float(text))
 
-        f_out.write(out_int(len(consts)))
-        [ f_out.write(x)  for x in consts ]
+
+def split_functions(text):
+    '''Текст -> куски по функциям: каждый заканчивается строкой FUNCS_NUM, последний - остаток файла'''
+    marked = '\n' + text       # индекс в marked = индекс в text + 1
+    start = 0
+    found = marked.find('\nFUNCS_NUM: ')
+    while found >= 0:
+        end = marked.find('\n', found + 1)      # конец строки FUNCS_NUM вместе с '\n'
+        end = len(text)  if end < 0 else  end
+        yield text[start:end]
+        start = end
+        found = marked.find('\nFUNCS_NUM: ', end)
+    yield text[start:]
+
+
+class Assembler:
+    '''Ассемблер текста disasm_lu -c обратно в lua-5.1 байткод. Всё состояние в экземпляре.'''
+
+    def assemble(self, text, previous=None):
+        '''
+        текст .asm -> bytes (.lu)
+        previous - {хэш куска: (байты, FUNCS_NUM)} от прошлой сборки: неизменённые функции не собираются заново.
+        После сборки self.functions - [(хэш, смещение в .lu, длина, FUNCS_NUM)] для следующей.
+        '''
+        out = bytearray(FILE_HEADER)
+        self.encoded = {}       # кэш encode_instructions() на весь файл
+        self.functions = []
+        self.reused = 0
+        func_levels = []    # стек, определяет сколько на каждом уровне иерархии осталось обработать функций
+
+        lineno = 1
+        for chunk in split_functions(text):
+            key = hashlib.sha1(chunk.encode('utf-8')).hexdigest()
+            cached = previous.get(key)  if previous else  None
+            if cached:
+                data, num = cached
+                self.reused += 1
+            else:
+                data, num = self.assemble_function(chunk, lineno)
+            lineno += chunk.count('\n')
+            if num is None:     # хвост файла после последней функции
+                out += data
+                continue
+
+            self.functions.append((key, len(out), len(data), num))
+            out += data
+            func_levels.append(num)
+            while func_levels  and  func_levels[-1] == 0:
+                out += bytes(12)        # debug info (3 пустых массива). Это нужно вставить после кода/констант дочерних функций.
+                func_levels.pop()
+                if func_levels:
+                    func_levels[-1] -= 1
+
+        if func_levels:
+            raise ValueError('unfinished functions: %s' % func_levels)
+        return bytes(out)
+
+    def assemble_function(self, text, first_lineno=1):
+        '''Кусок split_functions() -> (байты функции без debug info, FUNCS_NUM или None)'''
+        out = bytearray()
         consts = []
+        codes = []          # простая форма инструкций текущей функции (справа от ' ; ')
+        code_lines = []     # и номера их строк
+        num = None
+
+        for lineno, line in enumerate(text.splitlines(), first_lineno):
+            line = line.rstrip()
+            try:
+                head = line[:1]
+                if head != 'F'  and  head != 'C'  and  ' ; ' in line  and  line.lstrip()[:1] != '#':     # инструкция - самый частый случай
+                    codes.append(line.rpartition(' ; ')[2])
+                    code_lines.append(lineno)
+
+                elif line.startswith('FUNC '):
+                    m = FUNC_RE.match(line)
+                    if not m:  raise ValueError('bad FUNC line')
+                    out += INT.pack(0)      # имя исходника не сохраняется
+                    out += FUNC_PARAMS.pack(*parse_ints(m.group(1)))
+
+                elif line.startswith('CONST '):
+                    # сначала надо выдать код, затем константы
+                    m = CONST_RE.match(line)
+                    if not m:  raise ValueError('bad CONST line')
+                    consts.append(const_to_bytes(m.group(1)))
+
+                elif line.startswith('FUNCS_NUM: '):
+                    num = int(line[11:])
+                    try:
+                        code = encode_instructions(codes, self.encoded)
+                    except EncodeError as e:
+                        lineno, line = code_lines[e.index], codes[e.index]     # ошибку показываем на строке инструкции
+                        raise
+                    if sys.byteorder == 'big':
+                        code.byteswap()
+                    out += INT.pack(len(code))          # выдаём код, затем константы
+                    out += code.tobytes()
+                    out += INT.pack(len(consts))
+                    out += b''.join(consts)
+                    out += INT.pack(num)
+
+                elif line.lstrip().startswith('#'):
+                    continue
+
+                elif line:
+                    raise ValueError('unexpected line')
+
+            except (ValueError, IndexError, struct.error) as e:
+                raise AsmError(lineno, str(e), line)  from None
+
+        return bytes(out), num
+
+
+def assemble(text):
+    '''текст .asm -> bytes (.lu)'''
+    return Assembler().assemble(text)
+
+
+def load_cache(cache_file, fname_out):
+    '''
+    Кэш прошлой сборки: (хэш исходного текста или None, {хэш куска: (байты, FUNCS_NUM)}).
+    Байты функций берутся из прежнего .lu, если он не менялся после сборки.
+    '''
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        st = os.stat(fname_out)
+        if cache.get('version') != CACHE_VERSION  or  [st.st_size, st.st_mtime_ns] != cache['lu']:
+            return None, {}
+        with open(fname_out, 'rb') as f:
+            data = f.read()
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, {}
+    return cache['source'], { key: (data[offset:offset + length], num)  for key, offset, length, num in cache['functions'] }
+
+
+def save_cache(cache_file, fname_out, source, functions):
+    st = os.stat(fname_out)
+    cache = {'version': CACHE_VERSION, 'source': source, 'lu': [st.st_size, st.st_mtime_ns], 'functions': functions}
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+
+
+def assemble_file(fname, fname_out=None, cache_file=None):
+    '''
+    Собрать файл .asm;  по умолчанию результат пишется рядом в .lu
+    cache_file - json с хэшами функций прошлой сборки: неизменённый файл не пересобирается,
+                 у изменённого заново собираются только изменённые функции
+    Возвращает (имя .lu, число функций, взятых из прошлой сборки или None если файл не менялся)
+    '''
+    with open(fname, 'r', encoding='utf-8') as f_in:
+        text = f_in.read()
+    if fname_out is None:
+        fname_out = os.path.splitext(fname)[0] + '.lu'
+
+    previous = {}
+    if cache_file:
+        source = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        old_source, previous = load_cache(cache_file, fname_out)
+        if old_source == source:
+            return fname_out, None
+
+    assembler = Assembler()
+    data = assembler.assemble(text, previous)
+    with open(fname_out, 'wb') as f_out:
+        f_out.write(data)
+    if cache_file:
+        save_cache(cache_file, fname_out, source, assembler.functions)
+    return fname_out, assembler.reused
+
 
-        f_out.write(out_int(num))
-        func_levels.append(num)
-        while func_levels  and  func_levels[-1] == 0:
-            [ f_out.write(out_int(0))  for _ in range(3) ]      # debug info. Это нужно вставить после кода/констант дочерних функций.
-            func_levels.pop()
-            if func_levels:
-                func_levels[-1] -= 1
+def cache_path(cache_dir, fname_out):
+    '''Файл кэша для .lu в общем каталоге кэша (имена из разных подкаталогов не пересекаются)'''
+    digest = hashlib.sha1(os.path.abspath(fname_out).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, '%s.%s.json' % (os.path.basename(fname_out), digest))
 
 
-    elif line.lstrip().startswith('#'):
-        continue
+def _assemble_job(job):
+    '''Задание для пула процессов: (fname, fname_out, cache_file) -> (success, fname, error)'''
+    fname, fname_out, cache_file = job
+    try:
+        assemble_file(fname, fname_out, cache_file)
+        return True, fname, None
+    except Exception as e:
+        return False, fname, '%s: %s' % (type(e).__name__, e)
 
 
-    elif ' ; ' in line:
-        m = re.search(r' ; +(\w+ +[\d #-]+)$', line)
-        codeline = m.group(1)
-        if DEBUG > 2:  asm_to_code(codeline, debug=True)
-        out = out_int( asm_to_code(codeline) )
-        if DEBUG > 1:  print('out:', out)
-        codes.append(out)
+def assemble_files(files, workers=None, cache_dir=None):
+    '''
+    Пакетный режим: files - список пар (fname, fname_out).
+    cache_dir - каталог для кэша функций (см. assemble_file), None - собирать всё заново.
+    Файлы обрабатываются в пуле процессов, результаты (success, fname, error) выдаются по мере готовности.
+    '''
+    jobs = [ (fname, fname_out, cache_path(cache_dir, fname_out)  if cache_dir else  None)  for fname, fname_out in files ]
+    if workers == 1  or  len(jobs) < 2:
+        for job in jobs:
+            yield _assemble_job(job)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed     # не нужен для одиночного запуска из командной строки
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [ executor.submit(_assemble_job, job)  for job in jobs ]
+        for future in as_completed(futures):
+            yield future.result()
 
 
-    else:
-        assert line == '',  [line]
+def main(argv):
+    names = argv[1:]
+    if not names:  print(USAGE % argv[0]);  exit(0)
+    fname = names[0]
+    assert fname[-4:] == '.asm',  'Имя файла должно заканчиваться на .asm: %s'%fname
+    assemble_file(fname, names[1]  if len(names) > 1 else  None)
 
 
-assert func_levels == [],  func_levels
+if __name__ == '__main__':
+    main(sys.argv)
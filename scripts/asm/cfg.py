@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+'''
+Восстановление структуры (циклы, if/else, break) по переходам lua-5.1 байткода.
+
+Вход - колонки инструкций функции (см. OpCodes.decode_columns), выход - Structure:
+граф базовых блоков (Structure.blocks), циклы, if/else, отступы и метки для листинга.
+Граф строится отдельно и отдаётся как данные для анализа; циклы и if/else распознаются,
+как в прежнем calc_indents, по шаблонам переходов, но через индексы и разностный массив отступов.
+Всё считается за линейное время (плюс сортировка if-цепочек), на неожиданных
+формах переходов ничего не падает - такие переходы попадают в Structure.unresolved.
+'''
+import re, collections
+
+# номера операций в OpCodes.opcodes
+OP_LOADBOOL, OP_JMP, OP_EQ, OP_LT, OP_LE, OP_TEST, OP_TESTSET = 2, 22, 23, 24, 25, 26, 27
+OP_TAILCALL, OP_RETURN, OP_FORLOOP, OP_FORPREP, OP_TFORLOOP = 29, 30, 31, 32, 33
+
+# вид перехода: 'jmp' - PC += sBx,  'if' - условный пропуск следующей (всегда jmp) инструкции,
+# 'LoadB1' - LOADBOOL с пропуском следующей,  циклы FOR / TFOR
+KIND_BY_OP = {OP_JMP: 'jmp', OP_EQ: 'if', OP_LT: 'if', OP_LE: 'if', OP_TEST: 'if', OP_TESTSET: 'if',
+              OP_FORLOOP: 'FORend', OP_FORPREP: 'FORStart', OP_TFORLOOP: 'TFor'}
+
+Loop = collections.namedtuple('Loop', 'kind start end')                 # kind: 'for' 'tfor' 'while' 'repeat';  end включительно
+BasicBlock = collections.namedtuple('BasicBlock', 'start end succ')      # [start, end) и номера первых инструкций блоков-преемников
+
+
+class Structure:
+    '''Результат recover_structure(). Все номера - индексы инструкций функции.'''
+    __slots__ = ('kinds', 'targets', 'blocks', 'loops', 'ifs', 'elses', 'breaks', 'chains',
+                 'indent', 'labels', 'comments', 'unresolved')
+
+    def __init__(self, kinds, targets):
+        self.kinds = kinds          # вид перехода или ''
+        self.targets = targets      # абсолютный адрес перехода или None
+        self.blocks = []            # [BasicBlock]
+        self.loops = []             # [Loop]
+        self.ifs = []               # [(if, куда переходит его jmp)]
+        self.elses = {}             # {jmp перед else: первая инструкция else}
+        self.breaks = []            # [jmp]
+        self.chains = []            # объединённые if-цепочки: [[куда, 'откуда ... x|y']]
+        self.indent = []            # уровень вложенности каждой инструкции
+        self.labels = {}            # {инструкция: ['WHILE: ', ...]} в порядке добавления
+        self.comments = {}          # {инструкция: комментарий перед ней}
+        self.unresolved = {}        # {вид: [инструкции]} - переходы, не вошедшие ни в одну конструкцию
+
+    def label(self, i):
+        '''Префикс для текста инструкции i (последняя добавленная метка - первая)'''
+        return ''.join(reversed(self.labels.get(i, ())))
+
+    def gotoes(self, i):
+        '''[вид, адрес] как в колонке листинга'''
+        return [self.kinds[i], self.targets[i]]  if self.kinds[i] else  ['', '']
+
+
+def jumps(ops, c, sbx):
+    '''Колонки op/c/sBx -> (kinds, targets) с абсолютными адресами переходов'''
+    kinds, targets = [], []
+    for i, (op, c_, sbx_) in enumerate(zip(ops, c, sbx)):
+        kind = KIND_BY_OP.get(op, '')
+        if op == OP_LOADBOOL and c_:
+            kind = 'LoadB1'
+        if not kind:
+            kinds.append('');  targets.append(None)
+        elif kind in ('jmp', 'FORend', 'FORStart'):
+            kinds.append(kind);  targets.append(i + 1 + sbx_)
+        else:                           # if, LoadB1, TFor - пропуск одной инструкции
+            kinds.append(kind);  targets.append(i + 2)
+    return kinds, targets
+
+
+def basic_blocks(ops, kinds, targets):
+    '''Разбиение на базовые блоки и рёбра переходов'''
+    n = len(kinds)
+    leaders = {0}  if n else  set()
+    for i, kind in enumerate(kinds):
+        if kind:
+            if 0 <= targets[i] < n:  leaders.add(targets[i])
+            if i + 1 < n:  leaders.add(i + 1)
+            if kind in ('if', 'TFor', 'FORend')  and  i + 2 < n:  leaders.add(i + 2)
+        elif ops[i] == OP_RETURN  and  i + 1 < n:
+            leaders.add(i + 1)
+    starts = sorted(leaders)
+
+    blocks = []
+    for start, end in zip(starts, starts[1:] + [n]):
+        last = end - 1
+        kind, target = kinds[last], targets[last]
+        if kind == 'jmp'  or  kind == 'FORStart':
+            succ = [target]
+        elif kind == 'LoadB1':
+            succ = [target]
+        elif kind in ('if', 'TFor'):
+            succ = [last + 1, last + 2]
+        elif kind == 'FORend':
+            succ = [target, last + 1]
+        elif ops[last] == OP_RETURN:
+            succ = []
+        else:
+            succ = [last + 1]
+        blocks.append(BasicBlock(start, end, [ s  for s in succ  if 0 <= s < n ]))
+    return blocks
+
+
+def recover_structure(ops, c, sbx, debug=0):
+    '''
+    Колонки функции -> Structure.
+    В lua-5.1 нет CONTINUE. Только BREAK.
+    '''
+    kinds, targets = jumps(ops, c, sbx)
+    st = Structure(kinds, targets)
+    st.blocks = basic_blocks(ops, kinds, targets)
+    n = len(kinds)
+    t = targets
+    delta = [0] * (n + 1)       # разностный массив отступов
+
+    def indent(start, end):     # +1 для инструкций [start, end)
+        if start < end:
+            delta[max(start, 0)] += 1
+            delta[min(end, n)] -= 1
+
+    def label(i, text):
+        st.labels.setdefault(i, []).append(text)
+
+    pending = collections.defaultdict(set)      # ещё не разобранные переходы каждого вида
+    order = []                                  # виды в порядке появления (для вывода)
+    for i, kind in enumerate(kinds):
+        if kind:
+            if kind not in pending:  order.append(kind)
+            pending[kind].add(i)
+    cycles = []     # начальные и конечные (включительно) позиции циклов
+
+    # FOR:  i - FORStart,  j - FORend, который возвращается на i+1
+    for i in sorted(pending['FORStart']):
+        j = t[i]
+        if i < j < n  and  kinds[j] == 'FORend'  and  t[j] == i+1:
+            indent(i+1, j+1)
+            cycles.append([i, j])
+            st.loops.append(Loop('for', i, j))
+            pending['FORend'].discard(j)
+            pending['FORStart'].discard(i)
+
+    # TFOR:  i - TFORLOOP;  в i+1 jmp назад на j;  j-1 - первый jmp на TFORLOOP
+    for i in sorted(pending['TFor']):
+        if i+1 < n  and  kinds[i+1] == 'jmp':
+            j = t[i+1]
+            if 1 <= j < i  and  kinds[j-1] == 'jmp'  and  t[j-1] == i:
+                indent(j, i+2)
+                cycles.append([j-1, i+1])
+                st.loops.append(Loop('tfor', j-1, i+1))
+                pending['jmp'].discard(i+1);  pending['jmp'].discard(j-1)
+                pending['TFor'].discard(i)
+                label(j-1, 'TFOR:  ')
+
+    # while, repeat-until: оканчиваются jmp с отрицательным смещением
+    for i in sorted(pending['jmp']):
+        j = t[i]
+        if j > i  or  j < 0:  continue
+        indent(j+1, i+1)
+        cycles.append([j, i])
+        pending['jmp'].discard(i)
+        if kinds[i-1] == 'if':      # repeat-until
+            pending['if'].discard(i-1)
+            label(j, 'REPEAT: ')
+            st.loops.append(Loop('repeat', j, i))
+        else:                       # while. Внутренний if исполняет роль break.
+            label(j, 'WHILE: ')
+            st.loops.append(Loop('while', j, i))
+
+    # break: переход сразу за конец охватывающего цикла
+    cycle_starts = collections.defaultdict(list)    # конец цикла -> начала
+    for j, k in cycles:
+        cycle_starts[k].append(j)
+    for i in sorted(pending['jmp']):
+        k = t[i] - 1
+        for j in cycle_starts.get(k, ()):
+            if j < i < k:
+                label(i, 'BREAK: ')
+                st.breaks.append(i)
+                if not (kinds[i-1] == 'if'  and  t[i-1] == i+1):     # удаляем одинокие break (не являющиеся частью while: там if-jmp)
+                    pending['jmp'].discard(i)
+
+    # Остались только if с положит.смещением и одинокие jmp-else.
+    # i - if;  j - куда переходит jmp i+1;  если есть ELSE, на j-1 месте должен быть jmp
+    stack = []
+    for i in sorted(pending['if']):
+        if i+1 in pending['jmp']  and  t[i+1] > i:
+            j = t[i+1]
+            indent(i+2, j)
+            pending['if'].discard(i)
+            pending['jmp'].discard(i+1)
+            stack.append((i, j))
+    st.ifs = stack
+
+    # оставшиеся jmp должны быть else (есть исключения)
+    if_ends = { j  for i, j in stack }
+    for i in sorted(pending['jmp']):
+        j = t[i]
+        if j <= i:  continue        # назад/на себя без цикла - не разобран
+        if i+1 in if_ends:
+            delta[i] -= 1;  delta[i+1] += 1
+            label(i, 'ELSE: ')
+            pending['jmp'].discard(i)
+            pending['else'].add(i+1)
+            st.elses[i] = i+1
+        elif i+2 in if_ends  and  i+1 < n  and  kinds[i+1] == 'LoadB1'  and  t[i+1] == i+3:     # else на второй LoadB0 из пары
+            delta[i] -= 1;  delta[i+1] += 1
+            label(i, 'ELSE2: ')
+            pending['jmp'].discard(i)
+            pending['else'].add(i+2)
+            st.elses[i] = i+2
+        else:
+            label(i, 'IF-TRUE-ELSE: ')     # в конструкции if true then ... оператор if опускается, остаётся только else (даже если пустой).
+        indent(i+1, j)
+
+    # объединение вложенных if (and/or-цепочки)
+    stack2 = []
+    if debug:
+        print('STACK:', sorted(stack))
+    for j,i in sorted(stack):   # i - куда, j - откуда
+        stack2.append([i, str(j)])
+        while len(stack2) > 1:
+            if stack2[-2][0] == j+2:
+                if debug:
+                    print('ОбъединяемX:', stack2)
+                stack2[-1][1] = '%s %s x' % (stack2[-2][1], stack2[-1][1])
+                stack2.pop(-2)
+                if debug:
+                    print('   --->     ', stack2)
+                continue
+            if stack2[-2][0] == stack2[-1][0]:
+                if debug:
+                    print('ОбъединяемY:', stack2)
+                stack2[-2][1] += ' %s y' % stack2[-1][1]
+                stack2.pop(-1)
+                if debug:
+                    print('   --->     ', stack2)
+                continue
+            break
+    st.chains = stack2
+
+    if debug:
+        for i,j in cycles:
+            st.comments[i] = ''
+            if j+1 < n:  st.comments[j+1] = ''
+    for i,j in stack2:
+        if ' ' in j  and  i < n:
+            st.comments[i] = ''
+    for i,j in stack2:  # отдельным циклом, чтобы наверняка не было перекрытия с предыдущими
+        if ' ' in j:
+            k = re.findall(r'\d+', j)
+            st.comments[ int(k[0]) ] = '\t# %s: %s' % (i,j)
+
+    level = 0
+    for i in range(n):
+        level += delta[i]
+        st.indent.append(level)
+
+    order.append('else')
+    st.unresolved = { kind: sorted(pending[kind])  for kind in order  if pending.get(kind) }
+    st.loops.sort(key=lambda loop: (loop.start, loop.end))
+    return st
+
+
+def format_gotoes(unresolved):
+    '''Неразобранные переходы в виде "{'jmp': {8, 9}}" для комментария #gotoes'''
+    return '{%s}' % ', '.join( '%r: {%s}' % (kind, ', '.join(map(str, lines)))  for kind, lines in unresolved.items() )
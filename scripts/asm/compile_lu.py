@@ -0,0 +1,1862 @@
+#!/usr/bin/env python3
+'''
+Компилятор lua-5.1 на чистом питоне: исходник .lua -> байткод .lu без запуска luac.
+Это порт llex.c / lparser.c / lcode.c / ldump.c из Lua 5.1.5: тот же выбор регистров, констант и переходов,
+поэтому результат совпадает с luac байт в байт, включая отладочную информацию (-s - без неё, как luac -s).
+Заголовок файла - FILE_HEADER из OpCodes.py (size_t 4 байта, как у luac.exe).
+Имена функций и переменных повторяют исходники Lua, чтобы их было легко сверять.
+'''
+import re, struct, sys, os, math
+from array import array
+from OpCodes import FILE_HEADER, INT, dump_string, dump_constant
+
+USAGE = '''usage:  %s  [-s]  filename.lua  [filename_out.lu]
+-s -- strip debug information (as luac -s)'''
+
+(OP_MOVE, OP_LOADK, OP_LOADBOOL, OP_LOADNIL, OP_GETUPVAL, OP_GETGLOBAL, OP_GETTABLE, OP_SETGLOBAL, OP_SETUPVAL,
+ OP_SETTABLE, OP_NEWTABLE, OP_SELF, OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_MOD, OP_POW, OP_UNM, OP_NOT, OP_LEN,
+ OP_CONCAT, OP_JMP, OP_EQ, OP_LT, OP_LE, OP_TEST, OP_TESTSET, OP_CALL, OP_TAILCALL, OP_RETURN, OP_FORLOOP,
+ OP_FORPREP, OP_TFORLOOP, OP_SETLIST, OP_CLOSE, OP_CLOSURE, OP_VARARG) = range(38)
+TEST_MODE = {OP_EQ, OP_LT, OP_LE, OP_TEST, OP_TESTSET, OP_TFORLOOP}     # за ними следует jmp
+
+MAXARG_BX = (1 << 18) - 1
+MAXARG_SBX = MAXARG_BX >> 1
+MAXARG_C = (1 << 9) - 1
+NO_REG = 255
+NO_JUMP = -1
+BITRK = 1 << 8
+MAXINDEXRK = BITRK - 1
+LUA_MULTRET = -1
+LFIELDS_PER_FLUSH = 50
+MAXSTACK = 250
+LUAI_MAXVARS = 200
+LUAI_MAXUPVALUES = 60
+LUAI_MAXCCALLS = 200
+MAX_INT = 2**31 - 3
+LUA_IDSIZE = 60
+VARARG_HASARG, VARARG_ISVARARG, VARARG_NEEDSARG = 1, 2, 4
+
+# виды выражений (expkind), порядок важен: VLOCAL..VINDEXED - то, чему можно присваивать
+(VVOID, VNIL, VTRUE, VFALSE, VK, VKNUM, VLOCAL, VUPVAL, VGLOBAL, VINDEXED,
+ VJMP, VRELOCABLE, VNONRELOC, VCALL, VVARARG) = range(15)
+
+# бинарные операторы (BinOpr) и их приоритеты (левый, правый)
+(OPR_ADD, OPR_SUB, OPR_MUL, OPR_DIV, OPR_MOD, OPR_POW, OPR_CONCAT, OPR_NE, OPR_EQ,
+ OPR_LT, OPR_LE, OPR_GT, OPR_GE, OPR_AND, OPR_OR) = range(15)
+BINOPR = {'+': OPR_ADD, '-': OPR_SUB, '*': OPR_MUL, '/': OPR_DIV, '%': OPR_MOD, '^': OPR_POW, '..': OPR_CONCAT,
+          '~=': OPR_NE, '==': OPR_EQ, '<': OPR_LT, '<=': OPR_LE, '>': OPR_GT, '>=': OPR_GE, 'and': OPR_AND, 'or': OPR_OR}
+PRIORITY = ((6, 6), (6, 6), (7, 7), (7, 7), (7, 7), (10, 9), (5, 4),
+            (3, 3), (3, 3), (3, 3), (3, 3), (3, 3), (3, 3), (2, 2), (1, 1))
+ARITH = {OPR_ADD: OP_ADD, OPR_SUB: OP_SUB, OPR_MUL: OP_MUL, OPR_DIV: OP_DIV, OPR_MOD: OP_MOD, OPR_POW: OP_POW}
+COMPARE = {OPR_EQ: (OP_EQ, 1), OPR_NE: (OP_EQ, 0), OPR_LT: (OP_LT, 1), OPR_LE: (OP_LE, 1), OPR_GT: (OP_LT, 0), OPR_GE: (OP_LE, 0)}
+UNARY_PRIORITY = 8
+
+
+class LuaSyntaxError(ValueError):
+    '''Ошибка в исходнике, текст как у luac: "file.lua:12: 'end' expected near '<eof>'"'''
+
+
+########################################  лексер (llex.c)
+
+RESERVED = {w.encode(): w  for w in ('and break do else elseif end false for function if in local nil not or '
+                                     'repeat return then true until while').split()}
+TK_NAME, TK_STRING, TK_NUMBER, TK_EOS = '<name>', '<string>', '<number>', '<eof>'
+
+SPACES = re.compile(rb'[ \t\v\f]*')
+NAME = re.compile(rb'[A-Za-z_][A-Za-z0-9_]*')
+NUMERAL = re.compile(rb'\.?[0-9][0-9.]*(?:[eE][+-]?)?[A-Za-z0-9_]*')    # как read_numeral: что угодно похожее на число
+DECIMAL = re.compile(rb'(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?')
+HEXADECIMAL = re.compile(rb'0[xX](?:[0-9a-fA-F]+\.?[0-9a-fA-F]*|\.[0-9a-fA-F]+)(?:[pP][+-]?[0-9]+)?')
+SHORT_STRING = {34: re.compile(rb'"([^"\\\r\n]*)"'), 39: re.compile(rb"'([^'\\\r\n]*)'")}
+NEWLINE = re.compile(rb'\r\n|\n\r|\r|\n')       # \r\n и \n\r - один перевод строки, как inclinenumber()
+LINE_REST = re.compile(rb'[^\r\n]*')
+ESCAPES = {ord('a'): 7, ord('b'): 8, ord('f'): 12, ord('n'): 10, ord('r'): 13, ord('t'): 9, ord('v'): 11}
+
+
+def chunkid(source):
+    '''Имя исходника для сообщений об ошибках (luaO_chunkid)'''
+    if source[:1] == '=':
+        return source[1:LUA_IDSIZE]
+    if source[:1] == '@':
+        source, size = source[1:], LUA_IDSIZE - len(" '...' ") - 1
+        return '...' + source[-size:]  if len(source) > size else  source
+    line = source.split('\n')[0]
+    size = LUA_IDSIZE - len(' [string "..."] ') - 1
+    if len(line) > size  or  line != source:
+        return '[string "%s..."]' % line[:size]
+    return '[string "%s"]' % line
+
+
+def str2number(text):
+    '''Текст числа -> float или None (luaO_str2d: strtod, затем 16-ричная запись)'''
+    m = HEXADECIMAL.fullmatch(text)
+    if m:
+        digits = text[2:].decode()
+        return float.fromhex(digits  if 'p' in digits.lower() else  digits + 'p0')
+    if DECIMAL.fullmatch(text):
+        return float(text)
+    return None
+
+
+class Lexer:
+    '''Поток токенов. Токен - строка: сам символ или ключевое слово, либо TK_NAME / TK_STRING / TK_NUMBER / TK_EOS'''
+
+    def __init__(self, source, chunkname):
+        self.src = source
+        self.pos = 0
+        self.chunkname = chunkname
+        self.linenumber = 1
+        self.lastline = 1
+        self.token = self.seminfo = self.raw = None
+        self.ahead = None
+
+    def next(self):
+        self.lastline = self.linenumber
+        if self.ahead:
+            (self.token, self.seminfo, self.raw), self.ahead = self.ahead, None
+        else:
+            self.token, self.seminfo, self.raw = self.llex()
+
+    def lookahead(self):
+        self.ahead = self.llex()
+        return self.ahead[0]
+
+    def error(self, message, token=None, raw=None):
+        '''luaX_lexerror: сообщение с именем файла, номером строки и токеном рядом с ошибкой'''
+        message = '%s:%i: %s' % (chunkid(self.chunkname.decode('utf-8', 'replace')), self.linenumber, message)
+        if token:
+            if token in (TK_NAME, TK_STRING, TK_NUMBER):
+                near = (raw or b'').decode('utf-8', 'replace')
+            elif len(token) == 1  and  (ord(token) < 32  or  ord(token) == 127):
+                near = 'char(%i)' % ord(token)
+            else:
+                near = token
+            message = "%s near '%s'" % (message, near)
+        raise LuaSyntaxError(message)
+
+    def syntax_error(self, message):
+        self.error(message, self.token, self.raw)
+
+    def skip_sep(self, pos):
+        '''[==[ или ]==]: (число '=' или -(число)-1 если скобка не парная, позиция после '=')'''
+        s = self.src[pos]
+        end = pos + 1
+        while self.src[end:end+1] == b'=':
+            end += 1
+        count = end - pos - 1
+        return (count  if self.src[end:end+1] == bytes((s,)) else  -count - 1), end
+
+    def read_long_string(self, pos, sep, is_string):
+        '''pos - вторая '[' длинной строки/комментария; возвращает содержимое строки'''
+        src = self.src
+        start = pos + 1
+        m = NEWLINE.match(src, start)       # перевод строки сразу после скобки не входит в строку
+        if m:
+            start = m.end()
+            self.linenumber += 1
+        close = b']' + b'=' * sep + b']'
+        end = src.find(close, start)
+        nested = src.find(b'[[', start, end  if end >= 0 else  len(src))  if sep == 0 else  -1
+        if nested >= 0:     # LUA_COMPAT_LSTR == 1
+            self.linenumber += len(NEWLINE.findall(src, start, nested))
+            self.pos = nested + 2
+            self.error('nesting of [[...]] is deprecated', '[')
+        if end < 0:
+            self.linenumber += len(NEWLINE.findall(src, start))
+            self.pos = len(src)
+            self.error('unfinished long string'  if is_string else  'unfinished long comment', TK_EOS)
+        body, lines = NEWLINE.subn(b'\n', src[start:end])
+        self.linenumber += lines
+        self.pos = end + len(close)
+        return body
+
+    def read_string(self, pos):
+        '''Строка в кавычках с escape-последовательностями'''
+        src = self.src
+        m = SHORT_STRING[src[pos]].match(src, pos)
+        if m:
+            self.pos = m.end()
+            return m.group(1), m.group(0)
+        delimiter = src[pos]
+        out = bytearray()
+        pos += 1
+        while True:
+            c = src[pos]  if pos < len(src) else  None
+            if c == delimiter:
+                break
+            if c is None:
+                self.pos = pos
+                self.error('unfinished string', TK_EOS)
+            if c in (10, 13):
+                self.pos = pos
+                self.error('unfinished string', TK_STRING, bytes((delimiter,)) + bytes(out))
+            if c != 92:     # '\\'
+                out.append(c)
+                pos += 1
+                continue
+            pos += 1
+            c = src[pos]  if pos < len(src) else  None
+            if c is None:
+                continue        # ошибка 'unfinished string' на следующем круге
+            if c in ESCAPES:
+                out.append(ESCAPES[c])
+                pos += 1
+            elif c in (10, 13):
+                out.append(10)
+                pos = NEWLINE.match(src, pos).end()
+                self.linenumber += 1
+            elif 48 <= c <= 57:     # \ddd
+                m = re.compile(rb'[0-9]{1,3}').match(src, pos)
+                value = int(m.group(0))
+                pos = m.end()
+                if value > 255:
+                    self.pos = pos
+                    self.error('escape sequence too large', TK_STRING, bytes((delimiter,)) + bytes(out))
+                out.append(value)
+            else:               # \\, \", \' и любой другой символ
+                out.append(c)
+                pos += 1
+        self.pos = pos + 1
+        return bytes(out), src[pos - len(out) - 1:pos + 1]
+
+    def llex(self):
+        '''Следующий токен: (token, seminfo, raw)'''
+        src = self.src
+        while True:
+            pos = SPACES.match(src, self.pos).end()
+            self.pos = pos
+            if pos >= len(src):
+                return TK_EOS, None, None
+            c = src[pos]
+
+            if c == 10 or c == 13:
+                self.pos = NEWLINE.match(src, pos).end()
+                self.linenumber += 1
+                continue
+
+            if c == 45:     # '-'
+                if src[pos+1:pos+2] != b'-':
+                    self.pos = pos + 1
+                    return '-', None, None
+                self.pos = pos + 2
+                if src[pos+2:pos+3] == b'[':
+                    sep, end = self.skip_sep(pos + 2)
+                    if sep >= 0:
+                        self.read_long_string(end, sep, False)
+                        continue
+                self.pos = LINE_REST.match(src, self.pos).end()       # короткий комментарий
+                continue
+
+            if c == 91:     # '['
+                sep, end = self.skip_sep(pos)
+                if sep >= 0:
+                    body = self.read_long_string(end, sep, True)
+                    return TK_STRING, body, src[pos:self.pos]
+                self.pos = end
+                if sep == -1:
+                    return '[', None, None
+                self.error('invalid long string delimiter', TK_STRING, src[pos:end])
+
+            if c == 34 or c == 39:      # '"' "'"
+                value, raw = self.read_string(pos)
+                return TK_STRING, value, raw
+
+            m = NAME.match(src, pos)
+            if m:
+                self.pos = m.end()
+                word = m.group(0)
+                reserved = RESERVED.get(word)
+                if reserved:
+                    return reserved, None, None
+                return TK_NAME, word, word
+
+            m = NUMERAL.match(src, pos)
+            if m:
+                self.pos = m.end()
+                value = str2number(m.group(0))
+                if value is None:
+                    self.error('malformed number', TK_NUMBER, m.group(0))
+                return TK_NUMBER, value, m.group(0)
+
+            two = src[pos:pos+2]
+            if two in (b'==', b'<=', b'>=', b'~='):
+                self.pos = pos + 2
+                return two.decode(), None, None
+            if c == 46:     # '.': '.', '..', '...' (число с точки разобрано выше)
+                if src[pos:pos+3] == b'...':
+                    self.pos = pos + 3
+                    return '...', None, None
+                if two == b'..':
+                    self.pos = pos + 2
+                    return '..', None, None
+            self.pos = pos + 1
+            return chr(c), None, None
+
+
+########################################  структуры (lobject.h, lparser.h)
+
+class Proto:
+    '''Прототип функции в том виде, в каком его пишет ldump.c'''
+    __slots__ = ('source', 'linedefined', 'lastlinedefined', 'nups', 'numparams', 'is_vararg', 'maxstacksize',
+                 'code', 'lineinfo', 'k', 'p', 'locvars', 'upvalues')
+
+    def __init__(self, source):
+        self.source = source
+        self.linedefined = 0
+        self.lastlinedefined = 0
+        self.nups = 0
+        self.numparams = 0
+        self.is_vararg = 0
+        self.maxstacksize = 2       # регистры 0/1 всегда есть
+        self.code = []
+        self.lineinfo = []
+        self.k = []                 # None, bool, float, bytes
+        self.p = []
+        self.locvars = []           # [имя, startpc, endpc]
+        self.upvalues = []          # имена
+
+
+class ExpDesc:
+    __slots__ = ('k', 'info', 'aux', 'nval', 't', 'f')
+
+    def __init__(self, k=VVOID, info=0):
+        self.k = k
+        self.info = info
+        self.aux = 0
+        self.nval = 0.0
+        self.t = self.f = NO_JUMP       # списки переходов "если истина" / "если ложь"
+
+    def set(self, other):
+        self.k, self.info, self.aux, self.nval, self.t, self.f = other.k, other.info, other.aux, other.nval, other.t, other.f
+
+
+class BlockCnt:
+    __slots__ = ('previous', 'breaklist', 'nactvar', 'upval', 'isbreakable')
+
+    def __init__(self, previous, nactvar, isbreakable):
+        self.previous = previous
+        self.breaklist = NO_JUMP
+        self.nactvar = nactvar
+        self.upval = False
+        self.isbreakable = isbreakable
+
+
+class FuncState:
+    __slots__ = ('f', 'h', 'prev', 'bl', 'pc', 'lasttarget', 'jpc', 'freereg', 'nactvar', 'upvalues', 'actvar')
+
+    def __init__(self, f, prev):
+        self.f = f
+        self.h = {}             # константа -> индекс в f.k
+        self.prev = prev
+        self.bl = None
+        self.pc = 0
+        self.lasttarget = -1
+        self.jpc = NO_JUMP      # переходы на текущую позицию
+        self.freereg = 0
+        self.nactvar = 0
+        self.upvalues = []      # (k, info) для OP_CLOSURE
+        self.actvar = []        # индексы в f.locvars активных локальных
+
+
+NIL_KEY = ('nil',)       # ключи констант: float и bytes как есть, у nil и bool свои (True == 1.0 в питоне)
+BOOL_KEYS = {True: ('bool', True), False: ('bool', False)}
+
+
+def _floor(x):
+    return float(math.floor(x))  if math.isfinite(x) else  x
+
+
+def _pow(a, b):
+    '''pow() из C: inf при переполнении и делении на 0, nan если результат не определён'''
+    odd = math.isfinite(b)  and  b % 2 == 1
+    try:
+        return math.pow(a, b)
+    except OverflowError:
+        return -math.inf  if a < 0 and odd else  math.inf
+    except ValueError:      # 0 в отрицательной степени или отрицательное число в дробной
+        if a == 0:
+            return math.copysign(math.inf, a)  if odd else  math.inf
+        return math.nan
+
+
+########################################  парсер и генератор кода (lparser.c + lcode.c)
+
+class Compiler:
+    '''Однопроходный компилятор: разбор исходника сразу выдаёт байткод, как lparser.c/lcode.c'''
+
+    def __init__(self, source, chunkname):
+        self.ls = Lexer(source, chunkname)
+        self.chunkname = chunkname
+        self.fs = None
+        self.nccalls = 0
+
+    def compile(self):
+        '''luaY_parser: Proto главной функции'''
+        ls = self.ls
+        fs = self.open_func()
+        fs.f.is_vararg = VARARG_ISVARARG        # главная функция всегда vararg
+        ls.next()
+        self.chunk()
+        self.check(TK_EOS)
+        self.close_func()
+        return fs.f
+
+    ####################  инструкции
+
+    def code(self, i, line):
+        fs = self.fs
+        self.dischargejpc()         # pc изменится
+        fs.f.code.append(i)
+        fs.f.lineinfo.append(line)
+        fs.pc += 1
+        return fs.pc - 1
+
+    def codeABC(self, o, a, b, c):
+        return self.code(o | a << 6 | b << 23 | c << 14, self.ls.lastline)
+
+    def codeABx(self, o, a, bx):
+        return self.code(o | a << 6 | bx << 14, self.ls.lastline)
+
+    def codeAsBx(self, o, a, sbx):
+        return self.codeABx(o, a, sbx + MAXARG_SBX)
+
+    def setarg(self, pc, shift, mask, value):
+        code = self.fs.f.code
+        code[pc] = code[pc] & ~(mask << shift) | value << shift
+
+    def fixline(self, line):
+        self.fs.f.lineinfo[self.fs.pc - 1] = line
+
+    ####################  переходы
+
+    def nil(self, frm, n):
+        fs = self.fs
+        if fs.pc > fs.lasttarget:       # на текущую позицию нет переходов?
+            if fs.pc == 0:              # начало функции: регистры и так nil
+                if frm >= fs.nactvar:
+                    return
+            else:
+                previous = fs.f.code[fs.pc - 1]
+                if previous & 0x3F == OP_LOADNIL:
+                    pfrom, pto = previous >> 6 & 0xFF, previous >> 23
+                    if pfrom <= frm <= pto + 1:     # можно объединить
+                        if frm + n - 1 > pto:
+                            self.setarg(fs.pc - 1, 23, 0x1FF, frm + n - 1)
+                        return
+        self.codeABC(OP_LOADNIL, frm, frm + n - 1, 0)
+
+    def jump(self):
+        fs = self.fs
+        jpc, fs.jpc = fs.jpc, NO_JUMP
+        j = self.codeAsBx(OP_JMP, 0, NO_JUMP)
+        return self.concat(j, jpc)
+
+    def ret(self, first, nret):
+        self.codeABC(OP_RETURN, first, nret + 1, 0)
+
+    def condjump(self, op, a, b, c):
+        self.codeABC(op, a, b, c)
+        return self.jump()
+
+    def fixjump(self, pc, dest):
+        offset = dest - (pc + 1)
+        if abs(offset) > MAXARG_SBX:
+            self.ls.syntax_error('control structure too long')
+        self.setarg(pc, 14, 0x3FFFF, offset + MAXARG_SBX)
+
+    def getlabel(self):
+        self.fs.lasttarget = self.fs.pc
+        return self.fs.pc
+
+    def getjump(self, pc):
+        offset = (self.fs.f.code[pc] >> 14) - MAXARG_SBX
+        return NO_JUMP  if offset == NO_JUMP else  pc + 1 + offset
+
+    def getjumpcontrol(self, pc):
+        '''Инструкция, управляющая переходом pc (сравнение/test перед jmp или сам jmp)'''
+        if pc >= 1  and  self.fs.f.code[pc - 1] & 0x3F in TEST_MODE:
+            return pc - 1
+        return pc
+
+    def need_value(self, lst):
+        while lst != NO_JUMP:
+            if self.fs.f.code[self.getjumpcontrol(lst)] & 0x3F != OP_TESTSET:
+                return True
+            lst = self.getjump(lst)
+        return False
+
+    def patchtestreg(self, node, reg):
+        code = self.fs.f.code
+        pc = self.getjumpcontrol(node)
+        i = code[pc]
+        if i & 0x3F != OP_TESTSET:
+            return False
+        b = i >> 23
+        if reg != NO_REG  and  reg != b:
+            self.setarg(pc, 6, 0xFF, reg)
+        else:       # значение не нужно в регистре: TESTSET -> TEST
+            code[pc] = OP_TEST | b << 6 | (i >> 14 & 0x1FF) << 14
+        return True
+
+    def removevalues(self, lst):
+        while lst != NO_JUMP:
+            self.patchtestreg(lst, NO_REG)
+            lst = self.getjump(lst)
+
+    def patchlistaux(self, lst, vtarget, reg, dtarget):
+        while lst != NO_JUMP:
+            nxt = self.getjump(lst)
+            if self.patchtestreg(lst, reg):
+                self.fixjump(lst, vtarget)
+            else:
+                self.fixjump(lst, dtarget)
+            lst = nxt
+
+    def dischargejpc(self):
+        fs = self.fs
+        self.patchlistaux(fs.jpc, fs.pc, NO_REG, fs.pc)
+        fs.jpc = NO_JUMP
+
+    def patchlist(self, lst, target):
+        if target == self.fs.pc:
+            self.patchtohere(lst)
+        else:
+            self.patchlistaux(lst, target, NO_REG, target)
+
+    def patchtohere(self, lst):
+        self.getlabel()
+        self.fs.jpc = self.concat(self.fs.jpc, lst)
+
+    def concat(self, l1, l2):
+        '''Список l1 с присоединённым l2 (luaK_concat меняет l1 по указателю)'''
+        if l2 == NO_JUMP:
+            return l1
+        if l1 == NO_JUMP:
+            return l2
+        lst = l1
+        while True:
+            nxt = self.getjump(lst)
+            if nxt == NO_JUMP:
+                break
+            lst = nxt
+        self.fixjump(lst, l2)
+        return l1
+
+    ####################  регистры и константы
+
+    def checkstack(self, n):
+        fs = self.fs
+        newstack = fs.freereg + n
+        if newstack > fs.f.maxstacksize:
+            if newstack >= MAXSTACK:
+                self.ls.syntax_error('function or expression too complex')
+            fs.f.maxstacksize = newstack
+
+    def reserveregs(self, n):
+        self.checkstack(n)
+        self.fs.freereg += n
+
+    def freereg(self, reg):
+        fs = self.fs
+        if not reg & BITRK  and  reg >= fs.nactvar:
+            fs.freereg -= 1
+
+    def freeexp(self, e):
+        if e.k == VNONRELOC:
+            self.freereg(e.info)
+
+    def addk(self, key, value):
+        fs = self.fs
+        idx = fs.h.get(key)
+        if idx is None:
+            idx = fs.h[key] = len(fs.f.k)
+            fs.f.k.append(value)
+        return idx
+
+    def stringK(self, s):
+        return self.addk(s, s)
+
+    def numberK(self, r):
+        return self.addk(r, r)
+
+    def boolK(self, b):
+        return self.addk(BOOL_KEYS[b], b)
+
+    def nilK(self):
+        return self.addk(NIL_KEY, None)
+
+    ####################  выражения -> регистры
+
+    def setreturns(self, e, nresults):
+        if e.k == VCALL:        # открытый вызов функции
+            self.setarg(e.info, 14, 0x1FF, nresults + 1)
+        elif e.k == VVARARG:
+            self.setarg(e.info, 23, 0x1FF, nresults + 1)
+            self.setarg(e.info, 6, 0xFF, self.fs.freereg)
+            self.reserveregs(1)
+
+    def setmultret(self, e):
+        self.setreturns(e, LUA_MULTRET)
+
+    def setoneret(self, e):
+        if e.k == VCALL:
+            e.k = VNONRELOC
+            e.info = self.fs.f.code[e.info] >> 6 & 0xFF
+        elif e.k == VVARARG:
+            self.setarg(e.info, 23, 0x1FF, 2)
+            e.k = VRELOCABLE
+
+    def dischargevars(self, e):
+        k = e.k
+        if k == VLOCAL:
+            e.k = VNONRELOC
+        elif k == VUPVAL:
+            e.info = self.codeABC(OP_GETUPVAL, 0, e.info, 0)
+            e.k = VRELOCABLE
+        elif k == VGLOBAL:
+            e.info = self.codeABx(OP_GETGLOBAL, 0, e.info)
+            e.k = VRELOCABLE
+        elif k == VINDEXED:
+            self.freereg(e.aux)
+            self.freereg(e.info)
+            e.info = self.codeABC(OP_GETTABLE, 0, e.info, e.aux)
+            e.k = VRELOCABLE
+        elif k == VVARARG  or  k == VCALL:
+            self.setoneret(e)
+
+    def code_label(self, a, b, jump):
+        self.getlabel()     # может быть целью перехода
+        return self.codeABC(OP_LOADBOOL, a, b, jump)
+
+    def discharge2reg(self, e, reg):
+        self.dischargevars(e)
+        k = e.k
+        if k == VNIL:
+            self.nil(reg, 1)
+        elif k == VFALSE  or  k == VTRUE:
+            self.codeABC(OP_LOADBOOL, reg, k == VTRUE, 0)
+        elif k == VK:
+            self.codeABx(OP_LOADK, reg, e.info)
+        elif k == VKNUM:
+            self.codeABx(OP_LOADK, reg, self.numberK(e.nval))
+        elif k == VRELOCABLE:
+            self.setarg(e.info, 6, 0xFF, reg)
+        elif k == VNONRELOC:
+            if reg != e.info:
+                self.codeABC(OP_MOVE, reg, e.info, 0)
+        else:       # VVOID, VJMP
+            return
+        e.info = reg
+        e.k = VNONRELOC
+
+    def discharge2anyreg(self, e):
+        if e.k != VNONRELOC:
+            self.reserveregs(1)
+            self.discharge2reg(e, self.fs.freereg - 1)
+
+    def exp2reg(self, e, reg):
+        self.discharge2reg(e, reg)
+        if e.k == VJMP:
+            e.t = self.concat(e.t, e.info)
+        if e.t != e.f:
+            p_f = p_t = NO_JUMP     # позиции LOADBOOL false / true
+            if self.need_value(e.t)  or  self.need_value(e.f):
+                fj = NO_JUMP  if e.k == VJMP else  self.jump()
+                p_f = self.code_label(reg, 0, 1)
+                p_t = self.code_label(reg, 1, 0)
+                self.patchtohere(fj)
+            final = self.getlabel()     # позиция после всего выражения
+            self.patchlistaux(e.f, final, reg, p_f)
+            self.patchlistaux(e.t, final, reg, p_t)
+        e.f = e.t = NO_JUMP
+        e.info = reg
+        e.k = VNONRELOC
+
+    def exp2nextreg(self, e):
+        self.dischargevars(e)
+        self.freeexp(e)
+        self.reserveregs(1)
+        self.exp2reg(e, self.fs.freereg - 1)
+
+    def exp2anyreg(self, e):
+        self.dischargevars(e)
+        if e.k == VNONRELOC:
+            if e.t == e.f:
+                return e.info       # уже в регистре
+            if e.info >= self.fs.nactvar:       # не локальная переменная
+                self.exp2reg(e, e.info)
+                return e.info
+        self.exp2nextreg(e)
+        return e.info
+
+    def exp2val(self, e):
+        if e.t != e.f:
+            self.exp2anyreg(e)
+        else:
+            self.dischargevars(e)
+
+    def exp2RK(self, e):
+        self.exp2val(e)
+        k = e.k
+        if k in (VKNUM, VTRUE, VFALSE, VNIL):
+            if len(self.fs.f.k) <= MAXINDEXRK:     # константа помещается в RK
+                e.info = self.nilK()  if k == VNIL else  self.numberK(e.nval)  if k == VKNUM else  self.boolK(k == VTRUE)
+                e.k = VK
+                return e.info | BITRK
+        elif k == VK:
+            if e.info <= MAXINDEXRK:
+                return e.info | BITRK
+        return self.exp2anyreg(e)
+
+    def storevar(self, var, ex):
+        k = var.k
+        if k == VLOCAL:
+            self.freeexp(ex)
+            self.exp2reg(ex, var.info)
+            return
+        elif k == VUPVAL:
+            e = self.exp2anyreg(ex)
+            self.codeABC(OP_SETUPVAL, e, var.info, 0)
+        elif k == VGLOBAL:
+            e = self.exp2anyreg(ex)
+            self.codeABx(OP_SETGLOBAL, e, var.info)
+        elif k == VINDEXED:
+            e = self.exp2RK(ex)
+            self.codeABC(OP_SETTABLE, var.info, var.aux, e)
+        self.freeexp(ex)
+
+    def self_(self, e, key):
+        self.exp2anyreg(e)
+        self.freeexp(e)
+        func = self.fs.freereg
+        self.reserveregs(2)
+        self.codeABC(OP_SELF, func, e.info, self.exp2RK(key))
+        self.freeexp(key)
+        e.info = func
+        e.k = VNONRELOC
+
+    def invertjump(self, e):
+        pc = self.getjumpcontrol(e.info)
+        a = self.fs.f.code[pc] >> 6 & 0xFF
+        self.setarg(pc, 6, 0xFF, int(not a))
+
+    def jumponcond(self, e, cond):
+        fs = self.fs
+        if e.k == VRELOCABLE:
+            ie = fs.f.code[e.info]
+            if ie & 0x3F == OP_NOT:     # убираем OP_NOT, проверяем операнд с обратным условием
+                fs.pc -= 1
+                fs.f.code.pop()
+                fs.f.lineinfo.pop()
+                return self.condjump(OP_TEST, ie >> 23, 0, int(not cond))
+        self.discharge2anyreg(e)
+        self.freeexp(e)
+        return self.condjump(OP_TESTSET, NO_REG, e.info, cond)
+
+    def goiftrue(self, e):
+        self.dischargevars(e)
+        k = e.k
+        if k in (VK, VKNUM, VTRUE):
+            pc = NO_JUMP        # всегда истина
+        elif k == VJMP:
+            self.invertjump(e)
+            pc = e.info
+        else:
+            pc = self.jumponcond(e, 0)
+        e.f = self.concat(e.f, pc)
+        self.patchtohere(e.t)
+        e.t = NO_JUMP
+
+    def goiffalse(self, e):
+        self.dischargevars(e)
+        k = e.k
+        if k in (VNIL, VFALSE):
+            pc = NO_JUMP        # всегда ложь
+        elif k == VJMP:
+            pc = e.info
+        else:
+            pc = self.jumponcond(e, 1)
+        e.t = self.concat(e.t, pc)
+        self.patchtohere(e.f)
+        e.f = NO_JUMP
+
+    def codenot(self, e):
+        self.dischargevars(e)
+        k = e.k
+        if k in (VNIL, VFALSE):
+            e.k = VTRUE
+        elif k in (VK, VKNUM, VTRUE):
+            e.k = VFALSE
+        elif k == VJMP:
+            self.invertjump(e)
+        elif k in (VRELOCABLE, VNONRELOC):
+            self.discharge2anyreg(e)
+            self.freeexp(e)
+            e.info = self.codeABC(OP_NOT, 0, e.info, 0)
+            e.k = VRELOCABLE
+        e.f, e.t = e.t, e.f
+        self.removevalues(e.f)
+        self.removevalues(e.t)
+
+    def indexed(self, t, k):
+        t.aux = self.exp2RK(k)
+        t.k = VINDEXED
+
+    @staticmethod
+    def isnumeral(e):
+        return e.k == VKNUM  and  e.t == NO_JUMP  and  e.f == NO_JUMP
+
+    def constfolding(self, op, e1, e2):
+        if not self.isnumeral(e1)  or  not self.isnumeral(e2):
+            return False
+        v1, v2 = e1.nval, e2.nval
+        if op == OP_ADD:
+            r = v1 + v2
+        elif op == OP_SUB:
+            r = v1 - v2
+        elif op == OP_MUL:
+            r = v1 * v2
+        elif op == OP_DIV:
+            if v2 == 0:  return False       # не делим на 0
+            r = v1 / v2
+        elif op == OP_MOD:
+            if v2 == 0:  return False
+            r = v1 - _floor(v1 / v2) * v2
+        elif op == OP_POW:
+            r = _pow(v1, v2)
+        elif op == OP_UNM:
+            r = -v1
+        else:       # OP_LEN
+            return False
+        if r != r:      # NaN не сворачиваем
+            return False
+        e1.nval = r
+        return True
+
+    def codearith(self, op, e1, e2):
+        if self.constfolding(op, e1, e2):
+            return
+        o2 = self.exp2RK(e2)  if op != OP_UNM and op != OP_LEN else  0
+        o1 = self.exp2RK(e1)
+        if o1 > o2:
+            self.freeexp(e1)
+            self.freeexp(e2)
+        else:
+            self.freeexp(e2)
+            self.freeexp(e1)
+        e1.info = self.codeABC(op, 0, o1, o2)
+        e1.k = VRELOCABLE
+
+    def codecomp(self, op, cond, e1, e2):
+        o1 = self.exp2RK(e1)
+        o2 = self.exp2RK(e2)
+        self.freeexp(e2)
+        self.freeexp(e1)
+        if cond == 0  and  op != OP_EQ:     # a > b  ->  b < a
+            o1, o2 = o2, o1
+            cond = 1
+        e1.info = self.condjump(op, cond, o1, o2)
+        e1.k = VJMP
+
+    def prefix(self, op, e):
+        e2 = ExpDesc(VKNUM)
+        if op == '-':
+            if not self.isnumeral(e):
+                self.exp2anyreg(e)
+            self.codearith(OP_UNM, e, e2)
+        elif op == 'not':
+            self.codenot(e)
+        else:       # '#'
+            self.exp2anyreg(e)
+            self.codearith(OP_LEN, e, e2)
+
+    def infix(self, op, v):
+        if op == OPR_AND:
+            self.goiftrue(v)
+        elif op == OPR_OR:
+            self.goiffalse(v)
+        elif op == OPR_CONCAT:
+            self.exp2nextreg(v)     # операнд должен быть на стеке
+        elif op in ARITH:
+            if not self.isnumeral(v):
+                self.exp2RK(v)
+        else:
+            self.exp2RK(v)
+
+    def posfix(self, op, e1, e2):
+        if op == OPR_AND:
+            self.dischargevars(e2)
+            e2.f = self.concat(e2.f, e1.f)
+            e1.set(e2)
+        elif op == OPR_OR:
+            self.dischargevars(e2)
+            e2.t = self.concat(e2.t, e1.t)
+            e1.set(e2)
+        elif op == OPR_CONCAT:
+            self.exp2val(e2)
+            if e2.k == VRELOCABLE  and  self.fs.f.code[e2.info] & 0x3F == OP_CONCAT:
+                self.freeexp(e1)
+                self.setarg(e2.info, 23, 0x1FF, e1.info)
+                e1.k = VRELOCABLE
+                e1.info = e2.info
+            else:
+                self.exp2nextreg(e2)
+                self.codearith(OP_CONCAT, e1, e2)
+        elif op in ARITH:
+            self.codearith(ARITH[op], e1, e2)
+        else:
+            self.codecomp(*COMPARE[op], e1, e2)
+
+    def setlist(self, base, nelems, tostore):
+        c = (nelems - 1) // LFIELDS_PER_FLUSH + 1
+        b = 0  if tostore == LUA_MULTRET else  tostore
+        if c <= MAXARG_C:
+            self.codeABC(OP_SETLIST, base, b, c)
+        else:
+            self.codeABC(OP_SETLIST, base, b, 0)
+            self.code(c, self.ls.lastline)
+        self.fs.freereg = base + 1
+
+    ####################  разбор: вспомогательное
+
+    def error_expected(self, token):
+        self.ls.syntax_error("'%s' expected" % token)
+
+    def errorlimit(self, limit, what):
+        line = self.fs.f.linedefined
+        if line == 0:
+            message = 'main function has more than %i %s' % (limit, what)
+        else:
+            message = 'function at line %i has more than %i %s' % (line, limit, what)
+        self.ls.error(message)
+
+    def checklimit(self, v, limit, what):
+        if v > limit:
+            self.errorlimit(limit, what)
+
+    def testnext(self, c):
+        if self.ls.token == c:
+            self.ls.next()
+            return True
+        return False
+
+    def check(self, c):
+        if self.ls.token != c:
+            self.error_expected(c)
+
+    def checknext(self, c):
+        self.check(c)
+        self.ls.next()
+
+    def check_match(self, what, who, where):
+        if not self.testnext(what):
+            if where == self.ls.linenumber:
+                self.error_expected(what)
+            else:
+                self.ls.syntax_error("'%s' expected (to close '%s' at line %i)" % (what, who, where))
+
+    def str_checkname(self):
+        self.check(TK_NAME)
+        name = self.ls.seminfo
+        self.ls.next()
+        return name
+
+    def codestring(self, e, s):
+        e.__init__(VK, self.stringK(s))
+
+    def checkname(self, e):
+        self.codestring(e, self.str_checkname())
+
+    def registerlocalvar(self, name):
+        f = self.fs.f
+        f.locvars.append([name, 0, 0])
+        return len(f.locvars) - 1
+
+    def new_localvar(self, name, n):
+        fs = self.fs
+        self.checklimit(fs.nactvar + n + 1, LUAI_MAXVARS, 'local variables')
+        idx = self.registerlocalvar(name)
+        pos = fs.nactvar + n
+        del fs.actvar[pos:]
+        fs.actvar.append(idx)
+
+    def adjustlocalvars(self, nvars):
+        fs = self.fs
+        fs.nactvar += nvars
+        for i in range(fs.nactvar - nvars, fs.nactvar):
+            fs.f.locvars[fs.actvar[i]][1] = fs.pc
+
+    def removevars(self, tolevel):
+        fs = self.fs
+        while fs.nactvar > tolevel:
+            fs.nactvar -= 1
+            fs.f.locvars[fs.actvar[fs.nactvar]][2] = fs.pc
+        del fs.actvar[fs.nactvar:]
+
+    def indexupvalue(self, fs, name, v):
+        f = fs.f
+        for i, (k, info) in enumerate(fs.upvalues):
+            if k == v.k  and  info == v.info:
+                return i
+        if f.nups + 1 > LUAI_MAXUPVALUES:
+            fs, self.fs = self.fs, fs
+            try:
+                self.errorlimit(LUAI_MAXUPVALUES, 'upvalues')
+            finally:
+                self.fs = fs
+        f.upvalues.append(name)
+        fs.upvalues.append((v.k, v.info))
+        f.nups += 1
+        return f.nups - 1
+
+    @staticmethod
+    def searchvar(fs, name):
+        for i in range(fs.nactvar - 1, -1, -1):
+            if fs.f.locvars[fs.actvar[i]][0] == name:
+                return i
+        return -1
+
+    @staticmethod
+    def markupval(fs, level):
+        bl = fs.bl
+        while bl  and  bl.nactvar > level:
+            bl = bl.previous
+        if bl:
+            bl.upval = True
+
+    def singlevaraux(self, fs, name, var, base):
+        if fs is None:      # глобальная
+            var.__init__(VGLOBAL, NO_REG)
+            return VGLOBAL
+        v = self.searchvar(fs, name)
+        if v >= 0:
+            var.__init__(VLOCAL, v)
+            if not base:
+                self.markupval(fs, v)       # локальная используется как upvalue
+            return VLOCAL
+        if self.singlevaraux(fs.prev, name, var, 0) == VGLOBAL:
+            return VGLOBAL
+        var.info = self.indexupvalue(fs, name, var)
+        var.k = VUPVAL
+        return VUPVAL
+
+    def singlevar(self, var):
+        name = self.str_checkname()
+        if self.singlevaraux(self.fs, name, var, 1) == VGLOBAL:
+            var.info = self.stringK(name)
+
+    def adjust_assign(self, nvars, nexps, e):
+        fs = self.fs
+        extra = nvars - nexps
+        if e.k == VCALL  or  e.k == VVARARG:
+            extra += 1      # вместе с самим вызовом
+            if extra < 0:
+                extra = 0
+            self.setreturns(e, extra)
+            if extra > 1:
+                self.reserveregs(extra - 1)
+        else:
+            if e.k != VVOID:
+                self.exp2nextreg(e)
+            if extra > 0:
+                reg = fs.freereg
+                self.reserveregs(extra)
+                self.nil(reg, extra)
+
+    def enterlevel(self):
+        self.nccalls += 1
+        if self.nccalls > LUAI_MAXCCALLS:
+            self.ls.error('chunk has too many syntax levels')
+
+    def leavelevel(self):
+        self.nccalls -= 1
+
+    def enterblock(self, isbreakable):
+        fs = self.fs
+        fs.bl = BlockCnt(fs.bl, fs.nactvar, isbreakable)
+        return fs.bl
+
+    def leaveblock(self):
+        fs = self.fs
+        bl = fs.bl
+        fs.bl = bl.previous
+        self.removevars(bl.nactvar)
+        if bl.upval:
+            self.codeABC(OP_CLOSE, bl.nactvar, 0, 0)
+        fs.freereg = fs.nactvar
+        self.patchtohere(bl.breaklist)
+
+    def pushclosure(self, func, v):
+        fs = self.fs
+        fs.f.p.append(func.f)
+        v.__init__(VRELOCABLE, self.codeABx(OP_CLOSURE, 0, len(fs.f.p) - 1))
+        for k, info in func.upvalues:
+            self.codeABC(OP_MOVE  if k == VLOCAL else  OP_GETUPVAL, 0, info, 0)
+
+    def open_func(self):
+        fs = FuncState(Proto(self.chunkname), self.fs)
+        self.fs = fs
+        return fs
+
+    def close_func(self):
+        fs = self.fs
+        self.removevars(0)
+        self.ret(0, 0)      # последний return
+        self.fs = fs.prev
+
+    ####################  правила грамматики
+
+    def field(self, v):
+        '''field -> ['.' | ':'] NAME'''
+        key = ExpDesc()
+        self.exp2anyreg(v)
+        self.ls.next()
+        self.checkname(key)
+        self.indexed(v, key)
+
+    def yindex(self, v):
+        '''index -> '[' expr ']' '''
+        self.ls.next()
+        self.expr(v)
+        self.exp2val(v)
+        self.checknext(']')
+
+    def recfield(self, cc):
+        '''recfield -> (NAME | '['exp1']') = exp1'''
+        fs = self.fs
+        reg = fs.freereg
+        key, val = ExpDesc(), ExpDesc()
+        if self.ls.token == TK_NAME:
+            self.checklimit(cc.nh, MAX_INT, 'items in a constructor')
+            self.checkname(key)
+        else:
+            self.yindex(key)
+        cc.nh += 1
+        self.checknext('=')
+        rkkey = self.exp2RK(key)
+        self.expr(val)
+        self.codeABC(OP_SETTABLE, cc.t.info, rkkey, self.exp2RK(val))
+        fs.freereg = reg
+
+    def closelistfield(self, cc):
+        if cc.v.k == VVOID:
+            return
+        self.exp2nextreg(cc.v)
+        cc.v.k = VVOID
+        if cc.tostore == LFIELDS_PER_FLUSH:
+            self.setlist(cc.t.info, cc.na, cc.tostore)
+            cc.tostore = 0
+
+    def lastlistfield(self, cc):
+        if cc.tostore == 0:
+            return
+        if cc.v.k == VCALL  or  cc.v.k == VVARARG:
+            self.setmultret(cc.v)
+            self.setlist(cc.t.info, cc.na, LUA_MULTRET)
+            cc.na -= 1      # последнее выражение не считается: число элементов неизвестно
+        else:
+            if cc.v.k != VVOID:
+                self.exp2nextreg(cc.v)
+            self.setlist(cc.t.info, cc.na, cc.tostore)
+
+    def listfield(self, cc):
+        self.expr(cc.v)
+        self.checklimit(cc.na, MAX_INT, 'items in a constructor')
+        cc.na += 1
+        cc.tostore += 1
+
+    def constructor(self, t):
+        '''constructor -> '{' [ field { fieldsep field } [fieldsep] ] '}' '''
+        ls = self.ls
+        line = ls.linenumber
+        pc = self.codeABC(OP_NEWTABLE, 0, 0, 0)
+        cc = ConsControl(t)
+        t.__init__(VRELOCABLE, pc)
+        self.exp2nextreg(t)     # таблица на вершине стека
+        self.checknext('{')
+        while True:
+            if ls.token == '}':
+                break
+            self.closelistfield(cc)
+            if ls.token == TK_NAME:
+                if ls.lookahead() != '=':
+                    self.listfield(cc)
+                else:
+                    self.recfield(cc)
+            elif ls.token == '[':
+                self.recfield(cc)
+            else:
+                self.listfield(cc)
+            if not (self.testnext(',')  or  self.testnext(';')):
+                break
+        self.check_match('}', '{', line)
+        self.lastlistfield(cc)
+        self.setarg(pc, 23, 0x1FF, int2fb(cc.na))     # начальный размер массива
+        self.setarg(pc, 14, 0x1FF, int2fb(cc.nh))     # и хэш-части
+
+    def parlist(self):
+        '''parlist -> [ param { ',' param } ]'''
+        fs = self.fs
+        f = fs.f
+        nparams = 0
+        f.is_vararg = 0
+        if self.ls.token != ')':
+            while True:
+                if self.ls.token == TK_NAME:
+                    self.new_localvar(self.str_checkname(), nparams)
+                    nparams += 1
+                elif self.ls.token == '...':
+                    self.ls.next()
+                    self.new_localvar(b'arg', nparams)      # LUA_COMPAT_VARARG: 'arg' по умолчанию
+                    nparams += 1
+                    f.is_vararg = VARARG_HASARG | VARARG_NEEDSARG | VARARG_ISVARARG
+                else:
+                    self.ls.syntax_error("<name> or '...' expected")
+                if f.is_vararg  or  not self.testnext(','):
+                    break
+        self.adjustlocalvars(nparams)
+        f.numparams = fs.nactvar - (f.is_vararg & VARARG_HASARG)
+        self.reserveregs(fs.nactvar)
+
+    def body(self, e, needself, line):
+        '''body ->  '(' parlist ')' chunk END'''
+        new_fs = self.open_func()
+        new_fs.f.linedefined = line
+        self.checknext('(')
+        if needself:
+            self.new_localvar(b'self', 0)
+            self.adjustlocalvars(1)
+        self.parlist()
+        self.checknext(')')
+        self.chunk()
+        new_fs.f.lastlinedefined = self.ls.linenumber
+        self.check_match('end', 'function', line)
+        self.close_func()
+        self.pushclosure(new_fs, e)
+
+    def explist1(self, v):
+        '''explist1 -> expr { ',' expr }'''
+        n = 1
+        self.expr(v)
+        while self.testnext(','):
+            self.exp2nextreg(v)
+            self.expr(v)
+            n += 1
+        return n
+
+    def funcargs(self, f):
+        ls = self.ls
+        fs = self.fs
+        args = ExpDesc()
+        line = ls.linenumber
+        if ls.token == '(':
+            if line != ls.lastline:
+                ls.syntax_error('ambiguous syntax (function call x new statement)')
+            ls.next()
+            if ls.token == ')':
+                args.k = VVOID
+            else:
+                self.explist1(args)
+                self.setmultret(args)
+            self.check_match(')', '(', line)
+        elif ls.token == '{':
+            self.constructor(args)
+        elif ls.token == TK_STRING:
+            self.codestring(args, ls.seminfo)
+            ls.next()
+        else:
+            ls.syntax_error('function arguments expected')
+        base = f.info       # регистр функции
+        if args.k == VCALL  or  args.k == VVARARG:
+            nparams = LUA_MULTRET
+        else:
+            if args.k != VVOID:
+                self.exp2nextreg(args)
+            nparams = fs.freereg - (base + 1)
+        f.__init__(VCALL, self.codeABC(OP_CALL, base, nparams + 1, 2))
+        self.fixline(line)
+        fs.freereg = base + 1       # вызов оставляет один результат
+
+    def prefixexp(self, v):
+        '''prefixexp -> NAME | '(' expr ')' '''
+        ls = self.ls
+        if ls.token == '(':
+            line = ls.linenumber
+            ls.next()
+            self.expr(v)
+            self.check_match(')', '(', line)
+            self.dischargevars(v)
+        elif ls.token == TK_NAME:
+            self.singlevar(v)
+        else:
+            ls.syntax_error('unexpected symbol')
+
+    def primaryexp(self, v):
+        '''primaryexp -> prefixexp { '.' NAME | '[' exp ']' | ':' NAME funcargs | funcargs }'''
+        ls = self.ls
+        self.prefixexp(v)
+        while True:
+            token = ls.token
+            if token == '.':
+                self.field(v)
+            elif token == '[':
+                key = ExpDesc()
+                self.exp2anyreg(v)
+                self.yindex(key)
+                self.indexed(v, key)
+            elif token == ':':
+                key = ExpDesc()
+                ls.next()
+                self.checkname(key)
+                self.self_(v, key)
+                self.funcargs(v)
+            elif token in ('(', TK_STRING, '{'):
+                self.exp2nextreg(v)
+                self.funcargs(v)
+            else:
+                return
+
+    def simpleexp(self, v):
+        '''simpleexp -> NUMBER | STRING | NIL | true | false | ... | constructor | FUNCTION body | primaryexp'''
+        ls = self.ls
+        token = ls.token
+        if token == TK_NUMBER:
+            v.__init__(VKNUM)
+            v.nval = ls.seminfo
+        elif token == TK_STRING:
+            self.codestring(v, ls.seminfo)
+        elif token == 'nil':
+            v.__init__(VNIL)
+        elif token == 'true':
+            v.__init__(VTRUE)
+        elif token == 'false':
+            v.__init__(VFALSE)
+        elif token == '...':
+            f = self.fs.f
+            if not f.is_vararg:
+                ls.syntax_error("cannot use '...' outside a vararg function")
+            f.is_vararg &= ~VARARG_NEEDSARG     # 'arg' не нужен
+            v.__init__(VVARARG, self.codeABC(OP_VARARG, 0, 1, 0))
+        elif token == '{':
+            self.constructor(v)
+            return
+        elif token == 'function':
+            ls.next()
+            self.body(v, False, ls.linenumber)
+            return
+        else:
+            self.primaryexp(v)
+            return
+        ls.next()
+
+    def subexpr(self, v, limit):
+        '''subexpr -> (simpleexp | unop subexpr) { binop subexpr }, где приоритет binop больше limit'''
+        ls = self.ls
+        self.enterlevel()
+        uop = ls.token
+        if uop == 'not'  or  uop == '-'  or  uop == '#':
+            ls.next()
+            self.subexpr(v, UNARY_PRIORITY)
+            self.prefix(uop, v)
+        else:
+            self.simpleexp(v)
+        op = BINOPR.get(ls.token)
+        while op is not None  and  PRIORITY[op][0] > limit:
+            v2 = ExpDesc()
+            ls.next()
+            self.infix(op, v)
+            nextop = self.subexpr(v2, PRIORITY[op][1])
+            self.posfix(op, v, v2)
+            op = nextop
+        self.leavelevel()
+        return op       # первый необработанный оператор
+
+    def expr(self, v):
+        self.subexpr(v, 0)
+
+    ####################  операторы
+
+    @staticmethod
+    def block_follow(token):
+        return token in ('else', 'elseif', 'end', 'until', TK_EOS)
+
+    def block(self):
+        self.enterblock(False)
+        self.chunk()
+        self.leaveblock()
+
+    def check_conflict(self, lh, v):
+        '''Локальная из левой части, используемая как таблица/индекс раньше в том же присваивании, копируется'''
+        fs = self.fs
+        extra = fs.freereg
+        conflict = False
+        while lh:
+            if lh.v.k == VINDEXED:
+                if lh.v.info == v.info:
+                    conflict = True
+                    lh.v.info = extra
+                if lh.v.aux == v.info:
+                    conflict = True
+                    lh.v.aux = extra
+            lh = lh.prev
+        if conflict:
+            self.codeABC(OP_MOVE, fs.freereg, v.info, 0)
+            self.reserveregs(1)
+
+    def assignment(self, lh, nvars):
+        ls = self.ls
+        e = ExpDesc()
+        if not VLOCAL <= lh.v.k <= VINDEXED:
+            ls.syntax_error('syntax error')
+        if self.testnext(','):      # assignment -> ',' primaryexp assignment
+            nv = LHSAssign(lh)
+            self.primaryexp(nv.v)
+            if nv.v.k == VLOCAL:
+                self.check_conflict(lh, nv.v)
+            self.checklimit(nvars, LUAI_MAXCCALLS - self.nccalls, 'variables in assignment')
+            self.assignment(nv, nvars + 1)
+        else:       # assignment -> '=' explist1
+            self.checknext('=')
+            nexps = self.explist1(e)
+            if nexps != nvars:
+                self.adjust_assign(nvars, nexps, e)
+                if nexps > nvars:
+                    self.fs.freereg -= nexps - nvars        # лишние значения
+            else:
+                self.setoneret(e)
+                self.storevar(lh.v, e)
+                return
+        e.__init__(VNONRELOC, self.fs.freereg - 1)
+        self.storevar(lh.v, e)
+
+    def cond(self):
+        v = ExpDesc()
+        self.expr(v)
+        if v.k == VNIL:
+            v.k = VFALSE        # все "ложные" одинаковы
+        self.goiftrue(v)
+        return v.f
+
+    def breakstat(self):
+        fs = self.fs
+        bl = fs.bl
+        upval = False
+        while bl  and  not bl.isbreakable:
+            upval |= bl.upval
+            bl = bl.previous
+        if not bl:
+            self.ls.syntax_error('no loop to break')
+        if upval:
+            self.codeABC(OP_CLOSE, bl.nactvar, 0, 0)
+        bl.breaklist = self.concat(bl.breaklist, self.jump())
+
+    def whilestat(self, line):
+        '''whilestat -> WHILE cond DO block END'''
+        self.ls.next()
+        whileinit = self.getlabel()
+        condexit = self.cond()
+        self.enterblock(True)
+        self.checknext('do')
+        self.block()
+        self.patchlist(self.jump(), whileinit)
+        self.check_match('end', 'while', line)
+        self.leaveblock()
+        self.patchtohere(condexit)      # ложное условие завершает цикл
+
+    def repeatstat(self, line):
+        '''repeatstat -> REPEAT block UNTIL cond'''
+        repeat_init = self.getlabel()
+        self.enterblock(True)       # блок цикла
+        bl2 = self.enterblock(False)        # блок видимости
+        self.ls.next()
+        self.chunk()
+        self.check_match('until', 'repeat', line)
+        condexit = self.cond()      # условие внутри блока видимости
+        if not bl2.upval:
+            self.leaveblock()
+            self.patchlist(condexit, repeat_init)
+        else:       # с upvalues: break по условию, иначе закрыть и повторить
+            self.breakstat()
+            self.patchtohere(condexit)
+            self.leaveblock()
+            self.patchlist(self.jump(), repeat_init)
+        self.leaveblock()
+
+    def exp1(self):
+        e = ExpDesc()
+        self.expr(e)
+        k = e.k
+        self.exp2nextreg(e)
+        return k
+
+    def forbody(self, base, line, nvars, isnum):
+        '''forbody -> DO block'''
+        fs = self.fs
+        self.adjustlocalvars(3)     # управляющие переменные
+        self.checknext('do')
+        prep = self.codeAsBx(OP_FORPREP, base, NO_JUMP)  if isnum else  self.jump()
+        self.enterblock(False)      # объявленные переменные
+        self.adjustlocalvars(nvars)
+        self.reserveregs(nvars)
+        self.block()
+        self.leaveblock()
+        self.patchtohere(prep)
+        endfor = self.codeAsBx(OP_FORLOOP, base, NO_JUMP)  if isnum else  self.codeABC(OP_TFORLOOP, base, 0, nvars)
+        self.fixline(line)      # строка OP_FOR* - начало цикла
+        self.patchlist(endfor  if isnum else  self.jump(), prep + 1)
+
+    def fornum(self, varname, line):
+        '''fornum -> NAME = exp1,exp1[,exp1] forbody'''
+        fs = self.fs
+        base = fs.freereg
+        self.new_localvar(b'(for index)', 0)
+        self.new_localvar(b'(for limit)', 1)
+        self.new_localvar(b'(for step)', 2)
+        self.new_localvar(varname, 3)
+        self.checknext('=')
+        self.exp1()     # начальное значение
+        self.checknext(',')
+        self.exp1()     # предел
+        if self.testnext(','):
+            self.exp1()     # шаг
+        else:
+            self.codeABx(OP_LOADK, fs.freereg, self.numberK(1.0))
+            self.reserveregs(1)
+        self.forbody(base, line, 1, True)
+
+    def forlist(self, indexname):
+        '''forlist -> NAME {,NAME} IN explist1 forbody'''
+        fs = self.fs
+        e = ExpDesc()
+        base = fs.freereg
+        self.new_localvar(b'(for generator)', 0)
+        self.new_localvar(b'(for state)', 1)
+        self.new_localvar(b'(for control)', 2)
+        self.new_localvar(indexname, 3)
+        nvars = 4
+        while self.testnext(','):
+            self.new_localvar(self.str_checkname(), nvars)
+            nvars += 1
+        self.checknext('in')
+        line = self.ls.linenumber
+        self.adjust_assign(3, self.explist1(e), e)
+        self.checkstack(3)      # место для вызова генератора
+        self.forbody(base, line, nvars - 3, False)
+
+    def forstat(self, line):
+        '''forstat -> FOR (fornum | forlist) END'''
+        self.enterblock(True)       # цикл и управляющие переменные
+        self.ls.next()
+        varname = self.str_checkname()
+        token = self.ls.token
+        if token == '=':
+            self.fornum(varname, line)
+        elif token == ','  or  token == 'in':
+            self.forlist(varname)
+        else:
+            self.ls.syntax_error("'=' or 'in' expected")
+        self.check_match('end', 'for', line)
+        self.leaveblock()       # break переходит сюда
+
+    def test_then_block(self):
+        '''test_then_block -> [IF | ELSEIF] cond THEN block'''
+        self.ls.next()
+        condexit = self.cond()
+        self.checknext('then')
+        self.block()
+        return condexit
+
+    def ifstat(self, line):
+        '''ifstat -> IF cond THEN block {ELSEIF cond THEN block} [ELSE block] END'''
+        escapelist = NO_JUMP
+        flist = self.test_then_block()
+        while self.ls.token == 'elseif':
+            escapelist = self.concat(escapelist, self.jump())
+            self.patchtohere(flist)
+            flist = self.test_then_block()
+        if self.ls.token == 'else':
+            escapelist = self.concat(escapelist, self.jump())
+            self.patchtohere(flist)
+            self.ls.next()      # после patchtohere: правильный номер строки
+            self.block()
+        else:
+            escapelist = self.concat(escapelist, flist)
+        self.patchtohere(escapelist)
+        self.check_match('end', 'if', line)
+
+    def localfunc(self):
+        fs = self.fs
+        v, b = ExpDesc(), ExpDesc()
+        self.new_localvar(self.str_checkname(), 0)
+        v.__init__(VLOCAL, fs.freereg)
+        self.reserveregs(1)
+        self.adjustlocalvars(1)
+        self.body(b, False, self.ls.linenumber)
+        self.storevar(v, b)
+        # отладочная информация видит переменную только после этой точки
+        fs.f.locvars[fs.actvar[fs.nactvar - 1]][1] = fs.pc
+
+    def localstat(self):
+        '''stat -> LOCAL NAME {',' NAME} ['=' explist1]'''
+        nvars = 0
+        e = ExpDesc()
+        while True:
+            self.new_localvar(self.str_checkname(), nvars)
+            nvars += 1
+            if not self.testnext(','):
+                break
+        if self.testnext('='):
+            nexps = self.explist1(e)
+        else:
+            e.k = VVOID
+            nexps = 0
+        self.adjust_assign(nvars, nexps, e)
+        self.adjustlocalvars(nvars)
+
+    def funcname(self, v):
+        '''funcname -> NAME {field} [':' NAME]'''
+        needself = False
+        self.singlevar(v)
+        while self.ls.token == '.':
+            self.field(v)
+        if self.ls.token == ':':
+            needself = True
+            self.field(v)
+        return needself
+
+    def funcstat(self, line):
+        '''funcstat -> FUNCTION funcname body'''
+        v, b = ExpDesc(), ExpDesc()
+        self.ls.next()
+        needself = self.funcname(v)
+        self.body(b, needself, line)
+        self.storevar(v, b)
+        self.fixline(line)      # определение "происходит" в первой строке
+
+    def exprstat(self):
+        '''stat -> func | assignment'''
+        v = LHSAssign(None)
+        self.primaryexp(v.v)
+        if v.v.k == VCALL:      # вызов как оператор: результаты не нужны
+            self.setarg(v.v.info, 14, 0x1FF, 1)
+        else:
+            self.assignment(v, 1)
+
+    def retstat(self):
+        '''stat -> RETURN explist'''
+        ls = self.ls
+        fs = self.fs
+        e = ExpDesc()
+        ls.next()
+        if self.block_follow(ls.token)  or  ls.token == ';':
+            first = nret = 0
+        else:
+            nret = self.explist1(e)
+            if e.k == VCALL  or  e.k == VVARARG:
+                self.setmultret(e)
+                if e.k == VCALL  and  nret == 1:        # хвостовой вызов
+                    code = fs.f.code
+                    code[e.info] = code[e.info] & ~0x3F | OP_TAILCALL
+                first = fs.nactvar
+                nret = LUA_MULTRET
+            elif nret == 1:
+                first = self.exp2anyreg(e)
+            else:
+                self.exp2nextreg(e)
+                first = fs.nactvar
+        self.ret(first, nret)
+
+    def statement(self):
+        ls = self.ls
+        line = ls.linenumber
+        token = ls.token
+        if token == 'if':
+            self.ifstat(line)
+        elif token == 'while':
+            self.whilestat(line)
+        elif token == 'do':
+            ls.next()
+            self.block()
+            self.check_match('end', 'do', line)
+        elif token == 'for':
+            self.forstat(line)
+        elif token == 'repeat':
+            self.repeatstat(line)
+        elif token == 'function':
+            self.funcstat(line)
+        elif token == 'local':
+            ls.next()
+            if self.testnext('function'):
+                self.localfunc()
+            else:
+                self.localstat()
+        elif token == 'return':
+            self.retstat()
+            return True     # должен быть последним
+        elif token == 'break':
+            ls.next()
+            self.breakstat()
+            return True
+        else:
+            self.exprstat()
+        return False
+
+    def chunk(self):
+        '''chunk -> { stat [';'] }'''
+        self.enterlevel()
+        islast = False
+        while not islast  and  not self.block_follow(self.ls.token):
+            islast = self.statement()
+            self.testnext(';')
+            self.fs.freereg = self.fs.nactvar       # освобождаем регистры
+        self.leavelevel()
+
+
+class ConsControl:
+    __slots__ = ('v', 't', 'nh', 'na', 'tostore')
+
+    def __init__(self, t):
+        self.v = ExpDesc()      # последний элемент списка
+        self.t = t              # таблица
+        self.nh = 0             # число элементов 'ключ = значение'
+        self.na = 0             # число элементов массива
+        self.tostore = 0        # ещё не записанные элементы массива
+
+
+class LHSAssign:
+    __slots__ = ('prev', 'v')
+
+    def __init__(self, prev):
+        self.prev = prev
+        self.v = ExpDesc()
+
+
+def int2fb(x):
+    '''Размер таблицы в формате "число с плавающей точкой" из байта (luaO_int2fb)'''
+    e = 0
+    while x >= 16:
+        x = (x + 1) >> 1
+        e += 1
+    return x  if x < 8 else  ((e + 1) << 3) | (x - 8)
+
+
+########################################  запись .lu (ldump.c)
+
+def _dump_ints(values, out):
+    values = array('I', values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    out += INT.pack(len(values)) + values.tobytes()
+
+
+def _dump_function(f, parent_source, strip, out):
+    out += dump_string(None  if f.source == parent_source or strip else  f.source)
+    out += struct.pack('<IIBBBB', f.linedefined, f.lastlinedefined, f.nups, f.numparams, f.is_vararg, f.maxstacksize)
+    _dump_ints(f.code, out)
+    out += INT.pack(len(f.k))
+    for c in f.k:
+        out += dump_constant(c)
+    out += INT.pack(len(f.p))
+    for p in f.p:
+        _dump_function(p, f.source, strip, out)
+    _dump_ints(()  if strip else  f.lineinfo, out)
+    out += INT.pack(0  if strip else  len(f.locvars))
+    if not strip:
+        for name, startpc, endpc in f.locvars:
+            out += dump_string(name) + INT.pack(startpc) + INT.pack(endpc)
+    out += INT.pack(0  if strip else  len(f.upvalues))
+    if not strip:
+        for name in f.upvalues:
+            out += dump_string(name)
+
+
+########################################  интерфейс как у asm_lu / disasm_lu
+
+def parse(source, chunkname='=?'):
+    '''bytes (исходник lua) -> Proto главной функции'''
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20 * LUAI_MAXCCALLS + 1000))      # глубина разбора ограничена LUAI_MAXCCALLS
+    try:
+        return Compiler(source, chunkname.encode('utf-8')  if isinstance(chunkname, str) else  chunkname).compile()
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+def dump(proto, strip=False):
+    '''Proto -> bytes (.lu)'''
+    out = bytearray(FILE_HEADER)
+    _dump_function(proto, None, strip, out)
+    return bytes(out)
+
+
+def compile_source(source, chunkname='=?', strip=False):
+    '''bytes (исходник lua) -> bytes (.lu);  chunkname как у luac: '@' + имя файла'''
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    return dump(parse(source, chunkname), strip)
+
+
+def read_source(fname):
+    '''Содержимое .lua как его читает luaL_loadfile: первая строка, начинающаяся с '#', пропускается'''
+    with open(fname, 'rb') as f_in:
+        source = f_in.read()
+    if source[:1] == b'#':
+        newline = source.find(b'\n')
+        source = b'\n' + (source[newline + 1:]  if newline >= 0 else  b'')
+    return source
+
+
+def compile_file(fname, fname_out=None, strip=False):
+    '''Скомпилировать файл .lua;  по умолчанию результат пишется рядом в .lu'''
+    data = compile_source(read_source(fname), '@' + fname, strip)
+    if fname_out is None:
+        fname_out = os.path.splitext(fname)[0] + '.lu'
+    with open(fname_out, 'wb') as f_out:
+        f_out.write(data)
+    return fname_out
+
+
+def _compile_job(job):
+    '''Задание для пула процессов: (fname, fname_out, strip) -> (success, fname, error)'''
+    fname, fname_out, strip = job
+    try:
+        compile_file(fname, fname_out, strip)
+        return True, fname, None
+    except LuaSyntaxError as e:
+        return False, fname, str(e)
+    except Exception as e:
+        return False, fname, '%s: %s' % (type(e).__name__, e)
+
+
+def compile_files(files, workers=None, strip=False):
+    '''
+    Пакетный режим: files - список пар (fname, fname_out).
+    Файлы обрабатываются в пуле процессов, результаты (success, fname, error) выдаются по мере готовности.
+    '''
+    jobs = [ (fname, fname_out, strip)  for fname, fname_out in files ]
+    if workers == 1  or  len(jobs) < 2:
+        for job in jobs:
+            yield _compile_job(job)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed     # не нужен для одиночного запуска из командной строки
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [ executor.submit(_compile_job, job)  for job in jobs ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv):
+    names = argv[1:]
+    strip = '-s' in names
+    names = [ s  for s in names  if s != '-s' ]
+    if not names:  print(USAGE % argv[0]);  exit(0)
+    fname = names[0]
+    try:
+        compile_file(fname, names[1]  if len(names) > 1 else  None, strip)
+    except LuaSyntaxError as e:
+        print('%s: %s' % (os.path.basename(argv[0]), e), file=sys.stderr)
+        exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -1,273 +1,285 @@
 #!/usr/bin/env python3
-import re, struct, pprint, sys, collections
-from OpCodes import opcodes, FILE_HEADER
-
-SHOW_CONSTS = False         # -c
-DEBUG = 0                   # -d
-HEX_EDITOR_VALUES = False   # -x
-CONCISE = False             # -C
-
-def f_init():
-    global SHOW_CONSTS, DEBUG, HEX_EDITOR_VALUES, CONCISE, f_in, f_out
-    names = sys.argv[1:]
-    if '-c' in names:  SHOW_CONSTS = True
-    if '-d' in names:  DEBUG = 99
-    if '-x' in names:  HEX_EDITOR_VALUES = True
-    if '-C' in names:  CONCISE = True
-    names = [ s  for s in names  if s not in ('-c', '-d', '-x', '-C') ]
-    if not names:  print('usage:  %s  [-c] [-d] [-x] [-C]  filename.lu  [filename_out|-]\n-c -- to show constants (required for future assemble)\n-d -- enable debugging\n-x -- include hex code\n-C -- concise output' % sys.argv[0]);  exit(0)
-
-    fname = names[0]
-    assert fname[-3:] == '.lu',  'Имя файла должно заканчиваться на .lu: %s'%fname
-    f_in = open(fname, 'rb')
-    if len(names) > 1:
-        f_out = open(names[1], 'w', encoding='utf-8')  if names[1] != '-' else  sys.stdout
-    else:
-        f_out = open(fname[:-3] + '.asm', 'w', encoding='utf-8')
-f_init()
-
-
-file_header = f_in.read(12)
-assert FILE_HEADER == file_header,  file_header
-file_offset = 12
-
-
-def get_int(f_in):     # unsigned int
-    global file_offset
-    file_offset += 4
-    return struct.unpack('<I', f_in.read(4)) [0]
-
-def get_str(f_in):
-    global file_offset
-    slen = get_int(f_in)
-    if slen==0:  return None    # это не настоящий тип None, а признак несуществующей строки
-    file_offset += slen
-    s = f_in.read(slen)
-    assert s[-1] == 0,  s
-    return s[:-1].decode('utf-8')
-
-
-def disasm(code, consts):
-    op = code & 0x3F
-    return opcodes[op].disasm(code, consts)
-
-def get_code(f_in):
-    code_len = get_int(f_in)
-    code = [ get_int(f_in)  for _ in range(code_len) ]
-    assert code[-1] == 8388638,  code[-1]   # стандартный 'Return 0 1 0'
-#    return code[:-1]
-    return code
-
-
-def get_consts(f_in):
-    def get_one_const(f_in):
-        global file_offset
-        file_offset += 1
-        c_type = ord( f_in.read(1) )
+import struct, sys, io, os
+from array import array
+from OpCodes import opcodes, decode_columns, disasm_columns, FILE_HEADER
+from cfg import recover_structure, format_gotoes
+from ir import FunctionIR
+import ir
+
+USAGE = '''usage:  %s  [-c] [-d] [-x] [-C] [-I]  filename.lu|filename.luir  [filename_out|-]
+-c -- to show constants (required for future assemble)
+-d -- enable debugging
+-x -- include hex code
+-C -- concise output
+-I -- also save parsed bytecode to filename.luir (loaded instead of .lu next time)'''
+
+INT = struct.Struct('<I')
+FUNC_PARAMS = struct.Struct('<IIBBBB')
+NUMBER = struct.Struct('<d')
+
+
+class Disassembler:
+    '''Дизассемблер lua-5.1 байткода. Всё состояние хранится в экземпляре, поэтому можно вызывать из нескольких потоков/процессов.'''
+
+    def __init__(self, show_consts=False, debug=0, hex_values=False, concise=False):
+        self.show_consts = show_consts      # -c
+        self.debug = debug                  # -d
+        self.hex_values = hex_values        # -x
+        self.concise = concise              # -C
+
+    def disassemble(self, data):
+        '''bytes (содержимое .lu) -> текст .asm'''
+        return self.render(self.parse(data))
+
+    def parse(self, data):
+        '''bytes (содержимое .lu) -> FunctionIR главной функции'''
+        self.data = memoryview(data).cast('B')     # файл читается целиком, дальше только срезы/unpack_from
+        self.pos = 0                               # текущее смещение в файле
+        try:
+            file_header = self.get_bytes(12)
+            assert FILE_HEADER == file_header,  file_header
+            return self.get_func()
+        finally:
+            self.data.release()
+
+    def render(self, func):
+        '''FunctionIR -> текст .asm'''
+        self.f_out = io.StringIO()
+        self.func_numbers = [0]
+        self.total_funcs = 0
+        self.render_func(func)
+        return self.f_out.getvalue()
+
+    def get_bytes(self, n):
+        end = self.pos + n
+        if end > len(self.data):
+            raise struct.error('unexpected end of file at offset %i' % self.pos)
+        s = self.data[self.pos:end].tobytes()
+        self.pos = end
+        return s
+
+    def get_int(self):     # unsigned int
+        value, = INT.unpack_from(self.data, self.pos)
+        self.pos += 4
+        return value
+
+    def get_str(self):
+        slen = self.get_int()
+        if slen==0:  return None    # это не настоящий тип None, а признак несуществующей строки
+        s = self.get_bytes(slen)
+        assert s[-1] == 0,  s
+        return sys.intern(s[:-1].decode('utf-8'))     # одинаковые имена во всех функциях - один объект
+
+    @staticmethod
+    def disasm(code, consts):
+        op = code & 0x3F
+        return opcodes[op].disasm(code, consts)
+
+    def get_int_array(self):    # int n + n*int  одним срезом
+        n = self.get_int()
+        end = self.pos + 4*n
+        if end > len(self.data):
+            raise struct.error('unexpected end of file at offset %i' % self.pos)
+        values = array('I')
+        values.frombytes(self.data[self.pos:end])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        self.pos = end
+        return values
+
+    def get_code(self):
+        code = self.get_int_array()
+        assert code[-1] == 8388638,  code[-1]   # стандартный 'Return 0 1 0'
+        return code
+
+    def get_one_const(self):
+        c_type = self.data[self.pos]
+        self.pos += 1
         if c_type == 0:
             return None
         elif c_type == 1:
-            file_offset += 1
-            b = ord( f_in.read(1) )
+            b = self.data[self.pos]
+            self.pos += 1
             assert b in (0,1),  b
             return bool(b)
         elif c_type == 3:
-            file_offset += 8
-            return struct.unpack('<d', f_in.read(8))[0]
+            value, = NUMBER.unpack_from(self.data, self.pos)
+            self.pos += 8
+            return value
         elif c_type == 4:
-            return get_str(f_in)
+            return self.get_str()
         else:
             assert False,  [c_type]
-    consts_num = get_int(f_in)
-    consts = [ get_one_const(f_in)  for _ in range(consts_num) ]
-    if SHOW_CONSTS:
-        for i,v in enumerate(consts):
-            print('CONST', i, v.__repr__(), file=f_out)
-    return consts
-
-
-def calc_indents(codelines):
-    '''В lua-5.1 нет CONTINUE. Только BREAK.'''
-    c = codelines
-    gotoes = collections.defaultdict(set)   # {'FORStart': {3}, 'FORend': {12}, 'TFor': {20}, 'if': {7}, 'jmp': {8, 9, 16, 21}}
-    cycles = []     # список начальных и конечных (включительно) позиций циклов [[3, 14], [18, 23], [24, 29], [30, 34]]
-    stack = []      # стек переходов if:  [(7, 12), (25, 30), (36, 42), (40, 45), (43, 48)]
-    for i,line in enumerate(c):
-        if line.gotoes[0]:              # варианты значений line.gotoes: ['',0],  ['jmp',-5],  ['if',1]
-            line.gotoes[1] += i+1
-            gotoes[ line.gotoes[0] ].add( i )
-        else:
-            line.gotoes[1] = ''
-
-    for i in set( gotoes['FORStart'] ):    # i - номер строки с FORStart;  j - FORend;   jmp отсутствуют
-        j = c[i].gotoes[1]
-        assert j > i
-        x,k = c[j].gotoes
-        assert x == 'FORend'
-        assert k == i+1
-        for _ in range(i+1, j+1):  c[_].indent += 1
-        cycles.append([i,j])
-        gotoes['FORend'] -= {j}
-        gotoes['FORStart'] -= {i}
-    assert gotoes['FORend'] == set()
-
-    for i in set( gotoes['TFor'] ):    # i - номер строки с TFOR;  в i+1 д.б. jmp с отрицат.смещением;  j - начало цикла;  j-1 - первый jmp на TFOR
-        x,j = c[i+1].gotoes
-        assert x == 'jmp'
-        assert j < i
-        assert c[j-1].gotoes == ['jmp', i]
-        for _ in range(j, i+2):  c[_].indent += 1
-        cycles.append([j-1,i+1])
-        gotoes['jmp'] -= {i+1, j-1}
-        gotoes['TFor'] -= {i}
-        c[j-1].full = 'TFOR:  ' + c[j-1].full
-
-    for i in set( gotoes['jmp'] ):  # Обработка while, repeat-until. Все они оканчиваются jmp с отрицат.смещением.
-        j = c[i].gotoes[1]
-        if j > i:  continue
-        for _ in range(j+1, i+1):  c[_].indent += 1
-        cycles.append([j,i])
-        gotoes['jmp'] -= {i}
-        if c[i-1].gotoes[0] == 'if':    # repeat-until
-            gotoes['if'] -= {i-1}
-            c[j].full = 'REPEAT: ' + c[j].full
-        else:                           # while. Внутренний if исполняет роль break.
-            c[j].full = 'WHILE: ' + c[j].full
-
-    for i in set( gotoes['jmp'] ):
-        for j,k in cycles:
-            if j < i < k  and  c[i].gotoes[1] == k+1:
-                c[i].full = 'BREAK: ' + c[i].full
-                if c[i-1].gotoes != ['if', i+1]:        # удаляем одинокие break (не являющиеся частью while: там if-jmp)
-                    gotoes['jmp'] -= {i}
-
-    # Остались только if с положит.смещением и одинокие jmp-else.
-    for i in set( gotoes['if'] ):  # i - номер строки с IF;  j - куда переходит i+1 jmp;  если есть ELSE, на j-1 месте должен быть jmp
-        assert i+1 in gotoes['jmp']
-        x,j = c[i+1].gotoes
-        assert i < j,  [i,j]
-        for _ in range(i+2, j):  c[_].indent += 1
-        gotoes['if'] -= {i}
-        gotoes['jmp'] -= {i+1}
-        stack.append( (i,j) )
-
-    # оставшиеся jmp должны быть else (есть исключения)
-    for i in set( gotoes['jmp'] ):
-        j = c[i].gotoes[1]
-        assert i < j,  [i,j]
-        if i+1 in [ j  for i,j in stack ]:
-            c[i].indent -= 1
-            c[i].full = 'ELSE: ' + c[i].full
-            gotoes['jmp'] -= {i}
-            gotoes['else'].add(i+1)
-        elif i+2 in [ j  for i,j in stack ]  and c[i+1].gotoes == ['LoadB1',i+3]:     # else на второй LoadB0 из пары
-            c[i].indent -= 1
-            c[i].full = 'ELSE2: ' + c[i].full
-            gotoes['jmp'] -= {i}
-            gotoes['else'].add(i+2)
-        else:
-            c[i].full = 'IF-TRUE-ELSE: ' + c[i].full    # в конструкции if true then ... оператор if опускается, остаётся только else (даже если пустой).
-        for _ in range(i+1, j):  c[_].indent += 1
-
-    stack2 = []
-    if DEBUG:
-        print('STACK:', sorted(stack))
-    for j,i in sorted(stack):   # i - куда, j - откуда
-        stack2.append([i, str(j)])
-        while len(stack2) > 1:
-            if stack2[-2][0] == j+2:
-                if DEBUG:
-                    print('ОбъединяемX:', stack2)
-                stack2[-1][1] = '%s %s x' % (stack2[-2][1], stack2[-1][1])
-                stack2.pop(-2)
-                if DEBUG:
-                    print('   --->     ', stack2)
-                continue
-            if stack2[-2][0] == stack2[-1][0]:
-                if DEBUG:
-                    print('ОбъединяемY:', stack2)
-                stack2[-2][1] += ' %s y' % stack2[-1][1]
-                stack2.pop(-1)
-                if DEBUG:
-                    print('   --->     ', stack2)
-                continue
-            break
-
-
-    if DEBUG:
-        for i,j in cycles:
-            c[i].comment = c[j+1].comment = ''
-    for i,j in stack2:
-        if ' ' in j:
-            c[i].comment = ''
-        if DEBUG:  print('#', [i, j], file=f_out)
-    for i,j in stack2:  # отдельным циклом, чтобы наверняка не было перекрытия с предыдущими
-        if ' ' in j:
-            k = re.findall(r'\d+', j)
-            c[ int(k[0]) ].comment = '\t# %s: %s' % (i,j)
-
-    gotoes = { x:y  for x,y in gotoes.items()  if y }
-    if 0 or DEBUG:
-        print('#blocks:', sorted(cycles), file=f_out)
-        print('#stack: ', sorted(stack), file=f_out)
-        print('#stack2:', stack2, file=f_out)
-    if 0 or DEBUG  or  'jmp' in gotoes:
-        print('#gotoes:', gotoes, file=f_out)
-
-
-def get_func(f_in):
-    global file_offset, total_funcs
-    func_name = get_str(f_in)
-    file_offset += 12
-    func_params = struct.unpack('<IIBBBB', f_in.read(12))
-    fn = '[%s: %s]' % (total_funcs, str(func_numbers)[1:-1])
-    print('\nFUNC', fn, func_params, ';; #upvalues, #parameters, 1=VARARG_HASARG|2=VARARG_ISVARARG|4=VARARG_NEEDSARG, #registers', file=f_out)
-    if func_name:
-        print('#func_name:', func_name.__repr__(), file=f_out)
-    code_offset = file_offset + 4       # +4, т.к. ещё читается int - число операторов в коде
-
-    list_code = get_code(f_in)
-    list_consts = get_consts(f_in)
-    code = [ disasm(x, list_consts)  for x in list_code ]
-    calc_indents(code)
-    for i,(c,x) in enumerate(zip(list_code, code)):
-        if not CONCISE:
-            if hasattr(x, 'comment'):  print(x.comment, file=f_out)
-            if HEX_EDITOR_VALUES:
-                print('%5x %8x ' % (code_offset + 4*i, c), end='', file=f_out)
-            print('%3i.'%i, ' %-8s %3s   '%tuple(x.gotoes), end='', file=f_out)
-            print('.   '*x.indent, '%-60s'%x.full, ' ; ', x.simple, sep='', file=f_out)
-        else:
-            print('   '*x.indent, '%s'%x.full, sep='', file=f_out)
-
 
-    total_funcs += 1
-    func_numbers.append(0)
-    funcs_num = get_int(f_in)
-    if SHOW_CONSTS:
-        print('FUNCS_NUM:', funcs_num, file=f_out)
-    list_funcs = [ get_func(f_in)  for i in range(funcs_num) ]
-    func_numbers.pop()
-    func_numbers.append(1 + func_numbers.pop())
+    def get_consts(self):
+        consts_num = self.get_int()
+        return tuple( self.get_one_const()  for _ in range(consts_num) )
+
+    def calc_indents(self, codelines, columns):
+        '''Отступы, метки и комментарии по восстановленной структуре (см. cfg.py)'''
+        op, a, b, c, bx, sbx = columns
+        st = recover_structure(op, c, sbx, debug=self.debug)
+        for i, line in enumerate(codelines):
+            line.gotoes = st.gotoes(i)
+            line.indent = st.indent[i]
+            if i in st.labels:
+                line.full = st.label(i) + line.full
+            if i in st.comments:
+                line.comment = st.comments[i]
+
+        f_out = self.f_out
+        if self.debug:
+            for i,j in st.chains:
+                print('#', [i, j], file=f_out)
+            print('#blocks:', sorted([ [loop.start, loop.end]  for loop in st.loops ]), file=f_out)
+            print('#stack: ', sorted(st.ifs), file=f_out)
+            print('#stack2:', st.chains, file=f_out)
+        if self.debug  or  st.unresolved.keys() - {'LoadB1', 'else'}:
+            print('#gotoes:', format_gotoes(st.unresolved), file=f_out)
+        return st
+
+    def get_func(self):
+        func_name = self.get_str()
+        func_params = FUNC_PARAMS.unpack_from(self.data, self.pos)
+        self.pos += FUNC_PARAMS.size
+        code_offset = self.pos + 4       # +4, т.к. ещё читается int - число операторов в коде
+        code = self.get_code()
+        consts = self.get_consts()
+        funcs_num = self.get_int()
+        protos = tuple( self.get_func()  for i in range(funcs_num) )
+
+        ### DEBUG INFO:
+        source_line_positions = self.get_int_array()
+        local_vars_num = self.get_int()
+        local_vars = tuple( (self.get_str(), self.get_int(), self.get_int())  for i in range(local_vars_num) )
+        upvalues_num = self.get_int()
+        upvalues = tuple( self.get_str()  for i in range(upvalues_num) )
+        return FunctionIR(func_name, func_params, code_offset, code, consts, protos, source_line_positions, local_vars, upvalues)
+
+    def render_func(self, func):
+        f_out = self.f_out
+        fn = '[%s: %s]' % (self.total_funcs, str(self.func_numbers)[1:-1])
+        print('\nFUNC', fn, func.params, ';; #upvalues, #parameters, 1=VARARG_HASARG|2=VARARG_ISVARARG|4=VARARG_NEEDSARG, #registers', file=f_out)
+        if func.name:
+            print('#func_name:', func.name.__repr__(), file=f_out)
+        if self.show_consts:
+            for i,v in enumerate(func.consts):
+                print('CONST', i, v.__repr__(), file=f_out)
+
+        list_code = func.code
+        columns = decode_columns(list_code)
+        code = disasm_columns(columns, func.consts)
+        self.calc_indents(code, columns)
+        for i,(c,x) in enumerate(zip(list_code, code)):
+            if not self.concise:
+                if hasattr(x, 'comment'):  print(x.comment, file=f_out)
+                if self.hex_values:
+                    print('%5x %8x ' % (func.code_offset + 4*i, c), end='', file=f_out)
+                print('%3i.'%i, ' %-8s %3s   '%tuple(x.gotoes), end='', file=f_out)
+                print('.   '*x.indent, '%-60s'%x.full, ' ; ', x.simple, sep='', file=f_out)
+            else:
+                print('   '*x.indent, '%s'%x.full, sep='', file=f_out)
+
+
+        self.total_funcs += 1
+        self.func_numbers.append(0)
+        if self.show_consts:
+            print('FUNCS_NUM:', len(func.protos), file=f_out)
+        for proto in func.protos:
+            self.render_func(proto)
+        self.func_numbers.pop()
+        self.func_numbers.append(1 + self.func_numbers.pop())
+
+
+        ### DEBUG INFO:
+        if func.lines:
+            print('#source_line_positions:', func.lines.tolist(), file=f_out)
+        if func.locvars:
+            print('#local_vars:', list(func.locvars), file=f_out)
+        if func.upvalues:
+            print('#upvalues:', list(func.upvalues), file=f_out)
+
+
+def parse(data):
+    '''bytes (.lu) -> FunctionIR'''
+    return Disassembler().parse(data)
+
+
+def parse_file(fname):
+    '''.lu или сохранённый .luir -> FunctionIR'''
+    if fname.endswith('.luir'):
+        return ir.load(fname)
+    with open(fname, 'rb') as f_in:
+        return parse(f_in.read())
+
+
+def disassemble(data, show_consts=False, debug=0, hex_values=False, concise=False):
+    '''bytes (.lu) -> текст (.asm)'''
+    return Disassembler(show_consts, debug, hex_values, concise).disassemble(data)
+
+
+def disassemble_file(fname, fname_out=None, save_ir=False, **options):
+    '''
+    Дизассемблировать файл .lu (или .luir);  по умолчанию результат пишется рядом в .asm.
+    save_ir - сохранить разобранный байткод рядом в .luir
+    '''
+    func = parse_file(fname)
+    if save_ir  and  not fname.endswith('.luir'):
+        ir.save(os.path.splitext(fname)[0] + '.luir', func)
+    text = Disassembler(**options).render(func)
+    if fname_out is None:
+        fname_out = os.path.splitext(fname)[0] + '.asm'
+    with open(fname_out, 'w', encoding='utf-8') as f_out:
+        f_out.write(text)
+    return fname_out
+
+
+def _disassemble_job(job):
+    '''Задание для пула процессов: (fname, fname_out, options) -> (success, fname, error)'''
+    fname, fname_out, options = job
+    try:
+        disassemble_file(fname, fname_out, **options)
+        return True, fname, None
+    except Exception as e:
+        return False, fname, '%s: %s' % (type(e).__name__, e)
+
+
+def disassemble_files(files, workers=None, **options):
+    '''
+    Пакетный режим: files - список пар (fname, fname_out).
+    Файлы обрабатываются в пуле процессов, результаты (success, fname, error) выдаются по мере готовности.
+    '''
+    jobs = [ (fname, fname_out, options)  for fname, fname_out in files ]
+    if workers == 1  or  len(jobs) < 2:
+        for job in jobs:
+            yield _disassemble_job(job)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed     # не нужен для одиночного запуска из командной строки
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [ executor.submit(_disassemble_job, job)  for job in jobs ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv):
+    names = argv[1:]
+    save_ir = '-I' in names
+    options = dict(
+        show_consts = '-c' in names,
+        debug = 99  if '-d' in names else  0,
+        hex_values = '-x' in names,
+        concise = '-C' in names,
+    )
+    names = [ s  for s in names  if s not in ('-c', '-d', '-x', '-C', '-I') ]
+    if not names:  print(USAGE % argv[0]);  exit(0)
 
-
-    ### DEBUG INFO:
-    source_line_positions_num = get_int(f_in)
-    source_line_positions = [ get_int(f_in)  for i in range(source_line_positions_num) ]
-    if source_line_positions:
-        print('#source_line_positions:', source_line_positions, file=f_out)
-
-    local_vars_num = get_int(f_in)
-    local_vars = [ (get_str(f_in), get_int(f_in), get_int(f_in))  for i in range(local_vars_num) ]
-    if local_vars:
-        print('#local_vars:', local_vars, file=f_out)
-
-    upvalues_num = get_int(f_in)
-    upvalues = [ get_str(f_in)  for i in range(upvalues_num) ]
-    if upvalues:
-        print('#upvalues:', upvalues, file=f_out)
+    fname = names[0]
+    assert fname[-3:] == '.lu'  or  fname[-5:] == '.luir',  'Имя файла должно заканчиваться на .lu: %s'%fname
+    if len(names) > 1  and  names[1] == '-':
+        sys.stdout.write(Disassembler(**options).render(parse_file(fname)))
+    else:
+        disassemble_file(fname, names[1]  if len(names) > 1 else  None, save_ir, **options)
 
 
-func_numbers = [0]
-total_funcs = 0
-get_func(f_in)
+if __name__ == '__main__':
+    main(sys.argv)
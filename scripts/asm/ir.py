@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+'''
+Компактное представление разобранного lua-5.1 байткода и его двоичный формат (.luir).
+
+FunctionIR хранит функцию "колонками": инструкции и номера строк - array('I'),
+константы - tuple, строки интернированы (одинаковые имена во всех функциях - один объект).
+dumps()/loads() сохраняют дерево функций целиком, чтобы повторно не разбирать .lu.
+
+Формат (little-endian), всё хранится колонками по всему файлу, а не по функциям:
+    b'LUIR', u16 версия, u16 флаги (0)
+    u32 число строк, строки: u32 длина + utf-8        (индекс 0 - None, строки с 1)
+    u32 число функций, таблица функций в прямом порядке обхода (FUNC):
+        u32 имя, u32 смещение кода в .lu, '<IIBBBB' параметры, u32 число вложенных,
+        u32 число инструкций, констант, номеров строк, локальных, upvalues
+    колонки: u32 n + данные
+        инструкции u32,  типы констант u8 (0 nil, 1 false, 2 true, 3 number, 4 string),
+        числа f64,  строковые константы u32,  номера строк u32,
+        локальные 3*u32 (имя, начало, конец),  upvalues u32
+'''
+import struct, sys
+from array import array
+
+MAGIC = b'LUIR'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHH')
+INT = struct.Struct('<I')
+FUNC = struct.Struct('<IIIIBBBBIIIIII')    # имя, смещение кода, параметры, #protos, длины колонок
+
+C_NIL, C_FALSE, C_TRUE, C_NUMBER, C_STRING = range(5)
+
+
+class FunctionIR:
+    '''Одна функция (прототип) lua-5.1 со всеми вложенными'''
+    __slots__ = ('name', 'params', 'code_offset', 'code', 'consts', 'protos', 'lines', 'locvars', 'upvalues')
+
+    def __init__(self, name, params, code_offset, code, consts, protos=(), lines=None, locvars=(), upvalues=()):
+        self.name = name                    # имя исходника или None
+        self.params = params                # (#upvalues, #parameters, vararg, #registers) как в '<IIBBBB'
+        self.code_offset = code_offset      # смещение массива инструкций в .lu (для -x)
+        self.code = code                    # array('I')
+        self.consts = consts                # tuple: None, bool, float, str
+        self.protos = protos                # tuple FunctionIR
+        self.lines = lines  if lines is not None else  array('I')    # номер строки исходника для каждой инструкции
+        self.locvars = locvars              # tuple (имя, начало, конец)
+        self.upvalues = upvalues            # tuple имён
+
+    def walk(self):
+        '''Эта и все вложенные функции в прямом порядке'''
+        yield self
+        for proto in self.protos:
+            yield from proto.walk()
+
+    def __eq__(self, other):
+        return isinstance(other, FunctionIR)  and  all( getattr(self, k) == getattr(other, k)  for k in self.__slots__ )
+
+    def __repr__(self):
+        return '<FunctionIR %s: %i instructions, %i consts, %i protos>' % (self.name, len(self.code), len(self.consts), len(self.protos))
+
+
+def _to_bytes(values, typecode='I'):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return INT.pack(len(values)) + values.tobytes()
+
+
+def dumps(func):
+    '''FunctionIR -> bytes'''
+    strings = {None: 0}
+    def ref(s):
+        idx = strings.get(s)
+        if idx is None:
+            idx = strings[s] = len(strings)
+        return idx
+
+    table = bytearray()
+    code, types, numbers, refs, lines, locvars, upvalues = array('I'), bytearray(), [], [], array('I'), [], []
+    funcs = list(func.walk())
+    for f in funcs:
+        table += FUNC.pack(ref(f.name), f.code_offset, *f.params, len(f.protos),
+                           len(f.code), len(f.consts), len(f.lines), len(f.locvars), len(f.upvalues))
+        code.extend(f.code)
+        for c in f.consts:
+            if c is None:
+                types.append(C_NIL)
+            elif c is True or c is False:
+                types.append(C_TRUE  if c else  C_FALSE)
+            elif isinstance(c, float):
+                types.append(C_NUMBER);  numbers.append(c)
+            else:
+                types.append(C_STRING);  refs.append(ref(c))
+        lines.extend(f.lines)
+        locvars += [ x  for name, start, end in f.locvars  for x in (ref(name), start, end) ]
+        upvalues += [ ref(name)  for name in f.upvalues ]
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, 0))
+    out += INT.pack(len(strings) - 1)
+    for s in list(strings)[1:]:
+        b = s.encode('utf-8')
+        out += INT.pack(len(b)) + b
+    out += INT.pack(len(funcs)) + table
+    out += _to_bytes(code) + INT.pack(len(types)) + types + _to_bytes(numbers, 'd') + _to_bytes(refs)
+    out += _to_bytes(lines) + _to_bytes(locvars) + _to_bytes(upvalues)
+    return bytes(out)
+
+
+def loads(data):
+    '''bytes -> FunctionIR'''
+    view = memoryview(data)
+    magic, version, flags = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError('not a LUIR file')
+    if version != VERSION:
+        raise ValueError('unsupported LUIR version %i (expected %i)' % (version, VERSION))
+    pos = HEADER.size
+
+    def get_bytes(n):
+        nonlocal pos
+        if pos + n > len(view):
+            raise ValueError('truncated LUIR data at offset %i' % pos)
+        pos += n
+        return view[pos - n:pos]
+
+    def get_int():
+        value, = INT.unpack(get_bytes(4))
+        return value
+
+    def get_array(typecode='I'):
+        values = array(typecode)
+        values.frombytes(get_bytes(get_int() * values.itemsize))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    strings = [None]
+    for _ in range(get_int()):
+        strings.append(sys.intern(str(get_bytes(get_int()), 'utf-8')))
+
+    table = list(FUNC.iter_unpack(get_bytes(get_int() * FUNC.size)))
+    code = get_array()
+    types = get_bytes(get_int()).tobytes()
+    numbers = iter(get_array('d'))
+    refs = iter(get_array())
+    fixed = (None, False, True)
+    consts = [ fixed[t]  if t < C_NUMBER else  next(numbers)  if t == C_NUMBER else  strings[next(refs)]  for t in types ]
+    lines = get_array()
+    locvars = get_array()
+    locvars = [ (strings[locvars[i]], locvars[i+1], locvars[i+2])  for i in range(0, len(locvars), 3) ]
+    upvalues = [ strings[idx]  for idx in get_array() ]
+
+    # раскладываем колонки по функциям в том же порядке обхода
+    at = [0] * 5        # текущая позиция в колонках code, consts, lines, locvars, upvalues
+    rows = iter(table)
+    def get_func():
+        name, code_offset, *params = next(rows)
+        params, protos_num, sizes = tuple(params[:6]), params[6], params[7:]
+        (c, k, l, v, u), ends = at[:], [ start + size  for start, size in zip(at, sizes) ]
+        at[:] = ends
+        c2, k2, l2, v2, u2 = ends
+        protos = tuple( get_func()  for _ in range(protos_num) )
+        return FunctionIR(strings[name], params, code_offset, code[c:c2], tuple(consts[k:k2]),
+                          protos, lines[l:l2], tuple(locvars[v:v2]), tuple(upvalues[u:u2]))
+
+    if not table:
+        raise ValueError('LUIR data without functions')
+    return get_func()
+
+
+def save(path, func):
+    with open(path, 'wb') as f:
+        f.write(dumps(func))
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
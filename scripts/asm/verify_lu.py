@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+'''
+Проверка пути .lu -> disasm_lu -c -> asm_lu -> .lu: собранный файл должен совпасть с исходным байт в байт.
+asm_lu не сохраняет имя исходника и отладочную информацию, поэтому исходный файл сравнивается
+в том же виде (как после luac -s): отладочная информация вырезается прямо из исходных байтов. Всё делается в памяти, файлы .asm не пишутся.
+'''
+import struct, sys, os, time
+import disasm_lu, asm_lu
+from OpCodes import FILE_HEADER, INT, NUMBER
+
+USAGE = 'usage:  %s  [-j N]  folder|filename.lu ...'
+
+FUNC_PARAMS = struct.Struct('<IIBBBB')
+CONST_SIZE = {0: 0, 1: 1, 3: NUMBER.size}       # тип константы -> размер значения (строки отдельно)
+
+
+def _read_int(data, pos):
+    if pos + 4 > len(data):
+        raise ValueError('truncated at offset 0x%x' % pos)
+    return INT.unpack_from(data, pos)[0], pos + 4
+
+
+def _skip_string(data, pos):
+    n, pos = _read_int(data, pos)
+    return pos + n
+
+
+def _strip_func(data, pos, out):
+    '''Функция .lu с позиции pos -> out без отладочной информации; возвращает позицию после неё'''
+    pos = _skip_string(data, pos)       # имя исходника
+    out += INT.pack(0)
+    start = pos
+    pos += FUNC_PARAMS.size
+    n, pos = _read_int(data, pos)
+    pos += 4 * n                        # код
+    n, pos = _read_int(data, pos)
+    for i in range(n):
+        if pos >= len(data):
+            raise ValueError('truncated at offset 0x%x' % pos)
+        tag = data[pos]
+        pos += 1
+        if tag == 4:
+            pos = _skip_string(data, pos)
+        elif tag in CONST_SIZE:
+            pos += CONST_SIZE[tag]
+        else:
+            raise ValueError('bad constant type %i at offset 0x%x' % (tag, pos - 1))
+    n, pos = _read_int(data, pos)
+    out += data[start:pos]              # параметры, код и константы копируются как есть
+    for i in range(n):
+        pos = _strip_func(data, pos, out)
+    n, pos = _read_int(data, pos)
+    pos += 4 * n                        # номера строк
+    n, pos = _read_int(data, pos)
+    for i in range(n):                  # локальные переменные: имя, startpc, endpc
+        pos = _skip_string(data, pos) + 8
+    n, pos = _read_int(data, pos)
+    for i in range(n):                  # имена upvalue
+        pos = _skip_string(data, pos)
+    if pos > len(data):
+        raise ValueError('truncated at offset 0x%x' % len(data))
+    out += bytes(12)                    # debug info: 3 пустых массива
+    return pos
+
+
+def strip_debug(data):
+    '''
+    bytes (.lu) -> тот же .lu без имени исходника и отладочной информации (как luac -s).
+    Работает по смещениям в исходном буфере, без разбора disasm_lu, чтобы его ошибки не попадали в эталон.
+    '''
+    if data[:len(FILE_HEADER)] != FILE_HEADER:
+        raise ValueError('not a Lua 5.1 .lu file')
+    out = bytearray(FILE_HEADER)
+    pos = _strip_func(memoryview(data), len(FILE_HEADER), out)
+    if pos != len(data):
+        raise ValueError('%i extra bytes at offset 0x%x' % (len(data) - pos, pos))
+    return bytes(out)
+
+
+def first_difference(a, b):
+    '''Смещение первого различающегося байта или None'''
+    if a == b:
+        return None
+    n = min(len(a), len(b))
+    lo, hi = 0, n       # бинарный поиск по срезам быстрее побайтового цикла на больших файлах
+    while hi - lo > 64:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    for i in range(lo, hi):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def verify(data):
+    '''bytes (.lu) -> None если disasm + asm воспроизводят файл, иначе смещение первого различия'''
+    expected = strip_debug(data)
+    rebuilt = asm_lu.assemble(disasm_lu.disassemble(data, show_consts=True))
+    return first_difference(expected, rebuilt)
+
+
+def _verify_job(job):
+    '''Задание для пула процессов: (name, bytes или путь) -> (name, size, offset, error)'''
+    name, source = job
+    try:
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                source = f.read()
+        return name, len(source), verify(source), None
+    except Exception as e:
+        return name, len(source)  if isinstance(source, bytes) else  0, None, '%s: %s' % (type(e).__name__, e)
+
+
+def verify_items(items, workers=None):
+    '''
+    Пакетный режим: items - пары (имя, bytes .lu или путь к .lu).
+    Результаты (name, size, offset, error) выдаются по мере готовности; offset None и error None - совпадает.
+    '''
+    jobs = list(items)
+    if workers == 1  or  len(jobs) < 2:
+        for job in jobs:
+            yield _verify_job(job)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [ executor.submit(_verify_job, job)  for job in jobs ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def find_lu(paths):
+    '''Файлы и каталоги -> пары (относительное имя, путь) всех .lu'''
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.lu'):
+                        full = os.path.join(root, name)
+                        yield os.path.relpath(full, path), full
+        else:
+            yield path, path
+
+
+def main(argv):
+    args = argv[1:]
+    workers = None
+    if '-j' in args:
+        i = args.index('-j')
+        workers = int(args[i+1])
+        del args[i:i+2]
+    if not args:  print(USAGE % argv[0]);  exit(0)
+
+    start = time.time()
+    total = failed = size = 0
+    for name, n, offset, error in verify_items(find_lu(args), workers):
+        total += 1
+        size += n
+        if error:
+            failed += 1
+            print('ERROR %s: %s' % (name, error))
+        elif offset is not None:
+            failed += 1
+            print('DIFF  %s: first difference at offset 0x%x' % (name, offset))
+    elapsed = time.time() - start
+    print('%i/%i files round-trip, %.1f MB in %.2fs (%.1f MB/s, %.0f files/s)' % (
+        total - failed, total, size / 2**20, elapsed, size / 2**20 / elapsed  if elapsed else 0, total / elapsed  if elapsed else 0))
+    exit(1  if failed else  0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
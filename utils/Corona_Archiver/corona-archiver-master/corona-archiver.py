@@ -1,10 +1,223 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
+import collections
+import hashlib
+import json
 import logging
+import mmap
 import os
 import pprint
 import struct
 import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CoronaArchiveError(Exception):
+    """Raised when an archive can not be read or written"""
+    pass
+
+
+class ArchiveResult(collections.namedtuple('ArchiveResult', 'entries bytes archive_size elapsed reused',
+                                           defaults=(0,))):
+    """
+        Summary of a pack/unpack run:
+            - entries: number of archive entries processed
+            - bytes: total payload bytes (file contents, without headers and padding)
+            - archive_size: size of the .car file in bytes
+            - elapsed: wall time in seconds
+            - reused: entries copied unchanged from the previous archive (incremental packing)
+    """
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        """ Payload bytes per second """
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class CarEntry(collections.namedtuple('CarEntry', 'name offset length')):
+    """
+        Archive entry: name, offset of the file content in the archive and its length
+    """
+    __slots__ = ()
+
+
+class CarReader:
+    """
+        Random access reader for *.car files.
+        The archive is memory mapped (or wrapped if bytes-like data is given), the index is parsed
+        once and entry contents are returned as zero-copy memoryview slices.
+
+        Views returned by open() must be released before close() (or leaving the 'with' block).
+    """
+    _HEADER = struct.Struct('<4siii')  # magic, revision, data_offset_start, length
+    _ENTRY = struct.Struct('<iii')     # index: type, data offset, name length | data: type, next, length
+
+    _ZIP_LOCAL_HEADER = struct.Struct('<4s22sHH')  # signature, ..., file name length, extra field length
+
+    def __init__(self, source):
+        self._file = None
+        self._mmap = None
+
+        if isinstance(source, str) or hasattr(source, '__fspath__'):
+            self.path = os.fspath(source)
+            self._map_file(self.path)
+            self._view = memoryview(self._mmap)
+        else:
+            self.path = None
+            self._view = memoryview(source).cast('B')
+
+        self._parse()
+
+    @classmethod
+    def from_zip(cls, zip_path, member='assets/resource.car'):
+        """
+            Reader for an archive stored inside a zip container (e.g. assets/resource.car of an APK).
+            Stored (uncompressed) members are mapped in place, compressed ones are inflated to memory.
+        """
+        reader = cls.__new__(cls)
+        reader._file = None
+        reader._mmap = None
+        reader.path = os.fspath(zip_path)
+
+        reader._map_file(reader.path)
+        try:
+            with zipfile.ZipFile(reader._file) as zf:
+                info = zf.getinfo(member)
+                if info.compress_type == zipfile.ZIP_STORED:
+                    signature, _, name_length, extra_length = cls._ZIP_LOCAL_HEADER.unpack_from(
+                        reader._mmap, info.header_offset)
+                    if signature != b'PK\x03\x04':
+                        raise CoronaArchiveError("Bad zip local header for {}".format(member))
+                    start = info.header_offset + cls._ZIP_LOCAL_HEADER.size + name_length + extra_length
+                    reader._view = memoryview(reader._mmap)[start:start + info.file_size]
+                else:
+                    data = zf.read(member)
+        except BaseException:
+            reader._view = None
+            reader.close()
+            raise
+
+        if info.compress_type != zipfile.ZIP_STORED:
+            reader._view = None
+            reader.close()
+            reader._view = memoryview(data)
+
+        reader._parse()
+        return reader
+
+    def _map_file(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise CoronaArchiveError("Empty file: {}".format(path))
+
+    def _parse(self):
+        self.metadata = {}
+        self.entries = []
+        self.index = {}
+        try:
+            self._read_index()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return [entry.name for entry in self.entries]
+
+    def open(self, name):
+        """ Zero-copy view of the entry content """
+        entry = self.index.get(name)
+        if entry is None:
+            raise KeyError(name)
+        return self.view(entry)
+
+    def read(self, name):
+        """ Copy of the entry content """
+        with self.open(name) as view:
+            return view.tobytes()
+
+    def view(self, entry):
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_index(self):
+        view = self._view
+        size = len(view)
+
+        if size < self._HEADER.size:
+            raise CoronaArchiveError("Incorrect file type. Must be a *.car (Corona Archive) file type.")
+
+        header, revision, data_offset_start, length = self._HEADER.unpack_from(view, 0)
+        if header != CoronaArchiver._MAGIC_NUMBER_HEADER:
+            raise CoronaArchiveError("Incorrect file type. Must be a *.car (Corona Archive) file type.")
+        if revision != 1:
+            logging.warning("This unpacker is intended for use on Corona Revision 1, it may not work on revision {}.".format(revision))
+
+        self.metadata = {
+            'header': header,
+            'revision': revision,
+            'data_offset_start': data_offset_start + 12,
+            'length': length,
+            'file_size': size,
+        }
+
+        pos = self._HEADER.size
+        for _ in range(length):
+            if pos + self._ENTRY.size > size:
+                raise CoronaArchiveError("Truncated index at offset {}".format(pos))
+            dtype, offset, name_length = self._ENTRY.unpack_from(view, pos)
+            if dtype != CoronaArchiver._MAGIC_NUMBER_INDEX:
+                raise CoronaArchiveError("Unexpected index entry type {} at offset {}".format(dtype, pos))
+
+            name_start = pos + self._ENTRY.size
+            name = view[name_start:name_start + name_length].tobytes().decode('utf-8')
+
+            if offset + self._ENTRY.size > size:
+                raise CoronaArchiveError("Data offset of {} is out of range".format(name))
+            dtype, nxt, data_length = self._ENTRY.unpack_from(view, offset)
+            if dtype != CoronaArchiver._MAGIC_NUMBER_DATA:
+                raise CoronaArchiveError("Unexpected data entry type {} for {}".format(dtype, name))
+            if offset + self._ENTRY.size + data_length > size:
+                raise CoronaArchiveError("Data of {} is out of range".format(name))
+
+            entry = CarEntry(name, offset + self._ENTRY.size, data_length)
+            self.entries.append(entry)
+            self.index[name] = entry
+            logging.debug("{} {} {} {}".format(dtype, offset, data_length, name))
+
+            # Name is 0-terminated and padded to multiple of 4
+            pos = name_start + name_length + CoronaArchiver._padding_length(name_length, 'index')
 
 
 class CoronaArchiver:
@@ -13,100 +226,129 @@ class CoronaArchiver:
     _MAGIC_NUMBER_DATA = 2
     _MAGIC_NUMBER_END = b'\xFF\xFF\xFF\xFF'
 
-    stream = None
-    metadata = {}
-    index = {}
-    data = {}
-
-    __input_dir = ""
-    __output_dir = ""
+    _BATCH_BYTES = 1024 * 1024   # small entries are written in batches up to this size...
+    _BATCH_ENTRIES = 64          # ...or this many entries per task
 
-    def __init__(self):
-        pass
+    def __init__(self, progress_callback=None, workers=None, max_in_flight=64 * 1024 * 1024):
+        """
+            progress_callback(done, total) is called after every processed entry
+            workers: threads writing extracted files (default: like ThreadPoolExecutor)
+            max_in_flight: limit of bytes queued for writing during extraction
+        """
+        self.progress_callback = progress_callback
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self.stream = None
+        self.metadata = {}
+        self.index = {}
+        self.data = {}
+        self.manifest = None
+
+        self.__input_dir = ""
+        self.__output_dir = ""
 
     def __repr__(self):
         return pprint.pformat(vars(self))
 
-    def pack(self, input_dir, output_file):
-        self.__input_dir = input_dir
-
-        with open(output_file, 'wb+') as f:
-            self.stream = f
-
-            files = [name for name in os.listdir(self.__input_dir) if os.path.isfile(self.__input_dir + name)]
-            self.metadata['length'] = len(files)
-
-            # Write metadata
-            self.stream.write(self._MAGIC_NUMBER_HEADER)
-            self.stream.write(struct.pack('i', 1))  # revision
-            self.stream.write(struct.pack('i', 0))  # data_offset_start: temp writing as file content is not defined yet
-            self.stream.write(struct.pack('i', self.metadata['length']))  # length: number of index entries
-
-            # Write index entries
-            for filename in files:
-                padding_length = self._padding_length(len(filename), 'index')
-                offset = 1337  # temporary writing as data offset is not known yet
-                self.stream.write(struct.pack('iii', self._MAGIC_NUMBER_INDEX, offset, len(filename)))
-                self.stream.write(filename.encode('utf-8'))
-                self._write_padding(padding_length)
-
-            # Update data_offset_start
-            tell = self.stream.tell()
-            data_offset_start = self.stream.tell() - 12  # tell() - tell() after writing data_offset_start value
-            self.stream.seek(8, 0)
-            self.stream.write(struct.pack('i', data_offset_start))
-            self.stream.seek(tell, 0)
+    def pack(self, input_dir, output_file, incremental=False, manifest_file=None):
+        """
+            Pack all files of input_dir to output_file.
 
-            # Write data entries
+            With incremental=True a manifest (size, mtime and sha1 per entry) is kept in manifest_file
+            (default: output_file + '.manifest.json'). Files whose size and mtime match the manifest are
+            not read at all, their bytes are copied straight from the previous archive. Files with the same
+            size but another mtime (touched, or extracted again) are hashed and reused too if the sha1 matches.
+        """
+        start = time.perf_counter()
+        self.__input_dir = input_dir
+        self.index = {}
+
+        files = [name for name in os.listdir(self.__input_dir)
+                 if os.path.isfile(os.path.join(self.__input_dir, name))]
+        self.metadata['length'] = len(files)
+
+        if incremental and manifest_file is None:
+            manifest_file = output_file + '.manifest.json'
+        manifest = self._load_manifest(manifest_file, output_file) if incremental else {}
+
+        reader = None
+        if manifest:
+            try:
+                reader = CarReader(output_file)
+            except (OSError, CoronaArchiveError) as e:
+                logging.warning("Previous archive can not be reused: {}".format(e))
+                manifest = {}
+
+        try:
+            # Decide source of every entry: unchanged -> previous archive, otherwise -> file on disk
+            entries = []
+            new_manifest = {}
+            reused = 0
             for filename in files:
-                with open(self.__input_dir + filename, 'rb') as f_append:
-                    length = os.path.getsize(self.__input_dir + filename)
-                    padding_length = self._padding_length(length, 'data')
-                    nxt = length + 4 + padding_length
-
-                    self.index[filename] = int(self.stream.tell())
-
-                    self.stream.write(struct.pack('iii', self._MAGIC_NUMBER_DATA, nxt, length))  # Write data header
-                    self.stream.write(f_append.read())  # Write file content
-                    self._write_padding(padding_length)  # Write padding
-
-            # Write end
-            self.stream.write(self._MAGIC_NUMBER_END)
-            self.stream.write(struct.pack('i', 0))
-
-            # Replace temporary "data_offset" values with final ones
-            self._write_finalize(files)
-
-        print("File {} successfully created.".format(output_file))
+                file_path = os.path.join(self.__input_dir, filename)
+                stat = os.stat(file_path)
+                known = manifest.get(filename)
+                if (known and known['size'] == stat.st_size
+                        and filename in reader and reader.index[filename].length == stat.st_size
+                        and (known['mtime_ns'] == stat.st_mtime_ns
+                             or known.get('sha1') and known['sha1'] == self._file_sha1(file_path))):
+                    entries.append((filename, stat.st_size, reader.index[filename]))
+                    new_manifest[filename] = dict(known, mtime_ns=stat.st_mtime_ns)
+                    reused += 1
+                else:
+                    entries.append((filename, stat.st_size, file_path))
+                    new_manifest[filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': None}
+
+            total_bytes, archive_size = self._write_archive(output_file, entries, reader, new_manifest)
+        except BaseException:
+            if os.path.exists(output_file + '.tmp'):
+                os.remove(output_file + '.tmp')
+            raise
+        finally:
+            if reader is not None:
+                reader.close()
+
+        # The previous archive is closed now, so it can be replaced (required on Windows)
+        os.replace(output_file + '.tmp', output_file)
+
+        if incremental:
+            self._save_manifest(manifest_file, output_file, new_manifest)
+
+        logging.info("File {} successfully created.".format(output_file))
+        return ArchiveResult(len(files), total_bytes, archive_size, time.perf_counter() - start, reused)
+
+    def unpack(self, input_file, output_dir, manifest_file=None, member=None):
+        """
+            Extract all entries of input_file to output_dir.
+            If manifest_file is given, it is filled for the extracted files, so the next incremental
+            pack() of output_dir to input_file only rewrites the files edited in between.
+            If member is given, input_file is a zip container (APK) and the archive is read from that member.
+        """
+        if member and manifest_file:
+            raise ValueError("manifest_file can only be used with a plain *.car input")
 
-    def unpack(self, input_file, output_dir):
+        start = time.perf_counter()
         self.__output_dir = output_dir
+        self.data = {'entries': 0, 'bytes': 0}
+        self.manifest = {} if manifest_file else None
 
         if not os.path.isdir(self.__output_dir):
             os.makedirs(self.__output_dir)
 
-        with open(input_file, 'rb') as f:
-            self.stream = f
-
-            # Read metadata
+        with (CarReader.from_zip(input_file, member) if member else CarReader(input_file)) as reader:
+            self.metadata = dict(reader.metadata)
             self.metadata['file_path'], self.metadata['file_name'] = os.path.split(input_file)
-            self.metadata['file_size'] = os.path.getsize(input_file)
-            self._read_metadata()
-
-            # Read index entries
-            for i in range(0, self.metadata['length']):
-                can_read = (i != self.metadata['length'] - 1)
-                self._read_index_entry(can_read)
-
-            # Jump to next section (jump over padding)
-            while struct.unpack('b', f.read(1))[0] != self._MAGIC_NUMBER_DATA:
-                pass
-            f.seek(-1, 1)
 
             # Read data entries
-            self._read_data_idx()
+            self._read_data_idx(reader)
 
-            print("Extraction done.")
+        if manifest_file:
+            self._save_manifest(manifest_file, input_file, self.manifest)
+
+        logging.info("Extraction done.")
+        return ArchiveResult(self.data['entries'], self.data['bytes'], self.metadata['file_size'],
+                             time.perf_counter() - start)
 
     @staticmethod
     def _padding_length(length, type):
@@ -122,122 +364,237 @@ class CoronaArchiver:
 
         return padding
 
+    def _report_progress(self, done, total):
+        if self.progress_callback:
+            self.progress_callback(done, total)
+
     # PACKING
 
-    def _write_finalize(self, files):
-        self.stream.seek(16, 0)
+    def _write_archive(self, output_file, entries, reader, manifest):
+        """
+            Write archive in one sequential pass to output_file + '.tmp'.
+            All offsets are computed up front from the entry sizes, so nothing is patched afterwards.
+            entries: [(name, length, source)], source is a path or a CarEntry of reader
+        """
+        names = [name.encode('utf-8') for name, _, _ in entries]
+
+        # Layout: header + index, then data entries
+        index_size = 16 + sum(12 + len(name) + self._padding_length(len(name), 'index') for name in names)
+        index = bytearray(self._MAGIC_NUMBER_HEADER)
+        index += struct.pack('<iii', 1, index_size - 12, len(entries))  # revision, data_offset_start, length
+
+        offset = index_size
+        for name, (filename, length, source) in zip(names, entries):
+            self.index[filename] = offset
+            index += struct.pack('<iii', self._MAGIC_NUMBER_INDEX, offset, len(name))
+            index += name
+            index += bytes(self._padding_length(len(name), 'index'))
+            offset += 12 + length + self._padding_length(length, 'data')
+
+        total_bytes = 0
+        with open(output_file + '.tmp', 'wb') as f:
+            self.stream = f
+            self.stream.write(index)
+
+            # Write data entries
+            for done, (filename, length, source) in enumerate(entries, 1):
+                if isinstance(source, CarEntry):
+                    content = reader.view(source)
+                else:
+                    with open(source, 'rb') as f_append:
+                        content = f_append.read()
+                    if len(content) != length:
+                        raise CoronaArchiveError("File {} changed while packing".format(filename))
+                    manifest[filename]['sha1'] = hashlib.sha1(content).hexdigest()
+
+                padding_length = self._padding_length(length, 'data')
+                nxt = length + 4 + padding_length
+
+                self.stream.write(struct.pack('<iii', self._MAGIC_NUMBER_DATA, nxt, length))  # Write data header
+                self.stream.write(content)  # Write file content
+                self._write_padding(padding_length)  # Write padding
+                if isinstance(content, memoryview):
+                    content.release()
+                total_bytes += length
+
+                self._report_progress(done, len(entries))
 
-        self.stream.flush()
+            # Write end
+            self.stream.write(self._MAGIC_NUMBER_END)
+            self.stream.write(struct.pack('<i', 0))
+            archive_size = self.stream.tell()
 
-        for filename in files:
-            padding_length = self._padding_length(len(filename), 'index')
+        self.stream = None
+        return total_bytes, archive_size
 
-            dtype, = struct.unpack('i', self.stream.read(4))
+    @staticmethod
+    def _file_sha1(file_path, chunk_size=1024 * 1024):
+        """ sha1 hex digest of a file, read in chunks """
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
 
-            self.stream.seek(self.stream.tell())  # fix Windows bug: http://bugs.python.org/issue1521491
-            self.stream.write(struct.pack('i', self.index[filename]))  # Write new offset value
-            self.stream.seek(self.stream.tell())  # fix Windows bug: http://bugs.python.org/issue1521491
+    @staticmethod
+    def _load_manifest(manifest_file, archive_file):
+        """ Manifest entries if it still describes archive_file, otherwise {} """
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            stat = os.stat(archive_file)
+        except (OSError, ValueError):
+            return {}
+
+        archive = manifest.get('archive', {})
+        if archive.get('size') != stat.st_size or archive.get('mtime_ns') != stat.st_mtime_ns:
+            logging.info("Manifest {} is outdated, packing all files".format(manifest_file))
+            return {}
+        return manifest.get('entries', {})
 
-            length, = struct.unpack('i', self.stream.read(4))
-            self.stream.read(length + padding_length)
+    @staticmethod
+    def _save_manifest(manifest_file, archive_file, entries):
+        stat = os.stat(archive_file)
+        manifest = {
+            'archive': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns},
+            'entries': entries,
+        }
+        with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_file + '.tmp', manifest_file)
 
     def _write_padding(self, padding):
-        for i in range(padding):
-            self.stream.write(b'\x00')
+        self.stream.write(b'\x00' * padding)
 
     # UNPACKING
 
-    def _read_metadata(self):
-        # Read header
-        header = self.stream.read(4)
-        self.metadata['header'] = header
-        if header != self._MAGIC_NUMBER_HEADER:
-            logging.error("Incorrect file type. Must be a *.car (Corona Archive) file type.")
-            exit(1)
-
-        # Read archive version
-        revision, = struct.unpack('i', self.stream.read(4))
-        self.metadata['revision'] = revision
-        if revision != 1:
-            logging.warn("This unpacker is intended for use on Corona Revision 1, it may not work on revision {}.".format(revision))
-
-        # Read data start offset
-        data_offset_start, = struct.unpack('i', self.stream.read(4))
-        self.metadata['data_offset_start'] = int(data_offset_start + self.stream.tell())
-
-        # Read number of index entries
-        length, = struct.unpack('i', self.stream.read(4))
-        self.metadata['length'] = length
-
-    def _read_index_entry(self, can_read):
-        dtype, offset, length = struct.unpack('iii', self.stream.read(12))
-
-        self.index[offset] = self.stream.read(length)
-        logging.debug("{} {} {} {}".format(dtype, offset, length, self.index[offset]))
-
-        self._read_to_next_entry(self._MAGIC_NUMBER_INDEX, can_read)
-
-    def _read_data_entry(self, offset, filename, read_index, can_read):
-
-        if read_index:
-            self.stream.seek(offset)
-
-        dtype, nxt, length = struct.unpack('iii', self.stream.read(12))
-        content = self.stream.read(length)
-        logging.debug("{} {} {} {} {}".format(dtype, nxt, length, offset, filename))
-
-        self._write_data_entry(content, offset if offset else self.stream.tell(), filename)
-
-        if not read_index:
-            self._read_to_next_entry(self._MAGIC_NUMBER_DATA, can_read)
-
-    def _read_data_idx(self):
-        """ Read data entries by index offset values """
-        for offset, filename in self.index.items():
-            self._read_data_entry(offset, filename, True, True)
-
-    def _read_data_stream(self):
-        """ Read data entries by file stream flow """
-        while self.stream.tell() < self.metadata['file_size']:
-            self._read_data_entry(None, None, False, True)
-
-    def _read_to_next_entry(self, entry_type, can_read=True):
-
-        while can_read and struct.unpack('b', self.stream.read(1))[0] != entry_type:
-            if self.stream.tell() + 1 >= self.metadata['file_size']:
-                self.stream.seek(0, 2)
-                return
-
-        self.stream.seek(-1, 1)
+    def _read_data_idx(self, reader):
+        """
+            Read data entries by index offset values.
+            Entries are grouped in batches and written by a thread pool, at most max_in_flight bytes are queued.
+        """
+        total = len(reader)
+        self._done = 0
+
+        # Create all output directories up front, workers only write files
+        for directory in {os.path.dirname(entry.name) for entry in reader} - {''}:
+            os.makedirs(os.path.join(self.__output_dir, directory), exist_ok=True)
+
+        in_flight = [0]
+        failed = threading.Event()
+        condition = threading.Condition()
+
+        def write_batch(batch, size):
+            try:
+                for entry in batch:
+                    with reader.view(entry) as content:
+                        self._write_data_entry(content, entry.offset, entry.name)
+                    with self._lock:
+                        self._done += 1
+                        self._report_progress(self._done, total)
+            except BaseException:
+                failed.set()
+                raise
+            finally:
+                with condition:
+                    in_flight[0] -= size
+                    condition.notify_all()
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch, size in self._batches(reader):
+                with condition:
+                    while in_flight[0] and in_flight[0] + size > self.max_in_flight:
+                        condition.wait()
+                    in_flight[0] += size
+                if failed.is_set():
+                    break  # stop queueing after a failure, it is raised below
+                futures.append(pool.submit(write_batch, batch, size))
+
+        for future in futures:
+            future.result()
+
+    def _batches(self, reader):
+        """ Group consecutive entries into (batch, size) write tasks """
+        batch, size = [], 0
+        for entry in reader:
+            batch.append(entry)
+            size += entry.length
+            if size >= self._BATCH_BYTES or len(batch) >= self._BATCH_ENTRIES:
+                yield batch, size
+                batch, size = [], 0
+        if batch:
+            yield batch, size
 
     def _write_data_entry(self, content, offset, filename):
-        new_filename = str(filename, 'utf-8')
-        if not filename:
-            new_filename = "file-" + str(offset) + ".extracted.lu"
+        new_filename = filename if filename else "file-" + str(offset) + ".extracted.lu"
 
-        with open(self.__output_dir + new_filename, "wb") as f:
+        file_path = os.path.join(self.__output_dir, new_filename)
+        with open(file_path, "wb") as f:
             f.write(content)
-            logging.info("File {} extracted to {}".format(new_filename, self.__output_dir))
+            logging.debug("File {} extracted to {}".format(new_filename, self.__output_dir))
+
+        if self.manifest is not None:
+            stat = os.stat(file_path)
+            record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': hashlib.sha1(content).hexdigest()}
+
+        with self._lock:
+            if self.manifest is not None:
+                self.manifest[new_filename] = record
+            self.data['entries'] += 1
+            self.data['bytes'] += len(content)
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.WARNING, format='%(asctime)s:%(levelname)-8s %(message)s')
 
-    if len(sys.argv) != 4:
+    if len(sys.argv) not in (3, 4, 5) or (sys.argv[1] == '-l') != (len(sys.argv) == 3):
         print("Usage: ")
         print("\tpacking:\tcorona-archiver.py -p 'input_dir' 'output_file'")
         print("\tunpacking:\tcorona-archiver.py -u 'input_file' 'output_dir'")
+        print("\tlisting:\tcorona-archiver.py -l 'input_file'")
+        print("\textracting:\tcorona-archiver.py -x 'input_file' 'entry_name' ['output_file']")
+        print("\tfrom APK:\tcorona-archiver.py -a 'input_apk' 'output_dir'")
         sys.exit(1)
 
     method = sys.argv[1]
     input = sys.argv[2]
-    output = sys.argv[3]
 
     archiver = CoronaArchiver()
 
-    if method == '-p':
-        archiver.pack(input_dir=os.path.join(input, ''), output_file=output)
-    elif method == '-u':
-        archiver.unpack(input_file=input, output_dir=os.path.join(output, ''))
-    else:
-        print("Invalid method")
+    try:
+        if method == '-p':
+            output = sys.argv[3]
+            result = archiver.pack(input_dir=os.path.join(input, ''), output_file=output)
+            print("File {} successfully created ({} entries, {} bytes, {:.2f}s).".format(
+                output, result.entries, result.bytes, result.elapsed))
+        elif method == '-u':
+            output = sys.argv[3]
+            result = archiver.unpack(input_file=input, output_dir=os.path.join(output, ''))
+            print("Extraction done ({} entries, {} bytes, {:.2f}s).".format(
+                result.entries, result.bytes, result.elapsed))
+        elif method == '-a':
+            output = sys.argv[3]
+            result = archiver.unpack(input_file=input, output_dir=os.path.join(output, ''),
+                                     member='assets/resource.car')
+            print("Extraction done ({} entries, {} bytes, {:.2f}s).".format(
+                result.entries, result.bytes, result.elapsed))
+        elif method == '-l':
+            with CarReader(input) as reader:
+                for entry in reader:
+                    print("{:>10}  {}".format(entry.length, entry.name))
+        elif method == '-x':
+            name = sys.argv[3]
+            output = sys.argv[4] if len(sys.argv) == 5 else os.path.basename(name)
+            with CarReader(input) as reader, open(output, 'wb') as f:
+                with reader.open(name) as content:
+                    f.write(content)
+            print("File {} extracted to {}".format(name, output))
+        else:
+            print("Invalid method")
+    except KeyError as e:
+        logging.error("Entry {} not found".format(e))
+        sys.exit(1)
+    except (CoronaArchiveError, zipfile.BadZipFile) as e:
+        logging.error(str(e))
+        sys.exit(1)
@@ -0,0 +1,97 @@
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+
+/**
+ * Long-lived unluac process for drtool: decompiles many .lu files with one JVM start.
+ *
+ * Launch:  java -cp unluac.jar UnluacWorker.java [unluac flags]
+ *
+ * Protocol (stdin/stdout, one request per line, paths in UTF-8):
+ *   worker -> "READY\n" once started
+ *   client -> "path/to/file.lu\n"
+ *   worker -> "OK <n>\n" + n bytes of decompiled source (UTF-8)
+ *          or "ERR <n>\n" + n bytes of error text
+ *
+ * unluac calls System.exit() on broken input. The shutdown hook still answers ERR
+ * for that request, the client then starts a new worker.
+ */
+public class UnluacWorker {
+    private static final Object lock = new Object();
+    private static OutputStream out;
+    private static ByteArrayOutputStream pendingErrors;  // stderr of the request in progress
+
+    private static void respond(String status, byte[] body) throws IOException {
+        synchronized (lock) {
+            out.write((status + " " + body.length + "\n").getBytes(StandardCharsets.US_ASCII));
+            out.write(body);
+            out.flush();
+            pendingErrors = null;
+        }
+    }
+
+    public static void main(String[] args) throws IOException {
+        out = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        PrintStream stdout = System.out;
+        PrintStream stderr = System.err;
+
+        Runtime.getRuntime().addShutdownHook(new Thread(() -> {
+            synchronized (lock) {
+                if (pendingErrors != null) {
+                    try {
+                        respond("ERR", pendingErrors.toByteArray());
+                    } catch (IOException e) {
+                        // client is gone
+                    }
+                }
+            }
+        }));
+
+        out.write("READY\n".getBytes(StandardCharsets.US_ASCII));
+        out.flush();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String path;
+        while ((path = in.readLine()) != null) {
+            if (path.isEmpty()) {
+                continue;
+            }
+            ByteArrayOutputStream source = new ByteArrayOutputStream();
+            ByteArrayOutputStream errors = new ByteArrayOutputStream();
+            synchronized (lock) {
+                pendingErrors = errors;
+            }
+            System.setOut(new PrintStream(source, true, "UTF-8"));
+            System.setErr(new PrintStream(errors, true, "UTF-8"));
+
+            boolean ok = true;
+            try {
+                String[] call = Arrays.copyOf(args, args.length + 1);
+                call[args.length] = path;
+                unluac.Main.main(call);
+            } catch (Throwable e) {
+                ok = false;
+                System.err.println(e);
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setOut(stdout);
+                System.setErr(stderr);
+            }
+
+            if (ok) {
+                respond("OK", source.toByteArray());
+            } else {
+                respond("ERR", errors.toByteArray());
+            }
+        }
+    }
+}